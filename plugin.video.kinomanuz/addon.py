@@ -1,11 +1,19 @@
 # coding=utf-8
 
-from copy import deepcopy
+import os
+import time
+import sqlite3
 
-from resources.internal.router import route, path_for, resolve
-from resources.internal import player
+from resources.internal.router import route, path_for, resolve, endpoint_name
+from resources.internal import player, tasks, downloader, stream_proxy, cache, stats
 from resources import kinoman_api
 
+# Playlist entries resolved in advance, the rest are picked up by play
+PLAYLIST_RESOLVE_AHEAD = 3
+
+# Stats metrics shown on the latency page, in seconds
+LATENCY_METRICS = ("invocation.", "queue_wait.")
+
 
 @route("/")
 def root():
@@ -57,25 +65,50 @@ def list_movies(query):
 
     items = []
 
+    smart_play = player.get_setting("smart_play", "bool")
+
     for title, video_id, video_data in kinoman_api.get_movies(query.copy()):
+        is_playable = False
+
         if title.startswith("-->"):
             query["page"] += 1
             item_path = path_for("list_movies", query=query)
+        elif smart_play and video_data["info"].get("mediatype") == "movie":
+            # Movie is played right from the listing, without files menu
+            item_path = path_for("play_best", path_vars={"video_id": video_id})
+            is_playable = True
         else:
             item_path = path_for("open_movie", path_vars={"video_id": video_id})
 
-        items.append(
-            {
-                "label": title,
-                "path": item_path,
-                "video_data": video_data,
-                "is_folder": True,
-            }
-        )
+        item = {
+            "label": title,
+            "path": item_path,
+            "video_data": video_data,
+            "is_playable": is_playable,
+            "is_folder": not is_playable,
+        }
+
+        if video_id is not None:
+            item["context_menu"] = [
+                (
+                    "Обновить",
+                    path_for("refresh_movie", path_vars={"video_id": video_id}),
+                )
+            ]
+
+        items.append(item)
 
     player.print_items(items, content_type="movies")
 
 
+@route("/refresh_movie/<int:video_id>/")
+def refresh_movie(video_id):
+    # Missing movies and files are remembered for a while, this forgets them
+    kinoman_api.refresh_movie(video_id)
+
+    player.refresh_container()
+
+
 @route("/search_filter/")
 @route("/search_filter/<int:step>/")
 def search_filter(query=None, step=0):
@@ -90,8 +123,10 @@ def search_filter(query=None, step=0):
     ]
 
     menu_items = []
+    item_queries = []
     for item_label, item_query in step_menu_generators[step]():
         query.update(item_query)
+        item_queries.append(query.copy())
 
         if step == len(step_menu_generators) - 1:
             menu_items.append(
@@ -112,8 +147,31 @@ def search_filter(query=None, step=0):
                 }
             )
 
+    missing_counts = []
+    if player.get_setting("filter_counts", "bool"):
+        counts = kinoman_api.get_filter_counts(item_queries)
+
+        for menu_item, item_query, count in zip(menu_items, item_queries, counts):
+            if count is None:
+                missing_counts.append(item_query)
+            else:
+                menu_item["label"] = "{} ({})".format(menu_item["label"], count)
+
     player.print_items(menu_items)
 
+    # Counts are never waited for, menu gets refreshed once they are ready
+    if missing_counts:
+        tasks.run_in_background(
+            _update_filter_counts, missing_counts, player.get_current_url()
+        )
+
+
+def _update_filter_counts(queries, url):
+    # Without the mirror long menus are counted a part at a time, refreshing
+    # then would render the menu again and count the next part right away
+    if kinoman_api.precompute_filter_counts(queries) == len(queries):
+        player.refresh_if_current(url)
+
 
 @route("/search/")
 @route("/search/<s_query>/")
@@ -190,60 +248,39 @@ def search_clear():
 @route("/movie/<int:video_id>/")
 @route("/movie/<int:video_id>/<video_dir>/")
 def open_movie(video_id, video_dir=None):
-    movie_data = kinoman_api.get_movie_data(video_id)
+    movie = kinoman_api.get_movie_data(video_id)
 
-    if movie_data["series_season_n"] is not None and video_dir is not None:
+    if movie.season_n is not None and video_dir is not None:
         content_type = "episodes"
     else:
         content_type = "movies"
 
+    # Kodi's dicts are built once and shared by all items
+    movie_info = movie.video_data()
+
     items = []
-    for (
-        video_type,
-        file_name,
-        title,
-        url,
-        series,
-        file_info,
-    ) in kinoman_api.get_movie_files_list(
-        movie_data["file_lists"], video_dir, movie_data["series_season_n"]
+    for video_type, title, video_file in kinoman_api.get_movie_files_list(
+        movie.file_lists, video_dir, movie.season_n
     ):
-
-        if url.startswith("http"):
+        if video_file is not None:
             url_play = path_for(
                 "play",
                 path_vars={
                     "video_id": video_id,
                     "video_type": video_type,
-                    "video_name": file_name,
+                    "video_name": video_file.name,
                 },
             )
             is_playable = True
         else:
             url_play = path_for(
-                "open_movie", path_vars={"video_id": video_id, "video_dir": url}
+                "open_movie", path_vars={"video_id": video_id, "video_dir": video_type}
             )
             is_playable = False
 
-        # Gather all unique data into update dictionary
-        data_update = {}
-        if series:
-            data_update = series.copy()
-        if file_info:
-            data_update["plot"] = (
-                "[B]"
-                + file_info
-                + "[/B][CR][CR]"
-                + movie_data["movie_info"]["info"]["plot"]
-            )
-
-        # Check if there is unique data and create deep copy of movie info to update,
-        # so that every entry could have unique data
-        if data_update:
-            movie_data_alt = deepcopy(movie_data["movie_info"])
-            movie_data_alt["info"].update(data_update)
-        else:
-            movie_data_alt = movie_data["movie_info"]
+        # Site is down and details come from the expired cache
+        if movie.stale:
+            title = kinoman_api.stale_label(title)
 
         items.append(
             {
@@ -251,21 +288,343 @@ def open_movie(video_id, video_dir=None):
                 "path": url_play,
                 "is_playable": is_playable,
                 "is_folder": not is_playable,
-                "video_data": movie_data_alt,
+                "video_data": _file_video_data(movie, movie_info, video_file),
+                "context_menu": _file_context_menu(
+                    movie, video_id, video_type, video_file
+                ),
             }
         )
 
     return player.print_items(items, content_type=content_type)
 
 
+def _file_context_menu(movie, video_id, video_type, video_file):
+    context_menu = []
+
+    if movie.season_n is not None:
+        context_menu.append(
+            (
+                "Воспроизвести все серии",
+                path_for(
+                    "play_all",
+                    path_vars={"video_id": video_id, "video_type": video_type},
+                ),
+            )
+        )
+
+    # Online files are streams, there is no file to download
+    if video_file is not None and video_type != "online":
+        context_menu.append(
+            (
+                "Скачать",
+                path_for(
+                    "download",
+                    path_vars={
+                        "video_id": video_id,
+                        "video_type": video_type,
+                        "video_name": video_file.name,
+                    },
+                ),
+            )
+        )
+
+    return context_menu or None
+
+
+def _file_video_data(movie, movie_info, video_file):
+    # Gather all unique data into update dictionary
+    data_update = {}
+    if video_file is not None and video_file.episode:
+        data_update = video_file.episode.info()
+    if video_file is not None and video_file.description:
+        data_update["plot"] = (
+            "[B]" + video_file.description + "[/B][CR][CR]" + movie.plot
+        )
+
+    # Unique data is layered on top of shared movie info instead of copying it,
+    # so that every entry could have unique data
+    if data_update:
+        return dict(movie_info, info_overrides=data_update)
+
+    return movie_info
+
+
+@route("/play_all/<int:video_id>/<video_type>/")
+def play_all(video_id, video_type):
+    movie = kinoman_api.get_movie_data(video_id)
+    movie_info = movie.video_data()
+
+    entries = []
+    video_names = []
+    for _, title, video_file in kinoman_api.get_movie_files_list(
+        movie.file_lists, video_type, movie.season_n
+    ):
+        video_names.append(video_file.name)
+        entries.append(
+            {
+                "label": title,
+                "path": path_for(
+                    "play",
+                    path_vars={
+                        "video_id": video_id,
+                        "video_type": video_type,
+                        "video_name": video_file.name,
+                    },
+                ),
+                "video_data": _file_video_data(movie, movie_info, video_file),
+            }
+        )
+
+    player.play_playlist(entries)
+
+    # First entry is resolved by its own play call
+    kinoman_api.prefetch_files(
+        video_id, video_type, video_names[1 : PLAYLIST_RESOLVE_AHEAD + 1]
+    )
+
+
+@route("/catalog_sync/")
+def catalog_sync():
+    progress = player.ProgressBG("Kinoman.Uz", "Обновление каталога...")
+
+    try:
+        movies_count = kinoman_api.sync_catalog(player.abort_requested, progress.update)
+    finally:
+        progress.close()
+
+    if movies_count is None:
+        player.notify("Kinoman.Uz", "Обновление каталога прервано")
+    else:
+        player.notify("Kinoman.Uz", "Каталог обновлен: {}".format(movies_count))
+
+
 @route("/play/<int:video_id>/<video_type>/<video_name>")
 def play(video_id, video_type, video_name):
-    player.play(kinoman_api.get_video_url(video_id, video_type, video_name))
+    stream = kinoman_api.get_video_url(video_id, video_type, video_name)
+
+    # Service's proxy reads streams ahead, download files are played directly
+    proxy_port = player.get_window_property(stream_proxy.PORT_PROPERTY)
+
+    if proxy_port and video_type == "online":
+        player.play(
+            stream_proxy.proxy_url(proxy_port, video_id, video_type, video_name),
+            stream.mime_type,
+        )
+    else:
+        player.play(stream.url, stream.mime_type, stream.headers)
+
+    # Next episode is resolved while this one plays
+    tasks.run_in_background(
+        kinoman_api.prefetch_next_episode, video_id, video_type, video_name
+    )
+
+
+@route("/download/<int:video_id>/<video_type>/<video_name>")
+def download(video_id, video_type, video_name):
+    download_dir = player.translate_path(player.get_setting("download_path"))
+    if not download_dir:
+        player.dialog_ok("Kinoman.Uz", "Укажите папку для загрузок в настройках")
+        return
+
+    stream = kinoman_api.get_video_url(video_id, video_type, video_name)
+
+    file_download = downloader.Download(
+        stream.url,
+        os.path.join(download_dir, os.path.basename(video_name)),
+        headers=stream.headers,
+        connections=player.get_setting("download_connections", "int"),
+        rate_limit=player.get_setting("download_speed_limit", "int") * 1024,
+        slots=downloader.get_slots(),
+        should_stop=player.abort_requested,
+    )
+
+    progress = player.ProgressBG("Kinoman.Uz", video_name)
+    file_download.progress = progress.update
+    try:
+        file_download.run()
+    except downloader.DownloadError as error:
+        player.notify("Kinoman.Uz", "Ошибка загрузки: {}".format(error))
+    else:
+        player.notify("Kinoman.Uz", "Загружено: {}".format(video_name))
+    finally:
+        progress.close()
+
+
+@route("/play_best/<int:video_id>/")
+def play_best(video_id):
+    stream = kinoman_api.get_best_video_url(video_id)
+
+    player.play(stream.url, stream.mime_type, stream.headers)
+
+
+def _format_size(size):
+    if size >= 1024 * 1024:
+        return "{:.1f} МБ".format(size / (1024.0 * 1024))
+
+    return "{:.1f} КБ".format(size / 1024.0)
+
+
+def _format_age(seconds):
+    if seconds < 60 * 60:
+        return "{} мин".format(int(seconds // 60))
+    if seconds < 24 * 60 * 60:
+        return "{} ч".format(int(seconds // (60 * 60)))
+
+    return "{} дн".format(int(seconds // (24 * 60 * 60)))
+
+
+# Maintenance pages aren't linked from the menus, they are opened by url
+@route("/cache/")
+def cache_stats():
+    page_cache = cache.get_cache()
+    info = page_cache.info()
+
+    ratio = float(info["raw_size"]) / info["size"] if info["size"] else 1
+
+    items = [
+        {
+            "label": "Всего: {} зап., {} (сжатие x{:.1f}), вытеснено {}".format(
+                info["entries"], _format_size(info["size"]), ratio, info["evictions"]
+            ),
+            "path": path_for("cache_stats"),
+            "is_folder": True,
+        },
+        {
+            "label": "Очистить весь кэш",
+            "path": path_for("cache_clear"),
+            "is_folder": True,
+        },
+        {
+            "label": "Обновить всё принудительно",
+            "path": path_for("cache_refresh"),
+            "is_folder": True,
+        },
+        {
+            "label": "Задержки последних вызовов",
+            "path": path_for("cache_latency"),
+            "is_folder": True,
+        },
+    ]
+
+    now = time.time()
+
+    for endpoint_class, class_info in sorted(page_cache.class_info().items()):
+        lookups = class_info["hits"] + class_info["misses"]
+
+        label = "{}: {} зап., {}, попаданий {}".format(
+            endpoint_class,
+            class_info["entries"],
+            _format_size(class_info["size"]),
+            "{:.0%}".format(float(class_info["hits"]) / lookups) if lookups else "-",
+        )
+        if class_info["oldest"] is not None:
+            label += ", старейшая {}".format(_format_age(now - class_info["oldest"]))
+
+        items.append(
+            {
+                "label": label,
+                "path": path_for(
+                    "cache_class", path_vars={"endpoint_class": endpoint_class}
+                ),
+                "is_folder": True,
+            }
+        )
+
+    player.print_items(items, cache=False)
+
+
+@route("/cache/class/<endpoint_class>/")
+def cache_class(endpoint_class):
+    path_vars = {"endpoint_class": endpoint_class}
+
+    player.print_items(
+        [
+            {
+                "label": "Очистить {}".format(endpoint_class),
+                "path": path_for("cache_clear", path_vars=path_vars),
+                "is_folder": True,
+            },
+            {
+                "label": "Обновить {} принудительно".format(endpoint_class),
+                "path": path_for("cache_refresh", path_vars=path_vars),
+                "is_folder": True,
+            },
+        ],
+        cache=False,
+    )
+
+
+@route("/cache/clear/")
+@route("/cache/clear/<endpoint_class>/")
+def cache_clear(endpoint_class=None):
+    cache.get_cache().clear(endpoint_class)
+
+    player.notify("Kinoman.Uz", "Кэш очищен")
+    player.redirect_in_place(path_for("cache_stats"))
+
+
+@route("/cache/refresh/")
+@route("/cache/refresh/<endpoint_class>/")
+def cache_refresh(endpoint_class=None):
+    # Values are kept, so they are still served if the site is down
+    cache.get_cache().expire(endpoint_class)
+
+    player.notify("Kinoman.Uz", "Кэш будет обновлен")
+    player.redirect_in_place(path_for("cache_stats"))
+
+
+@route("/cache/latency/")
+def cache_latency():
+    items = []
+
+    invocation_stats = stats.get_stats()
+
+    for metric in invocation_stats.metrics():
+        if not metric.startswith(LATENCY_METRICS):
+            continue
+
+        summary = invocation_stats.summary(metric)
+
+        items.append(
+            {
+                "label": "{}: {} шт., p50 {:.0f} мс, p95 {:.0f} мс, p99 {:.0f} мс,"
+                " макс. {:.0f} мс".format(
+                    metric,
+                    summary["count"],
+                    summary["p50"] * 1000,
+                    summary["p95"] * 1000,
+                    summary["p99"] * 1000,
+                    summary["max"] * 1000,
+                ),
+                "path": path_for("cache_latency"),
+                "is_folder": True,
+            }
+        )
+
+    player.print_items(items, cache=False)
+
+
+def _timed_resolve(url):
+    start = time.time()
+
+    try:
+        resolve(url)
+    finally:
+        name = endpoint_name(url)
+        if name is not None:
+            stats.record("invocation.{}".format(name), time.time() - start)
+
+        # Only counted lookups are written, a locked db must not hide the
+        # error of the route itself
+        try:
+            cache.get_cache().flush_lookups()
+        except sqlite3.Error:
+            pass
 
 
 def main():
     try:
-        resolve(player.get_current_url())
+        _timed_resolve(player.get_current_url())
     except kinoman_api.LoginError as error:
         player.dialog_ok("Kinoman.Uz", "Ошибка авторизации: {}".format(error))
     except kinoman_api.MissingVideoError:
@@ -0,0 +1,198 @@
+# coding=utf-8
+
+import json
+import time
+import sqlite3
+
+from contextlib import closing
+
+from resources.internal import player
+
+CATALOG_DB = "catalog.db"
+
+# Mirror older than that is considered outdated and upstream is used instead
+CATALOG_MAX_AGE = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    type_id INTEGER NOT NULL,
+    release_year INTEGER,
+    age_rating_type INTEGER,
+    favorite INTEGER NOT NULL DEFAULT 0,
+    rank_default INTEGER,
+    rank_premiere INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS movies_type_id ON movies (type_id);
+CREATE INDEX IF NOT EXISTS movies_release_year ON movies (release_year);
+CREATE INDEX IF NOT EXISTS movies_age_rating_type ON movies (age_rating_type);
+CREATE INDEX IF NOT EXISTS movies_favorite ON movies (favorite);
+CREATE INDEX IF NOT EXISTS movies_rank_default ON movies (rank_default);
+CREATE INDEX IF NOT EXISTS movies_rank_premiere ON movies (rank_premiere);
+
+CREATE TABLE IF NOT EXISTS movie_genres (
+    genre_id INTEGER NOT NULL,
+    movie_id INTEGER NOT NULL,
+    PRIMARY KEY (genre_id, movie_id)
+);
+CREATE INDEX IF NOT EXISTS movie_genres_movie_id ON movie_genres (movie_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+SORT_COLUMNS = {0: "rank_default", 1: "rank_premiere"}
+
+
+class Catalog(object):
+    """Local mirror of the site catalog, queried like search_by_filter"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=10)
+        connection.executescript(SCHEMA)
+
+        return connection
+
+    def _get_meta(self, connection, key):
+        row = connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+
+        return row[0] if row else None
+
+    def is_fresh(self, max_age=CATALOG_MAX_AGE):
+        with closing(self._connect()) as connection:
+            synced_at = self._get_meta(connection, "synced_at")
+
+        return bool(synced_at) and time.time() - float(synced_at) < max_age
+
+    def replace(self, movies, page_size):
+        """Replace mirror contents in a single transaction
+
+        Each movie is a dict with the listing entry in "data", a set of "genres",
+        "age_rating_type", "favorite" and upstream sort positions "rank_default"
+        and "rank_premiere".
+        """
+
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute("DELETE FROM movies")
+                connection.execute("DELETE FROM movie_genres")
+
+                for movie in movies:
+                    movie_id = movie["data"]["id"]
+
+                    connection.execute(
+                        "INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            movie_id,
+                            movie["data"]["type_id"],
+                            movie["data"]["release_year"],
+                            movie.get("age_rating_type"),
+                            int(bool(movie.get("favorite"))),
+                            movie.get("rank_default"),
+                            movie.get("rank_premiere"),
+                            json.dumps(movie["data"]),
+                        ),
+                    )
+                    connection.executemany(
+                        "INSERT INTO movie_genres VALUES (?, ?)",
+                        [(genre_id, movie_id) for genre_id in movie["genres"]],
+                    )
+
+                connection.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    (("synced_at", str(time.time())), ("page_size", str(page_size))),
+                )
+
+    def count(self, query):
+        where, args = _build_filter(query)
+
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM movies m WHERE {}".format(where), args
+            ).fetchone()[0]
+
+    def search(self, query):
+        """Evaluate normalized search_by_filter payload against the mirror
+
+        Returns the same structure as upstream: movies of the requested page
+        and total number of pages.
+        """
+
+        where, args = _build_filter(query)
+
+        sort_column = SORT_COLUMNS.get(query.get("sort_type", 0), "rank_default")
+
+        with closing(self._connect()) as connection:
+            page_size = int(self._get_meta(connection, "page_size") or 0)
+
+            if page_size <= 0:
+                return None
+
+            total = connection.execute(
+                "SELECT COUNT(*) FROM movies m WHERE {}".format(where), args
+            ).fetchone()[0]
+
+            rows = connection.execute(
+                "SELECT data FROM movies m WHERE {} "
+                "ORDER BY m.{} IS NULL, m.{}, m.id "
+                "LIMIT ? OFFSET ?".format(where, sort_column, sort_column),
+                args + [page_size, (int(query.get("page", 1)) - 1) * page_size],
+            ).fetchall()
+
+        return {
+            "movies": [json.loads(row[0]) for row in rows],
+            "total_page": (total + page_size - 1) // page_size,
+        }
+
+
+def _build_filter(query):
+    where = ["1"]
+    args = []
+
+    # 0 is "all categories" for the site
+    if query.get("content_type_id"):
+        where.append("m.type_id = ?")
+        args.append(query["content_type_id"])
+
+    # Cartoons are not a content type but a genre (12), so genre lists are how
+    # cartoons get included or excluded in categories
+    if query.get("genre_list"):
+        where.append(
+            "m.id IN (SELECT movie_id FROM movie_genres WHERE genre_id IN ({}))".format(
+                ", ".join("?" * len(query["genre_list"]))
+            )
+        )
+        args.extend(query["genre_list"])
+
+    if query.get("genre_black_list"):
+        where.append(
+            "m.id NOT IN (SELECT movie_id FROM movie_genres WHERE genre_id IN ({}))".format(
+                ", ".join("?" * len(query["genre_black_list"]))
+            )
+        )
+        args.extend(query["genre_black_list"])
+
+    if "age_rating_type" in query:
+        where.append("m.age_rating_type = ?")
+        args.append(query["age_rating_type"])
+
+    if "year" in query:
+        where.append("m.release_year = ?")
+        args.append(query["year"])
+
+    if query.get("favorite"):
+        where.append("m.favorite = 1")
+
+    return " AND ".join(where), args
+
+
+def get_catalog():
+    return Catalog(player.get_profile_path(CATALOG_DB))
@@ -0,0 +1,53 @@
+# coding=utf-8
+
+import re
+
+from resources.models import EpisodeInfo
+
+SEASON_REGEX = re.compile(r"\(Сезон ([0-9]+)")
+EPISODE_REGEX = re.compile(r"e([0-9]+)\.")
+SEASON_SUFFIX_REGEX = re.compile(r"\(.*[0-9]+\)")
+
+
+def parse_season(title):
+    season_match = SEASON_REGEX.search(title)
+
+    if season_match is None:
+        return None
+
+    return season_match.group(1).zfill(2)
+
+
+class EpisodeParser(object):
+    """Extracts episode data from file names of a single season
+
+    Series title is computed once, so every file costs a single regex search.
+    Files without episode number in the name are numbered in order, every file
+    list gets its own parser.
+    """
+
+    def __init__(self, movie_title, season_n):
+        series_title = SEASON_SUFFIX_REGEX.sub("", str(movie_title)).strip()
+
+        self.season = int(season_n)
+        self.title_prefix = "{} S{}E".format(series_title, season_n)
+        self.episodes_counter = 1
+
+    def skip(self, file_name):
+        """Account for a file that is not listed, keeping numbering intact"""
+
+        if EPISODE_REGEX.search(file_name) is None:
+            self.episodes_counter += 1
+
+    def parse(self, file_name):
+        episode_match = EPISODE_REGEX.search(file_name)
+
+        if episode_match is not None:
+            episode_num = episode_match.group(1)
+        else:
+            episode_num = str(self.episodes_counter)
+            self.episodes_counter += 1
+
+        return EpisodeInfo(
+            self.season, int(episode_num), self.title_prefix + episode_num
+        )
@@ -0,0 +1,148 @@
+# coding=utf-8
+
+import threading
+
+from resources import episode_parser
+from resources.models import VideoFile
+
+# Order in which categories are shown
+CATEGORIES = ("online", "sd", "hd", "full_hd")
+
+ONLINE_URL = "https://www.kinoman.uz/api/v1/movie/online/{}"
+DOWNLOAD_URL = "https://www.kinoman.uz/api/v1/movie/download/{}"
+
+
+def _download_category(video_file):
+    # if file['name'] in ('HDTVRIP', 'BDRIP'):
+    #     file_cat = 'hd'
+    # else:
+    #     file_cat = 'sd'
+
+    # Video category according to site's original scripts
+    width = int(video_file["width"])
+
+    if 1280 <= width < 1800:
+        return "hd"
+    if width >= 1800:
+        return "full_hd"
+    return "sd"
+
+
+class FileLists(object):
+    """Movie files grouped by video category, behaves like a read-only dict
+
+    Files are only classified on creation. Names, urls, descriptions and
+    episode data are built on first access to a category, so listing or
+    playing a single category doesn't pay for all the others. Safe to share
+    between threads.
+    """
+
+    def __init__(self, movie, season_n=None):
+        self.movie_title = movie.get("title")
+        self.season_n = season_n
+
+        self._online_files = movie["online_files"]
+        self._download_files = movie["download_files"]
+        self._download_categories = [
+            _download_category(video_file) for video_file in self._download_files
+        ]
+
+        present = set(self._download_categories)
+        if self._online_files:
+            present.add("online")
+
+        self._categories = [category for category in CATEGORIES if category in present]
+        self._files = {}
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self._categories)
+
+    def __len__(self):
+        return len(self._categories)
+
+    def __contains__(self, category):
+        return category in self._categories
+
+    def __getitem__(self, category):
+        if category not in self._categories:
+            raise KeyError(category)
+
+        with self._lock:
+            if category not in self._files:
+                self._files[category] = self._build_category(category)
+
+            return self._files[category]
+
+    def items(self):
+        return [(category, self[category]) for category in self._categories]
+
+    def find(self, category, file_name):
+        """Get file by category and name, None if there is no such file"""
+
+        if category not in self._categories:
+            return None
+
+        category_files = self[category]
+
+        with self._lock:
+            if category not in self._index:
+                index = {}
+                for video_file in category_files:
+                    index.setdefault(video_file.name, video_file)
+                self._index[category] = index
+
+            return self._index[category].get(file_name)
+
+    def _build_category(self, category):
+        parser = None
+        if self.season_n is not None:
+            parser = episode_parser.EpisodeParser(self.movie_title, self.season_n)
+
+        if category == "online":
+            return [
+                self._build_online_file(video_file, parser)
+                for video_file in self._online_files
+            ]
+
+        files = []
+        for video_file, file_category in zip(
+            self._download_files, self._download_categories
+        ):
+            if file_category == category:
+                files.append(self._build_download_file(video_file, parser))
+            elif parser is not None:
+                # Episodes without numbers are counted across the whole list
+                parser.skip(video_file["file_name"])
+
+        return files
+
+    @staticmethod
+    def _build_online_file(video_file, parser):
+        file_name = video_file["title"]
+
+        return VideoFile(
+            file_name,
+            ONLINE_URL.format(video_file["secure_id"]),
+            parser.parse(file_name) if parser is not None else None,
+        )
+
+    @staticmethod
+    def _build_download_file(video_file, parser):
+        file_name = video_file["file_name"]
+        file_info = "[CR]".join(
+            [
+                "Видео: {} ({}x{})".format(
+                    video_file["name"], video_file["width"], video_file["height"]
+                ),
+                "Аудио: {}".format(video_file["title"]),
+            ]
+        )
+
+        return VideoFile(
+            file_name,
+            DOWNLOAD_URL.format(video_file["secure_id"]),
+            parser.parse(file_name) if parser is not None else None,
+            file_info,
+        )
@@ -0,0 +1,442 @@
+# coding=utf-8
+
+import json
+import time
+import uuid
+import zlib
+import sqlite3
+import threading
+
+from contextlib import closing
+from collections import Counter
+
+from resources.internal import player
+
+CACHE_DB = "cache.db"
+
+# Cache is disposable, so schema changes simply recreate it
+SCHEMA_VERSION = 3
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    raw_size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Lease outlives a crashed owner only this long
+LEASE_TTL = 30
+# How long other processes wait for the lease owner's result
+LEASE_WAIT = 5
+LEASE_POLL_INTERVAL = 0.1
+
+# Values from this size are compressed, movie details are tens of KB
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+
+# Byte budget for stored values, least recently used ones are evicted above it
+MAX_SIZE = 64 * 1024 * 1024
+# Eviction goes a bit below the budget, so it's not needed right again
+EVICT_TO = 0.9
+# Expired values are served while the site is down, but not forever
+STALE_KEEP = 7 * 24 * 60 * 60
+# Access time is only updated when it's older than this, reads stay cheap
+ACCESS_RESOLUTION = 60
+
+
+# Hits and misses of this process, written to the db by flush_lookups
+_lookups = Counter()
+_lookups_lock = threading.Lock()
+
+
+def key_class(key):
+    """Group of the key for statistics
+
+    Keys are "<class>:<id>", page keys are "page:<endpoint class>:<id>".
+    """
+
+    parts = key.split(":")
+
+    return ":".join(parts[:2]) if parts[0] == "page" else parts[0]
+
+
+def _count_lookups(keys, found):
+    with _lookups_lock:
+        for key in keys:
+            _lookups[
+                "{}:{}".format("hits" if key in found else "misses", key_class(key))
+            ] += 1
+
+
+def _add_counters(connection, counts):
+    for name, value in counts.items():
+        connection.execute("INSERT OR IGNORE INTO counters VALUES (?, 0)", (name,))
+        connection.execute(
+            "UPDATE counters SET value = value + ? WHERE name = ?", (value, name)
+        )
+
+
+def _encode(value):
+    raw = json.dumps(value).encode("utf-8")
+
+    if len(raw) >= COMPRESS_MIN_SIZE:
+        compressed = zlib.compress(raw, COMPRESS_LEVEL)
+
+        if len(compressed) < len(raw):
+            return compressed, True, len(raw)
+
+    return raw, False, len(raw)
+
+
+def _decode(value, compressed):
+    raw = bytes(value)
+
+    if compressed:
+        raw = zlib.decompress(raw)
+
+    return json.loads(raw.decode("utf-8"))
+
+
+class Cache(object):
+    """Persistent key-value storage for JSON serializable values with TTL
+
+    Large values are stored compressed. compact() keeps the storage within
+    its byte budget.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=10)
+
+        if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            connection.executescript(
+                "DROP TABLE IF EXISTS cache; DROP TABLE IF EXISTS leases;"
+                "DROP TABLE IF EXISTS counters;"
+            )
+            connection.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+
+        connection.executescript(SCHEMA)
+
+        return connection
+
+    @staticmethod
+    def _touch(connection, rows):
+        # rows are (key, accessed)
+        now = time.time()
+        updates = [
+            (now, key) for key, accessed in rows if now - accessed > ACCESS_RESOLUTION
+        ]
+
+        if updates:
+            with connection:
+                connection.executemany(
+                    "UPDATE cache SET accessed = ? WHERE key = ?", updates
+                )
+
+    def get(self, key):
+        return self._get(key, count=True)
+
+    def _get(self, key, count):
+        # Re-checks of a miss aren't counted, they would skew the hit ratio
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT value, compressed, accessed FROM cache"
+                " WHERE key = ? AND expires > ?",
+                (key, time.time()),
+            ).fetchone()
+
+            if count:
+                _count_lookups([key], [key] if row else [])
+
+            if row is None:
+                return None
+
+            self._touch(connection, [(key, row[2])])
+
+        return _decode(row[0], row[1])
+
+    def get_stale(self, key):
+        """Value of key even if it's expired, as long as it's still stored"""
+
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT value, compressed FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+
+        return _decode(row[0], row[1]) if row else None
+
+    def get_many(self, keys):
+        keys = list(keys)
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT key, value, compressed, accessed FROM cache"
+                " WHERE expires > ? AND key IN ({})".format(", ".join("?" * len(keys))),
+                [time.time()] + keys,
+            ).fetchall()
+
+            _count_lookups(keys, set(row[0] for row in rows))
+            self._touch(connection, [(row[0], row[3]) for row in rows])
+
+        return {key: _decode(value, compressed) for key, value, compressed, _ in rows}
+
+    def set(self, key, value, ttl):
+        data, compressed, raw_size = _encode(value)
+        now = time.time()
+
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        sqlite3.Binary(data),
+                        compressed,
+                        len(data),
+                        raw_size,
+                        now,
+                        now,
+                        now + ttl,
+                    ),
+                )
+
+    def delete(self, key):
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        with closing(self._connect()) as connection:
+            with connection:
+                # Not LIKE, keys may contain its wildcards
+                connection.execute(
+                    "DELETE FROM cache WHERE substr(key, 1, ?) = ?",
+                    (len(prefix), prefix),
+                )
+
+    def compact(self, max_size=MAX_SIZE):
+        """Drop long expired values and least recently used ones above max_size
+
+        Returns numbers of dropped expired and evicted values.
+        """
+
+        now = time.time()
+
+        with closing(self._connect()) as connection:
+            with connection:
+                expired = connection.execute(
+                    "DELETE FROM cache WHERE expires < ?", (now - STALE_KEEP,)
+                ).rowcount
+                connection.execute("DELETE FROM leases WHERE expires < ?", (now,))
+
+                evicted = self._evict(connection, max_size)
+
+                _add_counters(connection, {"evictions": evicted})
+
+            # Deleted rows leave free pages, only vacuum gives them back
+            if expired or evicted:
+                connection.execute("VACUUM")
+
+        return {"expired": expired, "evicted": evicted}
+
+    @staticmethod
+    def _evict(connection, max_size):
+        size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()[0]
+
+        if size <= max_size:
+            return 0
+
+        excess = size - max_size * EVICT_TO
+
+        rows = connection.execute(
+            "SELECT key, size FROM cache ORDER BY accessed"
+        ).fetchall()
+
+        keys = []
+        for key, value_size in rows:
+            if excess <= 0:
+                break
+
+            keys.append((key,))
+            excess -= value_size
+
+        connection.executemany("DELETE FROM cache WHERE key = ?", keys)
+
+        return len(keys)
+
+    def _class_keys(self, connection, endpoint_class):
+        keys = connection.execute("SELECT key FROM cache").fetchall()
+
+        return [key for key in keys if key_class(key[0]) == endpoint_class]
+
+    def clear(self, endpoint_class=None):
+        """Delete all values or only values of the key class"""
+
+        with closing(self._connect()) as connection:
+            with connection:
+                if endpoint_class is None:
+                    connection.execute("DELETE FROM cache")
+                else:
+                    connection.executemany(
+                        "DELETE FROM cache WHERE key = ?",
+                        self._class_keys(connection, endpoint_class),
+                    )
+
+    def expire(self, endpoint_class=None):
+        """Make values refresh on the next access, they are still kept as stale"""
+
+        now = time.time()
+
+        with closing(self._connect()) as connection:
+            with connection:
+                if endpoint_class is None:
+                    connection.execute(
+                        "UPDATE cache SET expires = ? WHERE expires > ?", (now, now)
+                    )
+                else:
+                    connection.executemany(
+                        "UPDATE cache SET expires = ? WHERE key = ? AND expires > ?",
+                        [
+                            (now, key[0], now)
+                            for key in self._class_keys(connection, endpoint_class)
+                        ],
+                    )
+
+    def flush_lookups(self):
+        """Add hits and misses counted by this process to the stored ones"""
+
+        with _lookups_lock:
+            counts = dict(_lookups)
+            _lookups.clear()
+
+        if counts:
+            with closing(self._connect()) as connection:
+                with connection:
+                    _add_counters(connection, counts)
+
+    def class_info(self):
+        """Values count, size, oldest value and lookups per key class"""
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT key, size, created FROM cache").fetchall()
+            counters = connection.execute(
+                "SELECT name, value FROM counters"
+                " WHERE name LIKE 'hits:%' OR name LIKE 'misses:%'"
+            ).fetchall()
+
+        classes = {}
+
+        def class_stats(endpoint_class):
+            return classes.setdefault(
+                endpoint_class,
+                {"entries": 0, "size": 0, "oldest": None, "hits": 0, "misses": 0},
+            )
+
+        for key, size, created in rows:
+            stats = class_stats(key_class(key))
+            stats["entries"] += 1
+            stats["size"] += size
+            stats["oldest"] = min(created, stats["oldest"] or created)
+
+        for name, value in counters:
+            lookup, endpoint_class = name.split(":", 1)
+            class_stats(endpoint_class)[lookup] = value
+
+        return classes
+
+    def info(self):
+        """Stored values count, their size, uncompressed size and evictions"""
+
+        with closing(self._connect()) as connection:
+            entries, size, raw_size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0)"
+                " FROM cache"
+            ).fetchone()
+            evictions = connection.execute(
+                "SELECT value FROM counters WHERE name = 'evictions'"
+            ).fetchone()
+
+        return {
+            "entries": entries,
+            "size": size,
+            "raw_size": raw_size,
+            "evictions": evictions[0] if evictions else 0,
+        }
+
+    def acquire_lease(self, key, ttl=LEASE_TTL):
+        """Owner token if no other process holds key's lease, None otherwise"""
+
+        owner = uuid.uuid4().hex
+        now = time.time()
+
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute(
+                    "DELETE FROM leases WHERE key = ? AND expires <= ?", (key, now)
+                )
+                inserted = connection.execute(
+                    "INSERT OR IGNORE INTO leases VALUES (?, ?, ?)",
+                    (key, owner, now + ttl),
+                ).rowcount
+
+        return owner if inserted else None
+
+    def release_lease(self, key, owner):
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute(
+                    "DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner)
+                )
+
+    def single_flight(self, key, compute, wait=LEASE_WAIT):
+        """Value of key, computed by one process at a time
+
+        compute() has to store its result under key. Processes that find
+        the lease taken wait for that result, if it doesn't show up in time
+        (e.g. the owner failed) they compute it themselves.
+        """
+
+        deadline = time.time() + wait
+
+        while True:
+            owner = self.acquire_lease(key)
+
+            if owner is not None:
+                try:
+                    # Previous owner could have finished just now
+                    value = self._get(key, count=False)
+                    return compute() if value is None else value
+                finally:
+                    self.release_lease(key, owner)
+
+            value = self._get(key, count=False)
+
+            if value is not None:
+                return value
+            if time.time() >= deadline:
+                return compute()
+
+            time.sleep(LEASE_POLL_INTERVAL)
+
+
+def get_cache():
+    return Cache(player.get_profile_path(CACHE_DB))
@@ -0,0 +1,61 @@
+# coding=utf-8
+
+import time
+
+from resources.internal import player
+
+# Consecutive failures that open the breaker
+FAILURE_THRESHOLD = 3
+# Seconds the breaker stays open before a probe request is let through
+RESET_TIMEOUT = 30
+
+
+class CircuitBreaker(object):
+    """Fail fast while the site is down
+
+    State is kept in window properties, so it's shared by all plugin
+    processes and the service. After reset_timeout one probe request is
+    let through, its success closes the breaker, its failure keeps it open
+    for another reset_timeout.
+    """
+
+    def __init__(
+        self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT
+    ):
+        self.failures_property = "kinomanuz.{}.failures".format(name)
+        self.opened_property = "kinomanuz.{}.opened".format(name)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def _opened(self):
+        return float(player.get_window_property(self.opened_property) or 0)
+
+    def is_open(self):
+        return bool(self._opened())
+
+    def allow_request(self):
+        opened = self._opened()
+
+        if not opened:
+            return True
+
+        if time.time() - opened < self.reset_timeout:
+            return False
+
+        # Requests of other processes keep failing fast while this one probes
+        player.set_window_property(self.opened_property, time.time())
+
+        return True
+
+    def record_success(self):
+        if player.get_window_property(self.failures_property):
+            player.clear_window_property(self.failures_property)
+            player.clear_window_property(self.opened_property)
+
+    def record_failure(self):
+        failures = int(player.get_window_property(self.failures_property) or 0) + 1
+
+        player.set_window_property(self.failures_property, failures)
+
+        if failures >= self.failure_threshold:
+            player.set_window_property(self.opened_property, time.time())
@@ -0,0 +1,420 @@
+# coding=utf-8
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from contextlib import closing
+
+import requests
+
+from resources.internal import player
+
+CHUNK_SIZE = 64 * 1024
+TIMEOUT = 30
+
+# How often progress is reported and resume state is saved, seconds
+REPORT_INTERVAL = 0.5
+
+SLOTS_DB = "downloads.db"
+
+# Connections of all downloads together, every download is its own process
+MAX_CONNECTIONS = 8
+# Slots of crashed processes are freed after this long, live ones renew theirs
+SLOT_TTL = 60
+# How often connections waiting for a slot check again, seconds
+SLOT_POLL_INTERVAL = 0.5
+
+SLOTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    id TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+);
+"""
+
+
+class DownloadError(BaseException):
+    """Exception for failed or incomplete downloads"""
+
+
+# Errors of a single connection, the rest of the download goes on
+FETCH_ERRORS = (requests.RequestException, EnvironmentError, DownloadError)
+
+
+def _replace_file(source, target):
+    # os.rename fails on Windows if the target exists, os.replace is py3 only
+    try:
+        replace = os.replace
+    except AttributeError:  # pragma: no cover
+        if os.path.exists(target):
+            os.remove(target)
+        replace = os.rename
+
+    replace(source, target)
+
+
+class Slot(object):
+    """Taken connection slot, renewed while its connection makes progress"""
+
+    def __init__(self, slots, slot_id):
+        self.slots = slots
+        self.id = slot_id
+        self.renewed = time.time()
+
+    def keep_alive(self):
+        now = time.time()
+
+        if now - self.renewed > self.slots.ttl / 3.0:
+            self.slots.renew(self.id)
+            self.renewed = now
+
+    def release(self):
+        # Slot that can't be freed now expires on its own
+        try:
+            self.slots.release(self.id)
+        except sqlite3.Error:
+            pass
+
+
+class ConnectionSlots(object):
+    """Limit of connections shared by all processes using the same db file"""
+
+    def __init__(self, db_path, limit=MAX_CONNECTIONS, ttl=SLOT_TTL):
+        self.db_path = db_path
+        self.limit = limit
+        self.ttl = ttl
+
+    def _connect(self):
+        # Transactions are managed by hand, counting and taking must be atomic
+        connection = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        connection.executescript(SLOTS_SCHEMA)
+
+        return connection
+
+    def _try_take(self, connection, slot_id):
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            now = time.time()
+            connection.execute("DELETE FROM slots WHERE expires <= ?", (now,))
+
+            taken = connection.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+            if taken < self.limit:
+                connection.execute(
+                    "INSERT INTO slots VALUES (?, ?)", (slot_id, now + self.ttl)
+                )
+
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return taken < self.limit
+
+    def acquire(self, should_stop):
+        """Wait for a free slot, None if should_stop() became true first"""
+
+        slot_id = uuid.uuid4().hex
+
+        with closing(self._connect()) as connection:
+            while not self._try_take(connection, slot_id):
+                if should_stop():
+                    return None
+
+                time.sleep(SLOT_POLL_INTERVAL)
+
+        return Slot(self, slot_id)
+
+    def renew(self, slot_id):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE slots SET expires = ? WHERE id = ?",
+                (time.time() + self.ttl, slot_id),
+            )
+
+    def release(self, slot_id):
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM slots WHERE id = ?", (slot_id,))
+
+
+def get_slots():
+    return ConnectionSlots(player.get_profile_path(SLOTS_DB))
+
+
+class RateLimiter(object):
+    """Bandwidth cap in bytes per second shared between threads, 0 is no cap"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def consume(self, size):
+        if not self.rate:
+            return
+
+        with self._lock:
+            now = time.time()
+            slot_start = max(self._next_slot, now)
+            self._next_slot = slot_start + float(size) / self.rate
+
+            delay = self._next_slot - now
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Download(object):
+    """File download over several HTTP Range connections, resumable
+
+    Data goes into a preallocated "<path>.part" file, offsets of every
+    segment are kept in "<path>.part.json", so an interrupted download
+    continues where it stopped when started again. File is moved to its
+    path only after its size is verified.
+
+    With slots every connection waits for a slot shared with downloads of
+    other processes. Download is cancelled once should_stop() is true.
+    """
+
+    def __init__(
+        self,
+        url,
+        path,
+        headers=None,
+        connections=4,
+        rate_limit=0,
+        expected_size=None,
+        progress=None,
+        slots=None,
+        should_stop=None,
+    ):
+        self.url = url
+        self.path = path
+        self.headers = headers or {}
+        self.connections = max(1, connections)
+        self.expected_size = expected_size
+        self.progress = progress
+        self.slots = slots
+        self.should_stop = should_stop
+
+        self.part_path = path + ".part"
+        self.state_path = path + ".part.json"
+
+        self.total = None
+        self.downloaded = 0
+        self.segments = []
+
+        self._rate_limiter = RateLimiter(rate_limit)
+        self._lock = threading.Lock()
+        self._errors = []
+        self._cancelled = False
+        self._last_report = 0
+
+    def cancel(self):
+        self._cancelled = True
+
+    def _stopping(self):
+        if self.should_stop is not None and self.should_stop():
+            self.cancel()
+
+        return self._cancelled
+
+    def run(self):
+        self.total, ranges_supported = self._probe()
+
+        if self.expected_size is not None and self.total != self.expected_size:
+            raise DownloadError(
+                "Размер файла {} вместо {}".format(self.total, self.expected_size)
+            )
+
+        self.segments = self._load_state(ranges_supported)
+        self.downloaded = sum(segment[2] for segment in self.segments)
+
+        self._preallocate()
+
+        threads = [
+            threading.Thread(target=self._fetch_segment, args=(segment,))
+            for segment in self.segments
+            if segment[0] + segment[2] <= segment[1]
+        ]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self._save_state()
+
+        if self._errors:
+            raise DownloadError(self._errors[0])
+        if self._cancelled:
+            raise DownloadError("Загрузка отменена")
+
+        self._verify()
+
+        _replace_file(self.part_path, self.path)
+        os.remove(self.state_path)
+
+        return self.path
+
+    def _probe(self):
+        """Get file size and whether the server supports ranges"""
+
+        try:
+            response = requests.get(
+                self.url,
+                headers=dict(self.headers, Range="bytes=0-0"),
+                stream=True,
+                verify=False,
+                timeout=TIMEOUT,
+            )
+        except requests.RequestException as error:
+            raise DownloadError(str(error))
+
+        try:
+            if response.status_code == 206:
+                return int(response.headers["Content-Range"].split("/")[1]), True
+
+            if response.status_code == 200 and "Content-Length" in response.headers:
+                return int(response.headers["Content-Length"]), False
+        except (KeyError, ValueError, IndexError):
+            pass
+        finally:
+            response.close()
+
+        raise DownloadError("Не удалось узнать размер файла")
+
+    def _split(self, connections):
+        segment_size = -(-self.total // connections)
+
+        return [
+            [start, min(start + segment_size, self.total) - 1, 0]
+            for start in range(0, self.total, segment_size)
+        ]
+
+    def _load_state(self, ranges_supported):
+        # Without ranges there is nothing to resume, whole file is fetched again
+        if not ranges_supported:
+            return self._split(1)
+
+        try:
+            with open(self.state_path) as state_file:
+                state = json.load(state_file)
+        except (IOError, OSError, ValueError):
+            state = None
+
+        if (
+            state
+            and state.get("total") == self.total
+            and os.path.exists(self.part_path)
+        ):
+            return state["segments"]
+
+        return self._split(self.connections)
+
+    def _save_state(self):
+        with self._lock:
+            state = {"total": self.total, "segments": self.segments}
+
+            with open(self.state_path, "w") as state_file:
+                json.dump(state, state_file)
+
+    def _preallocate(self):
+        mode = "r+b" if os.path.exists(self.part_path) else "wb"
+
+        with open(self.part_path, mode) as part_file:
+            part_file.truncate(self.total)
+
+    def _fetch_segment(self, segment):
+        start, end = segment[0], segment[1]
+
+        slot = None
+        if self.slots is not None:
+            try:
+                slot = self.slots.acquire(self._stopping)
+            except sqlite3.Error as error:
+                with self._lock:
+                    self._errors.append(str(error))
+                return
+
+            # Cancelled while waiting
+            if slot is None:
+                return
+
+        try:
+            self._fetch_range(segment, start + segment[2], end, slot)
+        except FETCH_ERRORS + (sqlite3.Error,) as error:
+            with self._lock:
+                self._errors.append(str(error))
+        finally:
+            if slot is not None:
+                slot.release()
+
+    def _fetch_range(self, segment, offset, end, slot=None):
+        headers = dict(self.headers)
+        if offset > 0 or end < self.total - 1:
+            headers["Range"] = "bytes={}-{}".format(offset, end)
+
+        response = requests.get(
+            self.url, headers=headers, stream=True, verify=False, timeout=TIMEOUT
+        )
+
+        try:
+            if response.status_code != (206 if "Range" in headers else 200):
+                raise DownloadError("HTTP {}".format(response.status_code))
+
+            with open(self.part_path, "r+b") as part_file:
+                part_file.seek(offset)
+
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if self._cancelled:
+                        break
+
+                    # Never write past the segment, even if server sends more
+                    chunk = chunk[: end + 1 - offset]
+                    if not chunk:
+                        break
+
+                    self._rate_limiter.consume(len(chunk))
+                    part_file.write(chunk)
+                    offset += len(chunk)
+
+                    with self._lock:
+                        segment[2] += len(chunk)
+                        self.downloaded += len(chunk)
+
+                    self._report()
+
+                    if slot is not None:
+                        slot.keep_alive()
+        finally:
+            response.close()
+
+    def _report(self):
+        now = time.time()
+
+        with self._lock:
+            if now - self._last_report < REPORT_INTERVAL:
+                return
+            self._last_report = now
+
+        self._save_state()
+
+        if self.progress is not None:
+            self.progress(self.downloaded, self.total)
+
+        # Kodi shutdown waits for these threads, so they are stopped on time
+        self._stopping()
+
+    def _verify(self):
+        size = os.path.getsize(self.part_path)
+
+        if self.downloaded != self.total or size != self.total:
+            raise DownloadError(
+                "Файл загружен не полностью: {} из {}".format(
+                    self.downloaded, self.total
+                )
+            )
@@ -1,16 +1,26 @@
 # coding=utf-8
 
+import os
 import sys
 
 import xbmc
 import xbmcgui
+import xbmcvfs
 import xbmcplugin
 import xbmcaddon
 
+try:  # pragma: no cover
+    from urllib import urlencode
+except ImportError:  # pragma: no cover
+    # noinspection PyCompatibility,PyUnresolvedReferences
+    from urllib.parse import urlencode
 
 ADDON = xbmcaddon.Addon()
 ADDON_NAME = ADDON.getAddonInfo("id")
-ADDON_HANDLE = int(sys.argv[1])
+# Properties of the home window are shared by plugin calls and the service
+HOME_WINDOW_ID = 10000
+# Services are started without a handle
+ADDON_HANDLE = int(sys.argv[1]) if len(sys.argv) > 1 else -1
 
 
 def open_settings():
@@ -56,6 +66,45 @@ def log(message):
     xbmc.log("{}: {}".format(ADDON_NAME, message), xbmc.LOGERROR)
 
 
+def get_profile_path(*paths):
+    profile = xbmcvfs.translatePath(ADDON.getAddonInfo("profile"))
+
+    if profile and not os.path.isdir(profile):
+        os.makedirs(profile)
+
+    return os.path.join(profile, *paths)
+
+
+def translate_path(path):
+    return xbmcvfs.translatePath(path) if path else path
+
+
+def get_idle_time():
+    """Seconds since the last user input"""
+
+    return xbmc.getGlobalIdleTime()
+
+
+def is_playing():
+    return xbmc.Player().isPlaying()
+
+
+def abort_requested():
+    return xbmc.Monitor().abortRequested()
+
+
+def get_window_property(key):
+    return xbmcgui.Window(HOME_WINDOW_ID).getProperty(key)
+
+
+def set_window_property(key, value):
+    xbmcgui.Window(HOME_WINDOW_ID).setProperty(key, str(value))
+
+
+def clear_window_property(key):
+    xbmcgui.Window(HOME_WINDOW_ID).clearProperty(key)
+
+
 def get_url(path):
     if not path.startswith("/"):
         path = "/" + path
@@ -86,6 +135,10 @@ def dialog_ok(title, text):
     return xbmcgui.Dialog().ok(title, text)
 
 
+def notify(title, text):
+    return xbmcgui.Dialog().notification(title, text, sound=False)
+
+
 def dialog_yesno(title, text, nolabel=None, yeslabel=None):
     return xbmcgui.Dialog().yesno(title, text, nolabel=nolabel, yeslabel=yeslabel)
 
@@ -94,6 +147,20 @@ def dialog_multiselect(title, items):
     return xbmcgui.Dialog().multiselect(title, items)
 
 
+class ProgressBG(object):
+    """Background progress dialog, doesn't block the interface"""
+
+    def __init__(self, heading, message=""):
+        self.dialog = xbmcgui.DialogProgressBG()
+        self.dialog.create(heading, message)
+
+    def update(self, done, total):
+        self.dialog.update(int(done * 100 / total) if total else 0)
+
+    def close(self):
+        self.dialog.close()
+
+
 def redirect_in_place(path):
     url = get_url(path)
 
@@ -101,14 +168,65 @@ def redirect_in_place(path):
     xbmcplugin.endOfDirectory(ADDON_HANDLE, updateListing=True)
 
 
-def play(url):
+def refresh_container():
+    xbmc.executebuiltin("Container.Refresh")
+
+
+def refresh_if_current(url):
+    if xbmc.getInfoLabel("Container.FolderPath") == url:
+        refresh_container()
+
+
+def play(url, mime_type=None, headers=None):
+    # Kodi passes headers after "|" to the server it plays from
+    if headers:
+        url = "{}|{}".format(url, urlencode(sorted(headers.items())))
+
     l_item = xbmcgui.ListItem(path=url)
+
+    # With known type Kodi doesn't probe the stream before playback
+    if mime_type:
+        l_item.setMimeType(mime_type)
+        l_item.setContentLookup(False)
+
     xbmcplugin.setResolvedUrl(ADDON_HANDLE, True, l_item)
 
 
-def add_item(name, path, video_data=None, is_folder=False, is_playable=False):
+def play_playlist(items):
+    """Replace video playlist with items and start playing it"""
+
+    playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
+    playlist.clear()
+
+    for item in items:
+        l_item = _make_list_item(item["label"], item.get("video_data"), False, True)
+        playlist.add(get_url(item["path"]), l_item)
+
+    xbmc.Player().play(playlist)
+
+
+def add_item(
+    name, path, video_data=None, is_folder=False, is_playable=False, context_menu=None
+):
     url = get_url(path)
 
+    l_item = _make_list_item(name, video_data, is_folder, is_playable)
+
+    # Context menu entries are (label, path) of plugin actions
+    if context_menu:
+        l_item.addContextMenuItems(
+            [
+                (label, "RunPlugin({})".format(get_url(action_path)))
+                for label, action_path in context_menu
+            ]
+        )
+
+    xbmcplugin.addDirectoryItem(
+        handle=ADDON_HANDLE, url=url, listitem=l_item, isFolder=is_folder
+    )
+
+
+def _make_list_item(name, video_data, is_folder, is_playable):
     if video_data is None:
         video_data = {}
 
@@ -119,24 +237,30 @@ def add_item(name, path, video_data=None, is_folder=False, is_playable=False):
 
     l_item = xbmcgui.ListItem(name)
 
-    video_data.setdefault("art", {})
-    video_data["art"].setdefault("icon", icon)
+    # video_data may be shared between items, so it is never modified here
+    art = video_data.get("art") or {}
+    if "icon" not in art:
+        art = dict(art, icon=icon)
 
-    l_item.setArt(video_data["art"])
+    l_item.setArt(art)
 
     if video_data.get("properties"):
         for key, value in video_data["properties"].items():
             l_item.setProperty(key, value)
 
-    if video_data.get("info"):
-        l_item.setInfo("video", infoLabels=video_data["info"])
+    # Item specific info is layered on top of the shared one
+    info = video_data.get("info")
+    if video_data.get("info_overrides"):
+        info = dict(info or {})
+        info.update(video_data["info_overrides"])
+
+    if info:
+        l_item.setInfo("video", infoLabels=info)
 
     l_item.setProperty("Video", "true")
     l_item.setProperty("IsPlayable", str(is_playable).lower())
 
-    xbmcplugin.addDirectoryItem(
-        handle=ADDON_HANDLE, url=url, listitem=l_item, isFolder=is_folder
-    )
+    return l_item
 
 
 def print_items(items, content_type="tvshows", update=False, cache=True):
@@ -147,6 +271,7 @@ def print_items(items, content_type="tvshows", update=False, cache=True):
             item.get("video_data"),
             is_folder=item.get("is_folder"),
             is_playable=item.get("is_playable"),
+            context_menu=item.get("context_menu"),
         )
 
     xbmcplugin.setContent(ADDON_HANDLE, content_type)
@@ -0,0 +1,157 @@
+# coding=utf-8
+
+import time
+import uuid
+import sqlite3
+import threading
+
+from contextlib import closing, contextmanager
+
+from resources.internal import player, stats
+
+RATE_LIMIT_DB = "rate_limit.db"
+
+# Requests per second to kinoman.uz from all addon processes together,
+# the site answers 500 to ips that go much faster
+RATE = 4
+# Requests that can go out at once after a quiet period
+BURST = 8
+
+FOREGROUND = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {FOREGROUND: "foreground", BACKGROUND: "background"}
+
+# Waiters of crashed processes are forgotten after this long
+WAITER_TTL = 60
+# How often background requests check if foreground ones are done
+POLL_INTERVAL = 0.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    since REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def get_priority():
+    return getattr(_local, "priority", FOREGROUND)
+
+
+@contextmanager
+def priority(value):
+    """Requests of the current thread go with this priority"""
+
+    previous = get_priority()
+    _local.priority = value
+
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class TokenBucket(object):
+    """Token bucket shared by all processes using the same db file
+
+    Background requests don't take tokens while any foreground request is
+    waiting for one, so prefetches never delay what the user waits for.
+    """
+
+    def __init__(self, db_path, rate=RATE, burst=BURST):
+        self.db_path = db_path
+        self.rate = rate
+        self.burst = burst
+
+    def _connect(self):
+        # Transactions are managed by hand, token update must be atomic
+        connection = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        connection.executescript(SCHEMA)
+
+        return connection
+
+    def _try_take(self, connection, waiter, request_priority):
+        """Seconds to sleep before the next attempt, 0 if a token is taken"""
+
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            now = time.time()
+            connection.execute(
+                "DELETE FROM waiters WHERE since < ?", (now - WAITER_TTL,)
+            )
+
+            foreground_waiting = connection.execute(
+                "SELECT 1 FROM waiters WHERE priority = ? LIMIT 1", (FOREGROUND,)
+            ).fetchone()
+
+            if request_priority != FOREGROUND and foreground_waiting:
+                connection.execute("COMMIT")
+                return POLL_INTERVAL
+
+            row = connection.execute("SELECT tokens, updated FROM bucket").fetchone()
+            tokens = self.burst
+            if row is not None:
+                tokens = min(self.burst, row[0] + (now - row[1]) * self.rate)
+
+            delay = 0
+            if tokens >= 1:
+                tokens -= 1
+                connection.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+            else:
+                delay = (1 - tokens) / self.rate
+
+            connection.execute(
+                "INSERT OR REPLACE INTO bucket VALUES (0, ?, ?)", (tokens, now)
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return delay
+
+    def acquire(self, request_priority=FOREGROUND):
+        """Wait for a token, returns seconds spent waiting"""
+
+        waiter = uuid.uuid4().hex
+        start = time.time()
+
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO waiters VALUES (?, ?, ?)",
+                (waiter, request_priority, start),
+            )
+
+            try:
+                delay = self._try_take(connection, waiter, request_priority)
+
+                while delay:
+                    time.sleep(delay)
+                    delay = self._try_take(connection, waiter, request_priority)
+            except BaseException:
+                connection.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+                raise
+
+        return time.time() - start
+
+
+def get_bucket():
+    return TokenBucket(player.get_profile_path(RATE_LIMIT_DB))
+
+
+def throttle():
+    """Wait until the current thread may send a request to the site"""
+
+    request_priority = get_priority()
+    waited = get_bucket().acquire(request_priority)
+
+    stats.record("queue_wait.{}".format(PRIORITY_NAMES[request_priority]), waited)
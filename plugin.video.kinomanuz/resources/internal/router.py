@@ -115,7 +115,7 @@ def route(path):
     return sub
 
 
-def resolve(url):
+def _url_to_endpoint(url):
     # Rules
     #   If a rule ends with a slash and is requested without a slash by the user,
     #   the user is automatically redirected to the same page with a trailing slash
@@ -139,14 +139,29 @@ def resolve(url):
         endpoint, endpoint_vars = _path_to_endpoint(path_sections)
 
         if endpoint is not None:
-            if query:
-                return endpoint(query=query, **endpoint_vars)
-
-            return endpoint(**endpoint_vars)
+            return endpoint, endpoint_vars, query
 
     raise ValueError('Failed to resolve the url "{}"'.format(url))
 
 
+def resolve(url):
+    endpoint, endpoint_vars, query = _url_to_endpoint(url)
+
+    if query:
+        return endpoint(query=query, **endpoint_vars)
+
+    return endpoint(**endpoint_vars)
+
+
+def endpoint_name(url):
+    """Name of the function url resolves to, None if there is none"""
+
+    try:
+        return _url_to_endpoint(url)[0].__name__
+    except ValueError:
+        return None
+
+
 def _path_to_endpoint(path_sections):
     for r_route, r_route_f in REGISTERED_ROUTES.items():
         if len(r_route) != len(path_sections):
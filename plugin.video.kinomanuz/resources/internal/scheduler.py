@@ -0,0 +1,87 @@
+# coding=utf-8
+
+import time
+
+from resources.internal import player, rate_limit
+
+# How often the service checks if something is due, seconds
+TICK = 10
+
+
+class Scheduler(object):
+    """Periodic jobs of the service
+
+    Every job runs once at start and then every interval seconds. Idle jobs
+    additionally wait until Kodi had no user input for idle_time seconds
+    and nothing is playing, so they never compete with the user.
+    Jobs get a should_stop callable and must return soon after it's true.
+    A job can return seconds until its next run to override the interval.
+    Jobs' requests to the site have background priority. A failed job is
+    logged and runs again after its interval, the service goes on.
+    """
+
+    def __init__(self, monitor, tick=TICK):
+        self.monitor = monitor
+        self.tick = tick
+
+        self._jobs = []
+
+    def add(self, job, interval, idle_time=None):
+        self._jobs.append(
+            {
+                "job": job,
+                "interval": interval,
+                "idle_time": idle_time,
+                "last_run": None,
+                "next_interval": interval,
+            }
+        )
+
+    def should_stop(self):
+        return self.monitor.abortRequested()
+
+    def run_pending(self):
+        for job in self._jobs:
+            if self.should_stop():
+                return
+
+            if self._is_due(job):
+                job["last_run"] = time.time()
+
+                job["next_interval"] = self._run_job(job) or job["interval"]
+
+    def _run_job(self, job):
+        try:
+            with rate_limit.priority(rate_limit.BACKGROUND):
+                return job["job"](self.should_stop)
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        # Addon's errors are BaseExceptions too
+        except BaseException as error:  # pylint: disable=broad-except
+            player.log(
+                "Service job {} failed: {!r}".format(
+                    getattr(job["job"], "__name__", job["job"]), error
+                )
+            )
+
+        return None
+
+    def run(self):
+        while not self.should_stop():
+            self.run_pending()
+
+            if self.monitor.waitForAbort(self.tick):
+                break
+
+    @staticmethod
+    def _is_due(job):
+        if job["last_run"] is None:
+            return True
+
+        if time.time() - job["last_run"] < job["next_interval"]:
+            return False
+
+        if job["idle_time"] is None:
+            return True
+
+        return player.get_idle_time() >= job["idle_time"] and not player.is_playing()
@@ -0,0 +1,104 @@
+# coding=utf-8
+
+import time
+import sqlite3
+
+from contextlib import closing
+
+from resources.internal import player
+
+STATS_DB = "stats.db"
+
+# Only recent invocations matter, older samples are dropped
+MAX_SAMPLES = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_metric ON samples (metric, id);
+"""
+
+
+def _percentile(values, percent):
+    # Nearest rank, values are sorted
+    rank = max(int(round(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class Stats(object):
+    """Recent samples of named metrics shared by all addon processes"""
+
+    def __init__(self, db_path, max_samples=MAX_SAMPLES):
+        self.db_path = db_path
+        self.max_samples = max_samples
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=10)
+        connection.executescript(SCHEMA)
+
+        return connection
+
+    def record(self, metric, value):
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute(
+                    "INSERT INTO samples (metric, value, time) VALUES (?, ?, ?)",
+                    (metric, value, time.time()),
+                )
+                connection.execute(
+                    "DELETE FROM samples WHERE metric = ? AND id NOT IN ("
+                    "SELECT id FROM samples WHERE metric = ? ORDER BY id DESC LIMIT ?)",
+                    (metric, metric, self.max_samples),
+                )
+
+    def metrics(self):
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT DISTINCT metric FROM samples ORDER BY metric"
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def summary(self, metric):
+        """Count, mean and tail percentiles of metric's recent samples"""
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT value FROM samples WHERE metric = ? ORDER BY id DESC LIMIT ?",
+                (metric, self.max_samples),
+            ).fetchall()
+
+        if not rows:
+            return None
+
+        values = sorted(row[0] for row in rows)
+
+        return {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "p99": _percentile(values, 99),
+            "max": values[-1],
+        }
+
+    def clear(self):
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute("DELETE FROM samples")
+
+
+def get_stats():
+    return Stats(player.get_profile_path(STATS_DB))
+
+
+def record(metric, value):
+    # Instrumentation must never break the request it measures
+    try:
+        get_stats().record(metric, value)
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,454 @@
+# coding=utf-8
+
+import time
+import threading
+
+import requests
+from requests.packages.urllib3.exceptions import HTTPError as StreamReadError
+
+try:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import quote, unquote
+except ImportError:  # pragma: no cover
+    # noinspection PyCompatibility,PyUnresolvedReferences
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import quote, unquote
+
+# Home window property the service publishes proxy's port in
+PORT_PROPERTY = "kinomanuz.stream_proxy_port"
+
+BUFFER_SIZE = 32 * 1024 * 1024
+# Part of the buffer kept behind the player for short backward seeks
+BACK_BUFFER_RATIO = 0.25
+# Requests this far ahead of buffered data wait for it instead of seeking
+SEEK_THRESHOLD = 4 * 1024 * 1024
+
+READ_SIZE = 256 * 1024
+TIMEOUT = 30
+RECONNECT_ATTEMPTS = 2
+
+# Upstream answers meaning the signed link is no longer valid
+EXPIRED_STATUSES = (401, 403, 404, 410)
+
+
+class UpstreamError(BaseException):
+    """Exception for streams that can't be read or resolved"""
+
+
+class LinkExpiredError(UpstreamError):
+    """Exception for signed links rejected by upstream"""
+
+
+# Failures of the upstream connection, it is reopened after them
+UPSTREAM_ERRORS = (
+    requests.RequestException,
+    StreamReadError,
+    EnvironmentError,
+    UpstreamError,
+)
+
+
+def proxy_url(port, *parts):
+    """Proxy url for a stream, parts are passed to the resolver"""
+
+    return "http://127.0.0.1:{}/{}".format(
+        port, "/".join(quote(str(part), safe="") for part in parts)
+    )
+
+
+class RingBuffer(object):
+    """Window [start, end) of a remote file kept in a fixed block of memory
+
+    Not thread-safe, owner has to synchronize access.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.start = 0
+        self.end = 0
+
+        self._view = memoryview(bytearray(capacity))
+
+    def reset(self, offset):
+        self.start = self.end = offset
+
+    def free_view(self):
+        """Contiguous free space after the newest byte, empty if full"""
+
+        free = self.capacity - (self.end - self.start)
+        position = self.end % self.capacity
+
+        return self._view[position : position + min(free, self.capacity - position)]
+
+    def commit(self, size):
+        self.end += size
+
+    def data_view(self, offset, size):
+        """Contiguous buffered data at offset, shares memory with the buffer"""
+
+        position = offset % self.capacity
+        size = min(size, self.end - offset, self.capacity - position)
+
+        return self._view[position : position + max(size, 0)]
+
+    def release(self, offset):
+        """Allow data before offset to be overwritten"""
+
+        self.start = max(self.start, min(offset, self.end))
+
+
+class StreamSession(object):
+    """Upstream connection reading ahead of the player into a ring buffer
+
+    Upstream data is read straight into the buffer and sent to the player
+    from it, without intermediate copies. When the link expires, stream
+    is resolved again and reading continues from the same offset.
+    """
+
+    def __init__(self, resolve, buffer_size=BUFFER_SIZE):
+        self.resolve = resolve
+        self.size = None
+        self.mime_type = None
+        self.error = None
+        self.eof = False
+
+        self.buffer = RingBuffer(buffer_size)
+        self.back_size = int(buffer_size * BACK_BUFFER_RATIO)
+
+        self._stream = None
+        self._response = None
+        self._thread = None
+        self._stopping = False
+        self._condition = threading.Condition()
+        # Serializes seeking, data is sent to the player without holding it
+        self._serve_lock = threading.Lock()
+        # Offsets of views being sent, buffer is never released past them
+        self._pinned = []
+
+    def open(self, offset):
+        """Start reading if needed and wait until file size is known"""
+
+        with self._serve_lock:
+            if self._thread is None or self.error is not None:
+                self._seek(offset)
+
+            with self._condition:
+                self._wait_for(lambda: self.size is not None)
+
+    def serve(self, offset, size, write):
+        """Pass buffered data at offset to write, returns bytes passed"""
+
+        with self._serve_lock:
+            with self._condition:
+                in_reach = (
+                    self.buffer.start <= offset <= self.buffer.end + SEEK_THRESHOLD
+                    and self.error is None
+                )
+
+            if not in_reach:
+                self._seek(offset)
+
+            with self._condition:
+                self.buffer.release(min([offset - self.back_size] + self._pinned))
+                self._condition.notify_all()
+
+                self._wait_for(lambda: self.buffer.end > offset or self.eof)
+                data = self.buffer.data_view(offset, size)
+                self._pinned.append(offset)
+
+        # Slow player only holds back the data it is reading
+        try:
+            if data:
+                write(data)
+        finally:
+            with self._condition:
+                self._pinned.remove(offset)
+                self._condition.notify_all()
+
+        return len(data)
+
+    def close(self):
+        with self._serve_lock:
+            self._stop_fetch()
+
+    def _wait_for(self, predicate):
+        deadline = time.time() + TIMEOUT
+
+        while not predicate():
+            if self.error is not None:
+                raise UpstreamError(self.error)
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise UpstreamError("Upstream timeout")
+
+            self._condition.wait(remaining)
+
+    def _seek(self, offset):
+        self._stop_fetch()
+
+        with self._condition:
+            # Views being sent share memory with the buffer
+            while self._pinned:
+                self._condition.wait()
+
+            self.buffer.reset(offset)
+            self.error = None
+            self.eof = False
+
+        self._thread = threading.Thread(target=self._fetch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _stop_fetch(self):
+        if self._thread is None:
+            return
+
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+        response = self._response
+        if response is not None:
+            response.close()
+
+        self._thread.join()
+        self._thread = None
+        self._stopping = False
+
+    def _fetch(self):
+        attempts = 0
+        refresh = False
+        failure = None
+
+        while not self._stopping:
+            offset = self.buffer.end
+
+            try:
+                self._read_upstream(refresh)
+                return
+            except LinkExpiredError as error:
+                failure = error
+                refresh = True
+            except UPSTREAM_ERRORS as error:
+                failure = error
+                refresh = False
+            finally:
+                self._response = None
+
+            # Only failures in a row count, progress resets the attempts
+            attempts = 1 if self.buffer.end > offset else attempts + 1
+            if attempts > RECONNECT_ATTEMPTS:
+                break
+
+        with self._condition:
+            if failure is not None and not self._stopping:
+                self.error = str(failure)
+            self._condition.notify_all()
+
+    def _read_upstream(self, refresh):
+        if self._stream is None or refresh:
+            self._stream = self.resolve(refresh)
+
+        offset = self.buffer.end
+        headers = dict(self._stream.headers or {})
+        headers["Range"] = "bytes={}-".format(offset)
+
+        self._response = response = requests.get(
+            self._stream.url,
+            headers=headers,
+            stream=True,
+            verify=False,
+            timeout=TIMEOUT,
+        )
+
+        try:
+            if response.status_code in EXPIRED_STATUSES:
+                raise LinkExpiredError("HTTP {}".format(response.status_code))
+
+            if response.status_code == 416 or (
+                self.size is not None and offset >= self.size
+            ):
+                self._set_eof()
+                return
+
+            if response.status_code != 206 and not (
+                response.status_code == 200 and offset == 0
+            ):
+                raise UpstreamError("HTTP {}".format(response.status_code))
+
+            self._set_file_info(response, offset)
+            self._pump(response.raw)
+        finally:
+            response.close()
+
+    def _set_file_info(self, response, offset):
+        if self.size is None:
+            content_range = response.headers.get("Content-Range", "")
+
+            if "/" in content_range:
+                size = int(content_range.split("/")[1])
+            else:
+                size = offset + int(response.headers.get("Content-Length", 0))
+
+            with self._condition:
+                self.size = size
+                self.mime_type = self._stream.mime_type or response.headers.get(
+                    "Content-Type"
+                )
+                self._condition.notify_all()
+
+    def _pump(self, raw):
+        while True:
+            with self._condition:
+                view = self.buffer.free_view()
+
+                while not view and not self._stopping:
+                    self._condition.wait()
+                    view = self.buffer.free_view()
+
+                if self._stopping:
+                    return
+
+            # Free space is never read, so it's filled without holding the lock
+            size = raw.readinto(view[:READ_SIZE])
+
+            if not size:
+                self._set_eof()
+                return
+
+            with self._condition:
+                self.buffer.commit(size)
+                self._condition.notify_all()
+
+    def _set_eof(self):
+        with self._condition:
+            self.eof = True
+            self._condition.notify_all()
+
+
+class StreamProxy(ThreadingMixIn, HTTPServer):
+    """Local HTTP server relaying streams to the player through a read-ahead buffer
+
+    Resolver gets url path parts and refresh flag and returns a Stream.
+    Only the last requested stream is kept, its buffer is dropped once the
+    player asks for another one.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, resolver, port=0, buffer_size=BUFFER_SIZE):
+        HTTPServer.__init__(self, ("127.0.0.1", port), _ProxyHandler)
+
+        self.resolver = resolver
+        self.buffer_size = buffer_size
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_port
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    def get_session(self, parts):
+        with self._lock:
+            session = self._sessions.get(parts)
+
+            if session is None:
+                for old_session in self._sessions.values():
+                    old_session.close()
+
+                session = StreamSession(
+                    lambda refresh: self.resolver(parts, refresh), self.buffer_size
+                )
+                self._sessions = {parts: session}
+
+            return session
+
+
+def _parse_range(range_header):
+    """Start and end (or None) of a "bytes=start-end" header"""
+
+    try:
+        start, end = range_header.split("=", 1)[1].split(",")[0].split("-")
+        return int(start), int(end) if end else None
+    except (AttributeError, IndexError, ValueError):
+        return 0, None
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    # Stalled player connections are dropped instead of blocking a thread
+    timeout = TIMEOUT
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self._serve(send_body=False)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        parts = tuple(unquote(part) for part in self.path.strip("/").split("/"))
+        session = self.server.get_session(parts)
+        start, end = _parse_range(self.headers.get("Range"))
+
+        try:
+            session.open(start)
+        except UpstreamError:
+            self.send_error(502)
+            return
+
+        if start >= session.size:
+            self.send_error(416)
+            return
+        if end is None or end >= session.size:
+            end = session.size - 1
+
+        if self.headers.get("Range"):
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end, session.size)
+            )
+        else:
+            self.send_response(200)
+
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end + 1 - start))
+        if session.mime_type:
+            self.send_header("Content-Type", session.mime_type)
+        self.end_headers()
+
+        if send_body:
+            self._send_range(session, start, end)
+
+    def _send_range(self, session, offset, end):
+        try:
+            while offset <= end:
+                sent = session.serve(
+                    offset, min(READ_SIZE, end + 1 - offset), self.wfile.write
+                )
+                if not sent:
+                    break
+                offset += sent
+        except (UpstreamError, EnvironmentError):
+            # Player closed connection or upstream is gone, nothing to answer
+            pass
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
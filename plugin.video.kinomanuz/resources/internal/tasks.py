@@ -0,0 +1,38 @@
+# coding=utf-8
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from resources.internal import rate_limit
+
+
+def _with_priority(request_priority, function):
+    def wrapper(*args, **kwargs):
+        with rate_limit.priority(request_priority):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def run_in_background(function, *args, **kwargs):
+    """Run function in a separate thread
+
+    Plugin process stays alive until the thread is done, but Kodi gets
+    the listing right away. Its requests yield to the foreground ones.
+    """
+
+    thread = threading.Thread(
+        target=_with_priority(rate_limit.BACKGROUND, function), args=args, kwargs=kwargs
+    )
+    thread.start()
+
+    return thread
+
+
+def map_concurrent(function, items, workers=4):
+    # Workers keep the priority of the calling thread
+    function = _with_priority(rate_limit.get_priority(), function)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, items))
@@ -1,16 +1,30 @@
 # coding=utf-8
 
+import io
+import os
 import re
 import time
 import json
 import random
+import threading
 
 from datetime import datetime
+from functools import partial
+from contextlib import contextmanager
 from collections import OrderedDict
 
 import requests
 
-from resources.internal import player
+try:  # pragma: no cover
+    # noinspection PyCompatibility
+    from urlparse import urlparse, parse_qs
+except ImportError:  # pragma: no cover
+    # noinspection PyCompatibility,PyUnresolvedReferences
+    from urllib.parse import urlparse, parse_qs
+
+from resources.internal import player, cache, tasks, rate_limit, circuit_breaker
+from resources import catalog, episode_parser, models
+from resources.file_lists import FileLists
 
 
 class LoginError(BaseException):
@@ -25,6 +39,88 @@ class NetworkError(BaseException):
     """Exception for network related errors"""
 
 
+class SyncStopped(BaseException):
+    """Exception for catalog sync stopped before it's done"""
+
+
+FILTER_COUNT_TTL = 6 * 60 * 60
+# Without the mirror every count is 2 requests, only the first menu entries
+# are counted then, year menu alone has about a hundred
+FILTER_COUNT_UPSTREAM_MAX = 10
+# Attempts of a catalog sync genre, age rating or favorites pass
+SYNC_PASS_ATTEMPTS = 2
+
+# Validated cookie is trusted this long, unless cookies were seen to expire
+# sooner, then the window is a half of their observed lifetime
+LOGIN_CHECK_INTERVAL = 5 * 60
+LOGIN_CHECK_INTERVAL_MIN = 60
+LOGIN_CHECK_INTERVAL_MAX = 60 * 60
+
+# Upstream responses kept in the persistent cache, by endpoint class
+PAGE_TTL = {"listing": 10 * 60, "search": 10 * 60, "details": 60 * 60}
+# (connect, read) timeouts in seconds, listings should rather fail fast
+TIMEOUTS = {
+    "listing": (3.05, 10),
+    "search": (3.05, 10),
+    "details": (3.05, 15),
+    "stream": (3.05, 15),
+    "login": (5, 30),
+}
+# Idempotent requests are retried on connection errors and timeouts
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
+RETRY_BACKOFF_MAX = 4
+
+# Set on pages served from expired cache entries while the site is down
+STALE_KEY = "_stale"
+STALE_LABEL = "{} [COLOR grey](устарело)[/COLOR]"
+
+FANART_STABLE, FANART_FIRST, FANART_DAILY = range(3)
+
+# Best first, "max_quality" setting is an index in this list
+QUALITY_ORDER = ("full_hd", "hd", "sd", "online")
+
+# TV-Series, TV-Shows, Videoblogs
+SERIES_TYPE_IDS = (2, 3, 4)
+
+# Movie data is shared in-process, e.g. between listing and background tasks
+MOVIE_DATA_TTL = 10 * 60
+MOVIE_DATA_MAX = 16
+
+GENRES_CACHE_KEY = "genres"
+GENRES_CACHE_TTL = 365 * 24 * 60 * 60
+GENRES_REFRESH_AGE = 24 * 60 * 60
+GENRES_SNAPSHOT = os.path.join(os.path.dirname(__file__), "data", "genres.json")
+
+# Final CDN urls are reused for replays and resumes, but never past
+# the expiry time signed into them
+STREAM_URL_TTL = 30 * 60
+STREAM_URL_EXPIRY_MARGIN = 60
+STREAM_URL_EXPIRY_PARAMS = ("expires", "expire", "exp", "e", "valid_until")
+REDIRECT_TIMEOUT = 10
+
+# Missing movies and files are remembered, so retries don't hit the site
+MISSING_TTL = 5 * 60
+
+# Api urls of files are stable, knowing them saves a details request on play
+FILE_URL_TTL = 24 * 60 * 60
+
+# Background resolving can't report errors to anyone
+PREFETCH_ERRORS = (LoginError, NetworkError, MissingVideoError, KeyError, ValueError)
+PREFETCH_WORKERS = 3
+
+MIME_TYPES = {
+    ".mp4": "video/mp4",
+    ".m4v": "video/mp4",
+    ".mkv": "video/x-matroska",
+    ".avi": "video/x-msvideo",
+    ".ts": "video/mp2t",
+    ".webm": "video/webm",
+}
+
+# Session cookies are sent with stream requests only to this host
+SITE_HOST = "kinoman.uz"
+
 SPOOF_USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:70.0) Gecko/20100101 Firefox/70.0"
 )
@@ -88,31 +184,84 @@ def _kinoman_login_check(page):
     return response
 
 
-def _kinoman_login_save_cookies(cookie_dict, user_id):
+def _kinoman_login_save_cookies(cookie_dict, user_id, new_cookie=False):
     player.set_setting("_cookie", json.dumps(cookie_dict))
     player.set_setting("_last_check", int(time.time()))
     player.set_setting("_user_id", int(user_id))
 
+    if new_cookie:
+        player.set_setting("_cookie_issued", int(time.time()))
+
+
+def _record_cookie_lifetime():
+    # Cookie was alive at the last check, that's the safe lifetime estimate
+    issued = player.get_setting("_cookie_issued", "int")
+    last_check = player.get_setting("_last_check", "int")
+
+    if issued and last_check > issued:
+        player.set_setting("_cookie_lifetime", last_check - issued)
+
+
+def login_check_interval():
+    """How long a validated cookie is trusted without asking the site"""
+
+    lifetime = player.get_setting("_cookie_lifetime", "int")
+
+    if not lifetime:
+        return LOGIN_CHECK_INTERVAL
+
+    return max(LOGIN_CHECK_INTERVAL_MIN, min(lifetime // 2, LOGIN_CHECK_INTERVAL_MAX))
+
+
+def _retry_delay(attempt):
+    # Full jitter, so processes that failed together don't retry together
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2**attempt))
+
+
+def _send(request, url, endpoint_class, idempotent=True, **kwargs):
+    """Call session's request method with timeouts of endpoint_class
+
+    Idempotent requests are retried a few times with a growing delay.
+    Every attempt takes its own rate limiter token.
+    """
+
+    attempts = RETRY_ATTEMPTS if idempotent else 1
+
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(_retry_delay(attempt - 1))
+
+        rate_limit.throttle()
+
+        try:
+            return request(
+                url, verify=False, timeout=TIMEOUTS[endpoint_class], **kwargs
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == attempts - 1:
+                raise NetworkError
+
 
-def _kinoman_login(session):
+def _kinoman_login(session, force_check=False):
     cookie = player.get_setting("_cookie")
     last_check = player.get_setting("_last_check", "int")
 
     if cookie:
         session.cookies.update(json.loads(cookie))
 
-        if not last_check or time.time() - last_check > 300:
-            try:
-                page = session.get(
-                    "https://www.kinoman.uz/api/v1/user/profile", verify=False
-                )
-            except (requests.ConnectionError, requests.Timeout):
-                raise NetworkError
+        if (
+            force_check
+            or not last_check
+            or time.time() - last_check > login_check_interval()
+        ):
+            page = _send(
+                session.get, "https://www.kinoman.uz/api/v1/user/profile", "login"
+            )
 
             try:
                 response = _kinoman_login_check(page)
             except LoginError:
-                pass
+                _record_cookie_lifetime()
             else:
                 _kinoman_login_save_cookies(
                     session.cookies.get_dict(), response["user"]["user_id"]
@@ -129,177 +278,326 @@ def _kinoman_login(session):
     if not all(login_data.values()):
         raise LoginError("Не введены логин/пароль")
 
-    try:
-        page = session.post(
-            "https://www.kinoman.uz/api/v1/user/login", json=login_data, verify=False
-        )
-    except (requests.ConnectionError, requests.Timeout):
-        raise NetworkError
+    # Not retried, the site bans ips for too many login attempts
+    page = _send(
+        session.post,
+        "https://www.kinoman.uz/api/v1/user/login",
+        "login",
+        idempotent=False,
+        json=login_data,
+    )
 
     response = _kinoman_login_check(page)
 
-    _kinoman_login_save_cookies(session.cookies.get_dict(), response["user"]["user_id"])
+    _kinoman_login_save_cookies(
+        session.cookies.get_dict(), response["user"]["user_id"], new_cookie=True
+    )
 
     return True
 
 
-def get_page(page_url, payload=None, user_id_required=False):
+def refresh_session():
+    """Validate the cookie or log in again, as the next request would"""
+
     session = requests.Session()
     session.headers.update({"User-Agent": SPOOF_USER_AGENT})
 
-    _kinoman_login(session)
+    try:
+        _kinoman_login(session, force_check=True)
+    finally:
+        session.close()
+
+
+# Shared by all processes, see CircuitBreaker
+_site_breaker = circuit_breaker.CircuitBreaker("site")
+
+
+def get_page(page_url, payload=None, user_id_required=False, endpoint_class="listing"):
+    # During outages navigation fails at once instead of waiting for the site
+    if not _site_breaker.allow_request():
+        raise NetworkError("Сайт недоступен")
 
     try:
-        if payload:
-            if user_id_required:
-                payload["user_id"] = player.get_setting("_user_id", "int")
+        page = _request_page(page_url, payload, user_id_required, endpoint_class)
 
-            response = _json_loads_byteified(
-                session.post(page_url, data=json.dumps(payload), verify=False).text
-            )
-        else:
-            response = _json_loads_byteified(session.get(page_url, verify=False).text)
-    except (requests.ConnectionError, requests.Timeout):
-        raise NetworkError
+        # Error pages of a broken site count as failures too
+        if page.status_code >= 500:
+            raise NetworkError("Ошибка сайта: {}".format(page.status_code))
+    except NetworkError:
+        _site_breaker.record_failure()
+        raise
+
+    _site_breaker.record_success()
+
+    # Movie or file was removed from the site
+    if page.status_code == 404:
+        raise MissingVideoError
+
+    try:
+        return _json_loads_byteified(page.text)
+    except ValueError:
+        raise NetworkError("Неверный ответ сайта")
+
+
+def _request_page(page_url, payload, user_id_required, endpoint_class):
+    session = requests.Session()
+    session.headers.update({"User-Agent": SPOOF_USER_AGENT})
+
+    _kinoman_login(session)
+
+    # Api's posts are queries, so every request can be retried
+    if payload:
+        if user_id_required:
+            payload["user_id"] = player.get_setting("_user_id", "int")
+
+        page = _send(session.post, page_url, endpoint_class, data=json.dumps(payload))
+    else:
+        page = _send(session.get, page_url, endpoint_class)
 
     session.close()
 
-    return response
+    return page
+
+
+def _page_cache_key(endpoint_class, request_id):
+    return "page:{}:{}".format(endpoint_class, request_id)
+
+
+def get_cached_page(
+    endpoint_class,
+    request_id,
+    page_url,
+    payload=None,
+    user_id_required=False,
+    expected_key=None,
+    missing_key=None,
+):
+    """get_page with the response kept in the persistent cache for a while
+
+    Responses without expected_key are errors, they are never cached.
+    If the site can't be reached, expired response is returned if it's still
+    stored, such pages have STALE_KEY set. Missing page is remembered under
+    missing_key, it's checked only when the page isn't cached.
+    """
+
+    page_cache = cache.get_cache()
+    cache_key = _page_cache_key(endpoint_class, request_id)
+
+    def fetch():
+        # get_page adds user_id to payload, it's not a part of the request id
+        data = get_page(
+            page_url,
+            dict(payload) if payload else None,
+            user_id_required,
+            endpoint_class=endpoint_class,
+        )
+
+        if expected_key is None or expected_key in data:
+            page_cache.set(cache_key, data, PAGE_TTL[endpoint_class])
+
+        return data
+
+    data = page_cache.get(cache_key)
+
+    if data is None:
+        with _remember_missing(missing_key):
+            try:
+                # Widgets often start several plugin processes for the same page
+                data = page_cache.single_flight(cache_key, fetch)
+            except NetworkError:
+                data = page_cache.get_stale(cache_key)
+
+                if data is None:
+                    raise
+
+                data[STALE_KEY] = True
+
+    return data
+
+
+def stale_label(label):
+    return STALE_LABEL.format(label)
+
+
+def _pick_screenshot(movie):
+    # Same movie should get the same fanart, otherwise Kodi's texture cache
+    # is filled with useless copies of big images
+    screenshots = movie["screenshots"]
+    fanart_mode = player.get_setting("fanart_mode", "int")
+
+    if fanart_mode == FANART_FIRST:
+        return screenshots[0]
+
+    if fanart_mode == FANART_DAILY:
+        day = datetime.now().date().toordinal()
+        return screenshots[(movie["id"] + day) % len(screenshots)]
+
+    return screenshots[movie["id"] % len(screenshots)]
+
+
+_movie_data_memo = OrderedDict()
+_movie_data_lock = threading.Lock()
 
 
 def get_movie_data(video_id):
+    """Get Movie, same object is returned to every caller for a while
+
+    Returned movie and its file lists must not be changed.
+    """
+
+    with _movie_data_lock:
+        memo = _movie_data_memo.get(video_id)
+
+    if memo is not None and time.time() - memo[0] < MOVIE_DATA_TTL:
+        return memo[1]
+
+    movie = _load_movie_data(video_id)
+
+    with _movie_data_lock:
+        _movie_data_memo[video_id] = (time.time(), movie)
+
+        while len(_movie_data_memo) > MOVIE_DATA_MAX:
+            _movie_data_memo.popitem(last=False)
+
+    return movie
+
+
+def refresh_movie(video_id):
+    """Forget everything cached about the movie, so it's loaded anew"""
+
+    with _movie_data_lock:
+        _movie_data_memo.pop(video_id, None)
+
+    movie_cache = cache.get_cache()
+    movie_cache.delete(_page_cache_key("details", video_id))
+    movie_cache.delete_prefix("missing:{}:".format(video_id))
+    movie_cache.delete_prefix("file_url:{}:".format(video_id))
+
+
+def _missing_key(video_id, *parts):
+    return ":".join(["missing", str(video_id)] + [str(part) for part in parts])
+
+
+@contextmanager
+def _remember_missing(key):
+    """MissingVideoError of the block is raised at once for a while after it
+
+    Without a key the block just runs.
+    """
+
+    if key is None:
+        yield
+        return
+
+    missing_cache = cache.get_cache()
+
+    if missing_cache.get(key):
+        raise MissingVideoError
+
+    try:
+        yield
+    except MissingVideoError:
+        missing_cache.set(key, True, MISSING_TTL)
+        raise
+
+
+def _load_movie_data(video_id):
     page_url = "https://www.kinoman.uz/api/v1/movie/details/{}".format(video_id)
 
-    data = get_page(page_url)
+    # Cached details are the common case, missing movie isn't checked for then
+    data = get_cached_page(
+        "details",
+        video_id,
+        page_url,
+        expected_key="movie",
+        missing_key=_missing_key(video_id, "movie"),
+    )
 
     movie = data["movie"]
 
-    season_n = None
-
-    if re.search(r"\(Сезон [0-9]+", movie["title"]):
-        season_n = re.search(r"\(Сезон ([0-9]+)", movie["title"]).group(1)
-        season_n = season_n.zfill(2)
-    # TV-Series, TV-Shows, Videoblogs
-    elif movie["type_id"] in (2, 3, 4):
-        season_n = "01"
+    season_n = _get_season_n(movie)
 
     poster = "https://{}mp.jpg".format(movie["poster_url"])
 
     if "screenshots" in movie and movie["screenshots"]:
-        screenshot = "https://{}b.jpg".format(
-            random.choice(movie["screenshots"])["title"]  # nosec
-        )
+        screenshot = "https://{}b.jpg".format(_pick_screenshot(movie)["title"])
     else:
         screenshot = poster
 
-    return {
-        "movie_info": {
-            "art": {
-                "icon": poster,
-                "thumb": poster,
-                "poster": poster,
-                "banner": poster,
-                "fanart": screenshot,
-            },
-            "properties": {"Fanart_Image": screenshot},
-            "info": {
-                "cast": [item["title"] for item in movie["actors"]],
-                "director": " / ".join([item["title"] for item in movie["directors"]]),
-                "genre": " / ".join([item["title"] for item in movie["genres"]]),
-                "country": " / ".join([item["title"] for item in movie["countries"]]),
-                "title": movie["title"],
-                "originaltitle": movie["original_title"],
-                "year": movie["release_year"],
-                "premiered": movie["release_date"][:10],
-                "rating": movie["age_rating"],
-                "plot": _cleanhtml(movie["description"]),
-            },
-        },
-        "file_lists": _generate_movie_file_lists(movie, season_n),
-        "series_season_n": season_n,
-    }
+    return models.Movie(
+        movie_id=movie["id"],
+        title=movie["title"],
+        original_title=movie["original_title"],
+        year=movie["release_year"],
+        premiered=movie["release_date"][:10],
+        rating=movie["age_rating"],
+        plot=_cleanhtml(movie["description"]),
+        cast=tuple(item["title"] for item in movie["actors"]),
+        director=" / ".join([item["title"] for item in movie["directors"]]),
+        genre=" / ".join([item["title"] for item in movie["genres"]]),
+        country=" / ".join([item["title"] for item in movie["countries"]]),
+        poster=poster,
+        fanart=screenshot,
+        season_n=season_n,
+        file_lists=_generate_movie_file_lists(movie, season_n),
+        stale=data.get(STALE_KEY, False),
+    )
+
+
+def _get_season_n(movie):
+    season_n = episode_parser.parse_season(movie["title"])
+
+    if season_n is None and movie.get("type_id") in SERIES_TYPE_IDS:
+        season_n = "01"
+
+    return season_n
 
 
 def _generate_movie_file_lists(movie, season_n=None):
-    # Ordered dict to show categories in strict order
-    file_lists = OrderedDict([("online", []), ("sd", []), ("hd", []), ("full_hd", [])])
-
-    for file_type in ("online_files", "download_files"):
-        episodes_counter = 1
-        for video_file in movie[file_type]:
-            if file_type == "online_files":
-                file_name = video_file["title"]
-                file_info = None
-                file_url = "https://www.kinoman.uz/api/v1/movie/online/{}".format(
-                    video_file["secure_id"]
-                )
-                file_cat = "online"
-            else:
-                file_name = video_file["file_name"]
-                file_info = "[CR]".join(
-                    [
-                        "Видео: {} ({}x{})".format(
-                            video_file["name"],
-                            video_file["width"],
-                            video_file["height"],
-                        ),
-                        "Аудио: {}".format(video_file["title"]),
-                    ]
-                )
-                file_url = "https://www.kinoman.uz/api/v1/movie/download/{}".format(
-                    video_file["secure_id"]
-                )
+    return FileLists(movie, season_n)
 
-                # if file['name'] in ('HDTVRIP', 'BDRIP'):
-                #     file_cat = 'hd'
-                # else:
-                #     file_cat = 'sd'
 
-                # Video category according to site's original scripts
-                if 1280 <= int(video_file["width"]) < 1800:
-                    file_cat = "hd"
-                elif int(video_file["width"]) >= 1800:
-                    file_cat = "full_hd"
-                else:
-                    file_cat = "sd"
+def _fetch_genres():
+    data = get_page("https://www.kinoman.uz/api/v1/genre/all")
 
-            if season_n is not None:
-                if re.search(r"e[0-9]+\.", file_name):
-                    episode_num = re.search(r"e([0-9]+)\.", file_name).group(1)
-                else:
-                    episode_num = episodes_counter
-                    episodes_counter += 1
+    genres_list = []
 
-                episode_title = re.sub(r"\(.*[0-9]+\)", "", str(movie["title"])).strip()
-                episode_title = "{} S{}E{}".format(episode_title, season_n, episode_num)
+    for genre in data["genreList"]:
+        genres_list.append((genre["title"], genre["id"]))
 
-                file_episode_data = {
-                    "season": int(season_n),
-                    "episode": int(episode_num),
-                    "title": episode_title,
-                }
-            else:
-                file_episode_data = None
+    genres_list = sorted(genres_list, key=lambda tup: tup[0])
 
-            file_lists[file_cat].append(
-                [file_name, file_url, file_episode_data, file_info]
-            )
+    cache.get_cache().set(
+        GENRES_CACHE_KEY,
+        {"genres": genres_list, "updated": time.time()},
+        GENRES_CACHE_TTL,
+    )
 
-    # Removing categories without files
-    file_lists = OrderedDict([(k, v) for k, v in file_lists.items() if v])
+    return genres_list
 
-    return file_lists
+
+def _refresh_genres():
+    try:
+        _fetch_genres()
+    except (LoginError, NetworkError):
+        pass
 
 
 def _list_genres():
-    data = get_page("https://www.kinoman.uz/api/v1/genre/all")
+    # Genres almost never change, so the list is always served locally
+    # and gets refreshed in background once in a while
+    cached = cache.get_cache().get(GENRES_CACHE_KEY)
 
-    genres_list = []
+    if cached is None:
+        with io.open(GENRES_SNAPSHOT, encoding="utf-8") as snapshot_file:
+            genres_list = json.load(snapshot_file)
+    else:
+        genres_list = cached["genres"]
 
-    for genre in data["genreList"]:
-        genres_list.append((genre["title"], genre["id"]))
+    if cached is None or time.time() - cached["updated"] > GENRES_REFRESH_AGE:
+        tasks.run_in_background(_refresh_genres)
 
-    return sorted(genres_list, key=lambda tup: tup[0])
+    return [(title, genre_id) for title, genre_id in genres_list]
 
 
 def list_categories_video_menu():
@@ -395,34 +693,86 @@ def gen_categories_year():
         yield (year_title, year_query)
 
 
-def get_movies(query):
+def _int_list(value):
+    if isinstance(value, list):
+        return [int(x) for x in value]
+
+    return [int(x) for x in str(value).split(",") if x]
+
+
+def _normalize_filter_query(query):
+    query["sort_type"] = int(query.get("sort_type", 0))
+
+    query["genre_list"] = _int_list(query.get("genre_list", ""))
+    query["genre_black_list"] = _int_list(query.get("genre_black_list", ""))
+    query["content_type_id"] = int(query["content_type_id"])
+
+    if "year" in query:
+        query["year"] = int(query["year"])
+
+    if "age_rating_type" in query:
+        query["age_rating_type"] = int(query["age_rating_type"])
+
+    if "favorite" in query:
+        query["favorite"] = bool(int(query["favorite"]))
+
+    return query
+
+
+def _movies_request(query):
+    """Endpoint class, request id and url of a listing query"""
+
     if "q" in query:
-        page_url = "https://www.kinoman.uz/api/v1/movie/search_by_name"
-        user_id_required = False
-    else:
-        page_url = "https://www.kinoman.uz/api/v1/movie/search_by_filter"
-        user_id_required = True
+        return (
+            "search",
+            query["q"],
+            "https://www.kinoman.uz/api/v1/movie/search_by_name",
+        )
+
+    return (
+        "listing",
+        json.dumps(query, sort_keys=True),
+        "https://www.kinoman.uz/api/v1/movie/search_by_filter",
+    )
+
+
+def _is_menu_listing(query):
+    """Root menu listings and favorites are always asked from the site
 
-        query["sort_type"] = int(query.get("sort_type", 0))
+    Mirror is synced once a day, new releases and favorites would show up
+    that late. Queries are compared normalized, without page and labels.
+    """
 
-        query["genre_list"] = [
-            int(x) for x in query.get("genre_list", "").split(",") if x
-        ]
-        query["genre_black_list"] = [
-            int(x) for x in query.get("genre_black_list", "").split(",") if x
-        ]
-        query["content_type_id"] = int(query["content_type_id"])
+    if "favorite" in query:
+        return True
 
-        if "year" in query:
-            query["year"] = int(query["year"])
+    menu_keys = set(
+        _filter_count_key(_normalize_filter_query(menu_query.copy()))
+        for _, menu_query in list_categories_video_menu()
+    )
+
+    return _filter_count_key(query) in menu_keys
+
+
+def get_movies(query):
+    if "q" not in query:
+        _normalize_filter_query(query)
+
+    data = None
 
-        if "age_rating_type" in query:
-            query["age_rating_type"] = int(query["age_rating_type"])
+    # Only search_filter drill-downs are served by the mirror
+    if "q" not in query and not _is_menu_listing(query):
+        mirror = _get_local_catalog()
 
-        if "favorite" in query:
-            query["favorite"] = bool(int(query["favorite"]))
+        if mirror is not None:
+            data = mirror.search(query)
 
-    data = get_page(page_url, query, user_id_required)
+    if data is None:
+        endpoint_class, request_id, page_url = _movies_request(query)
+
+        data = get_cached_page(
+            endpoint_class, request_id, page_url, query, "q" not in query, "movies"
+        )
 
     res_list = []
 
@@ -445,10 +795,13 @@ def get_movies(query):
                 "year": movie["release_year"],
                 "premiered": movie["release_date"],
                 "plot": "",
+                "mediatype": "movie" if _get_season_n(movie) is None else "tvshow",
             },
         }
 
-        res_list.append([movie_title, movie_id, movie_data])
+        label = stale_label(movie_title) if data.get(STALE_KEY) else movie_title
+
+        res_list.append([label, movie_id, movie_data])
 
     if int(data.get("total_page") or 0) > 1 and query["page"] < data["total_page"]:
         res_list.append(
@@ -458,7 +811,269 @@ def get_movies(query):
     return res_list
 
 
+def _filter_count_key(query):
+    count_query = {
+        k: v for k, v in query.items() if k not in ("page", "category", "title")
+    }
+
+    return "filter_count:" + json.dumps(count_query, sort_keys=True)
+
+
+def _get_local_catalog():
+    if player.get_setting("catalog_mirror", "bool"):
+        mirror = catalog.get_catalog()
+
+        if mirror.is_fresh():
+            return mirror
+
+    return None
+
+
+def get_filter_counts(queries):
+    """Get number of movies for each search_filter query, only if already known"""
+
+    keys = [_filter_count_key(_normalize_filter_query(q.copy())) for q in queries]
+    counts = cache.get_cache().get_many(keys)
+
+    return [counts.get(key) for key in keys]
+
+
+def count_movies(query):
+    query = _normalize_filter_query(query.copy())
+
+    mirror = _get_local_catalog()
+
+    if mirror is not None:
+        count = mirror.count(query)
+    else:
+        page_url = "https://www.kinoman.uz/api/v1/movie/search_by_filter"
+
+        query["page"] = 1
+        data = get_page(page_url, query.copy(), user_id_required=True)
+        count = len(data["movies"])
+        total_page = int(data.get("total_page") or 0)
+
+        # Only the last page can be incomplete
+        if total_page > 1:
+            query["page"] = total_page
+            last_page = get_page(page_url, query.copy(), user_id_required=True)
+            count = count * (total_page - 1) + len(last_page["movies"])
+
+    cache.get_cache().set(_filter_count_key(query), count, FILTER_COUNT_TTL)
+
+    return count
+
+
+def _count_movies_safe(query):
+    try:
+        return count_movies(query)
+    except (LoginError, NetworkError):
+        return None
+
+
+def precompute_filter_counts(queries):
+    """Count movies for search_filter queries concurrently, returns number of counted"""
+
+    if _get_local_catalog() is None:
+        queries = queries[:FILTER_COUNT_UPSTREAM_MAX]
+
+    counts = tasks.map_concurrent(_count_movies_safe, queries)
+
+    return len([count for count in counts if count is not None])
+
+
+def _iter_filter_pages(filters, should_stop):
+    query = {
+        "content_type_id": 0,
+        "genre_list": [],
+        "genre_black_list": [],
+        "sort_type": 0,
+        "page": 1,
+    }
+    query.update(filters)
+
+    while True:
+        if should_stop():
+            raise SyncStopped()
+
+        data = get_page(
+            "https://www.kinoman.uz/api/v1/movie/search_by_filter",
+            query.copy(),
+            user_id_required=True,
+        )
+
+        yield data["movies"]
+
+        if query["page"] >= int(data.get("total_page") or 0):
+            break
+
+        query["page"] += 1
+
+
+def _filter_movie_ids(movies, filters, should_stop):
+    """Ids of mirrored movies matching filters, None if the pass failed"""
+
+    for attempt in range(SYNC_PASS_ATTEMPTS):
+        try:
+            return set(
+                movie["id"]
+                for movies_page in _iter_filter_pages(filters, should_stop)
+                for movie in movies_page
+            ).intersection(movies)
+        except (NetworkError, KeyError, ValueError) as error:
+            player.log(
+                "Catalog pass {} failed, attempt {}: {}".format(
+                    json.dumps(filters, sort_keys=True), attempt + 1, error
+                )
+            )
+
+    return None
+
+
+def _sync_filter_passes():
+    """(filters, movie field, value) of passes collecting what listings lack"""
+
+    try:
+        genres = _fetch_genres()
+    except NetworkError as error:
+        player.log("Catalog genres skipped: {}".format(error))
+        genres = []
+
+    passes = [
+        ({"genre_list": [genre_id]}, "genres", genre_id) for _, genre_id in genres
+    ]
+    passes += [
+        (age_query, "age_rating_type", age_query["age_rating_type"])
+        for _, age_query in gen_categories_age()
+        if age_query
+    ]
+    passes.append(({"favorite": True}, "favorite", True))
+
+    return passes
+
+
+def _sync_catalog(should_stop, progress):
+    movies = OrderedDict()
+    page_size = 0
+
+    filter_passes = _sync_filter_passes()
+    total = 2 + len(filter_passes)
+
+    # Upstream order is unknown, so it is recorded as is for both sort types
+    for sort_type, rank_key in ((0, "rank_default"), (1, "rank_premiere")):
+        rank = 0
+        for movies_page in _iter_filter_pages({"sort_type": sort_type}, should_stop):
+            page_size = max(page_size, len(movies_page))
+
+            for movie in movies_page:
+                entry = movies.setdefault(
+                    movie["id"], {"data": movie, "genres": set(), "favorite": False}
+                )
+                entry[rank_key] = rank
+                rank += 1
+
+        progress(sort_type + 1, total)
+
+    # Listings have no genres or age ratings, so they are collected by filtering
+    for done, (filters, field, value) in enumerate(filter_passes, 3):
+        for movie_id in _filter_movie_ids(movies, filters, should_stop) or ():
+            if field == "genres":
+                movies[movie_id]["genres"].add(value)
+            else:
+                movies[movie_id][field] = value
+
+        progress(done, total)
+
+    catalog.get_catalog().replace(movies.values(), page_size)
+
+    return len(movies)
+
+
+def sync_catalog(should_stop=lambda: False, progress=lambda done, total: None):
+    """Mirror the whole catalog, returns movies count, None if stopped
+
+    Both listings are required. A failed genre, age rating or favorites
+    pass is retried and then skipped, its movies miss that field until the
+    next sync. Old mirror is kept if the sync is stopped or fails.
+    """
+
+    with rate_limit.priority(rate_limit.BACKGROUND):
+        try:
+            return _sync_catalog(should_stop, progress)
+        except SyncStopped:
+            return None
+
+
+def _warm_genres():
+    cached = cache.get_cache().get(GENRES_CACHE_KEY)
+
+    if cached is not None and time.time() - cached["updated"] < GENRES_REFRESH_AGE:
+        return False
+
+    _fetch_genres()
+
+    return True
+
+
+def _warm_movies(query):
+    query = dict(query)
+
+    if "q" not in query:
+        query["page"] = 1
+        _normalize_filter_query(query)
+
+    endpoint_class, request_id, page_url = _movies_request(query)
+
+    if cache.get_cache().get(_page_cache_key(endpoint_class, request_id)) is not None:
+        return False
+
+    get_cached_page(
+        endpoint_class, request_id, page_url, query, "q" not in query, "movies"
+    )
+
+    return True
+
+
+def warm_caches(search_queries, budget, should_stop):
+    """Fill caches behind the first screens, returns upstream requests made
+
+    Root categories' first pages, genres, favorites and recent searches
+    are fetched in this order, until the budget is spent or should_stop()
+    is true. Anything already cached is skipped for free.
+    """
+
+    menu = list_categories_video_menu()
+
+    steps = [partial(_warm_movies, q) for _, q in menu if "favorite" not in q]
+    steps.append(_warm_genres)
+    steps += [partial(_warm_movies, q) for _, q in menu if "favorite" in q]
+    steps += [partial(_warm_movies, {"q": q}) for q in reversed(search_queries)]
+
+    requests_made = 0
+
+    for step in steps:
+        if requests_made >= budget or should_stop():
+            break
+
+        try:
+            if step():
+                requests_made += 1
+        except LoginError:
+            # Nothing else can be fetched without an account
+            break
+        except (NetworkError, KeyError, ValueError):
+            requests_made += 1
+
+    return requests_made
+
+
 def get_movie_files_list(file_lists, video_category=None, season_n=None):
+    """List (category, label, video file) entries, video file is None for folders
+
+    Labels are kept apart from files, so file lists are never changed and
+    can be shared between listings.
+    """
+
     category_names = {
         "online": "стрим",
         "sd": "SD",
@@ -477,31 +1092,32 @@ def get_movie_files_list(file_lists, video_category=None, season_n=None):
         if season_n is not None:
             for f_video_category in file_lists:
                 files.append(
-                    [
-                        "dir",
-                        None,
-                        "Смотреть серии ({})".format(category_names[f_video_category]),
+                    (
                         f_video_category,
+                        "Смотреть серии ({})".format(category_names[f_video_category]),
                         None,
-                        None,
-                    ]
+                    )
                 )
         # List all available files for movies
         else:
             for f_video_category in file_lists:
-                # If it's only a single file, then replace the filename with
-                # tooltip according to format
-                file_name = None
-                if len(file_lists[f_video_category]) == 1:
-                    file_name = file_lists[f_video_category][0][0]
-                    file_lists[f_video_category][0][0] = "Воспроизвести ({})".format(
-                        category_names[f_video_category]
-                    )
-                for video_file in file_lists[f_video_category]:
+                category_files = file_lists[f_video_category]
+
+                # If it's only a single file, then show tooltip according
+                # to format instead of the filename
+                if len(category_files) == 1:
                     files.append(
-                        [f_video_category, file_name if file_name else video_file[0]]
-                        + video_file
+                        (
+                            f_video_category,
+                            "Воспроизвести ({})".format(
+                                category_names[f_video_category]
+                            ),
+                            category_files[0],
+                        )
                     )
+                else:
+                    for video_file in category_files:
+                        files.append((f_video_category, video_file.name, video_file))
 
     # Video format category listing
     else:
@@ -509,22 +1125,227 @@ def get_movie_files_list(file_lists, video_category=None, season_n=None):
             raise MissingVideoError()
 
         for video_file in file_lists[video_category]:
-            files.append([video_category, video_file[0]] + video_file)
+            files.append((video_category, video_file.name, video_file))
 
     return files
 
 
-def get_video_url(video_id, video_type, video_name):
+def get_video_url(video_id, video_type, video_name, refresh=False):
+    """Resolve movie file to a playable Stream
+
+    With refresh cached stream url is ignored, e.g. when its link expired.
+    """
+
+    with _remember_missing(_missing_key(video_id, "file", video_type, video_name)):
+        file_url_key = _file_url_cache_key(video_id, video_type, video_name)
+        file_url = cache.get_cache().get(file_url_key)
+
+        if file_url is not None:
+            return _resolve_video_file(models.VideoFile(video_name, file_url), refresh)
+
+        movie = get_movie_data(video_id)
+
+        video_file = movie.file_lists.find(video_type, video_name)
+
+        if video_file is None:
+            raise MissingVideoError
+
+        cache.get_cache().set(file_url_key, video_file.url, FILE_URL_TTL)
+
+        return _resolve_video_file(video_file, refresh)
+
+
+def _file_url_cache_key(video_id, video_type, video_name):
+    return "file_url:{}:{}:{}".format(video_id, video_type, video_name)
+
+
+def get_next_episode(file_lists, video_type, video_name):
+    """File of the episode after the given one in the same category, if any"""
+
+    video_file = file_lists.find(video_type, video_name)
+
+    if video_file is None or video_file.episode is None:
+        return None
+
+    next_episode = (video_file.episode.season, video_file.episode.episode + 1)
+
+    for next_file in file_lists[video_type]:
+        if next_file.episode is not None and next_file.episode[:2] == next_episode:
+            return next_file
+
+    return None
+
+
+def _prefetch_file(video_id, video_type, video_file):
+    cache.get_cache().set(
+        _file_url_cache_key(video_id, video_type, video_file.name),
+        video_file.url,
+        FILE_URL_TTL,
+    )
+
+    return _get_stream_url(video_file.url)
+
+
+def prefetch_next_episode(video_id, video_type, video_name):
+    """Resolve and cache stream url of the next episode, so it starts right away
+
+    Meant to run in background, so errors are ignored.
+    """
+
+    try:
+        movie = get_movie_data(video_id)
+
+        next_file = get_next_episode(movie.file_lists, video_type, video_name)
+
+        if next_file is None:
+            return None
+
+        return _prefetch_file(video_id, video_type, next_file)
+    except PREFETCH_ERRORS:
+        return None
+
+
+def prefetch_files(video_id, video_type, video_names, workers=PREFETCH_WORKERS):
+    """Resolve and cache stream urls of several files with a bounded pool
+
+    Returns stream urls in the same order, None for files that failed.
+    """
+
+    try:
+        movie = get_movie_data(video_id)
+    except PREFETCH_ERRORS:
+        return [None] * len(video_names)
+
+    def prefetch(video_name):
+        video_file = movie.file_lists.find(video_type, video_name)
+
+        if video_file is None:
+            return None
+
+        try:
+            with rate_limit.priority(rate_limit.BACKGROUND):
+                return _prefetch_file(video_id, video_type, video_file)
+        except PREFETCH_ERRORS:
+            return None
+
+    return tasks.map_concurrent(prefetch, video_names, workers)
+
+
+def pick_best_category(file_lists, max_quality=0):
+    """Best available category not above max_quality, or the closest one above"""
+
+    allowed = QUALITY_ORDER[max_quality:]
+    fallback = tuple(reversed(QUALITY_ORDER[:max_quality]))
+
+    for category in allowed + fallback:
+        if category in file_lists:
+            return category
+
+    return None
+
+
+def get_best_video_url(video_id):
     movie = get_movie_data(video_id)
 
-    # TODO make this look good
+    category = pick_best_category(
+        movie.file_lists, player.get_setting("max_quality", "int")
+    )
+
+    if category is None:
+        raise MissingVideoError
+
+    return _resolve_video_file(movie.file_lists[category][0])
+
+
+def _resolve_video_file(video_file, refresh=False):
+    stream_url = _get_stream_url(video_file.url, refresh)
+
+    return models.Stream(
+        stream_url, _guess_mime_type(video_file.name), _get_stream_headers(stream_url)
+    )
+
+
+def _stream_url_cache_key(api_url):
+    # Api urls end with "online/<secure_id>" or "download/<secure_id>"
+    file_kind, secure_id = api_url.rstrip("/").split("/")[-2:]
+
+    return "stream_url:{}:{}".format(file_kind, secure_id)
+
+
+def _get_stream_url(api_url, refresh=False):
+    stream_cache = cache.get_cache()
+    cache_key = _stream_url_cache_key(api_url)
+
+    stream_url = None if refresh else stream_cache.get(cache_key)
+
+    if stream_url is None:
+        redirect_url = get_page(api_url, endpoint_class="stream")["url"]
+        stream_url = _follow_redirects(redirect_url, _get_stream_headers(redirect_url))
+
+        ttl = _stream_url_ttl(stream_url)
+        if ttl > 0:
+            stream_cache.set(cache_key, stream_url, ttl)
+
+    return stream_url
+
+
+def _follow_redirects(url, headers):
+    """Final url of a redirect chain, so Kodi doesn't walk it on every start"""
+
     try:
-        video_url = next(
-            v[1] for v in movie["file_lists"][video_type] if v[0] == video_name
+        response = requests.head(
+            url,
+            headers=headers,
+            allow_redirects=True,
+            verify=False,
+            timeout=REDIRECT_TIMEOUT,
         )
-    except (StopIteration, IndexError):
-        raise MissingVideoError
+    except requests.RequestException:
+        return url
+
+    # Some hosts don't support HEAD, Kodi will deal with the original url
+    if response.status_code >= 400:
+        return url
+
+    return response.url
+
+
+def _stream_url_ttl(url):
+    ttl = STREAM_URL_TTL
+
+    query = parse_qs(urlparse(url).query)
+
+    for param in STREAM_URL_EXPIRY_PARAMS:
+        value = query.get(param, [""])[0]
+
+        # Only unix timestamps are expiry times
+        if value.isdigit() and len(value) >= 10:
+            ttl = min(ttl, int(value) - time.time() - STREAM_URL_EXPIRY_MARGIN)
+            break
 
-    data = get_page(video_url)
+    return ttl
+
+
+def _guess_mime_type(file_name):
+    return MIME_TYPES.get(os.path.splitext(file_name)[1].lower())
+
+
+def _is_site_url(url):
+    host = urlparse(url).hostname or ""
+
+    return host == SITE_HOST or host.endswith("." + SITE_HOST)
+
+
+def _get_stream_headers(url):
+    headers = {"User-Agent": SPOOF_USER_AGENT}
+
+    # Kodi writes headers of played urls to its log, and CDN hosts don't
+    # need the session, so it goes only to the site itself
+    cookie = player.get_setting("_cookie")
+    if cookie and _is_site_url(url):
+        headers["Cookie"] = "; ".join(
+            "{}={}".format(key, value)
+            for key, value in sorted(json.loads(cookie).items())
+        )
 
-    return data["url"]
+    return headers
@@ -0,0 +1,106 @@
+# coding=utf-8
+
+from collections import namedtuple
+
+
+class EpisodeInfo(namedtuple("EpisodeInfo", ["season", "episode", "title"])):
+    __slots__ = ()
+
+    def info(self):
+        return {"season": self.season, "episode": self.episode, "title": self.title}
+
+
+class Stream(namedtuple("Stream", ["url", "mime_type", "headers"])):
+    """Resolved video url with everything Kodi needs to start playback"""
+
+    __slots__ = ()
+
+
+class _SlotsModel(object):
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            setattr(self, field, fields.get(field))
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "{}({})".format(
+            type(self).__name__,
+            ", ".join(
+                "{}={!r}".format(field, getattr(self, field))
+                for field in self.__slots__
+            ),
+        )
+
+
+class VideoFile(_SlotsModel):
+    __slots__ = ("name", "url", "episode", "description")
+
+    # Explicit, since there could be thousands of files per movie
+    def __init__(self, name, url, episode=None, description=None):
+        # pylint: disable=super-init-not-called
+        self.name = name
+        self.url = url
+        self.episode = episode
+        self.description = description
+
+
+class Movie(_SlotsModel):
+    """Movie details, Kodi's info and art are only built when requested"""
+
+    __slots__ = (
+        "movie_id",
+        "title",
+        "original_title",
+        "year",
+        "premiered",
+        "rating",
+        "plot",
+        "cast",
+        "director",
+        "genre",
+        "country",
+        "poster",
+        "fanart",
+        "season_n",
+        "file_lists",
+        "stale",
+    )
+
+    def art(self):
+        return {
+            "icon": self.poster,
+            "thumb": self.poster,
+            "poster": self.poster,
+            "banner": self.poster,
+            "fanart": self.fanart,
+        }
+
+    def properties(self):
+        return {"Fanart_Image": self.fanart}
+
+    def info(self):
+        return {
+            "cast": list(self.cast),
+            "director": self.director,
+            "genre": self.genre,
+            "country": self.country,
+            "title": self.title,
+            "originaltitle": self.original_title,
+            "year": self.year,
+            "premiered": self.premiered,
+            "rating": self.rating,
+            "plot": self.plot,
+        }
+
+    def video_data(self):
+        return {"art": self.art(), "properties": self.properties(), "info": self.info()}
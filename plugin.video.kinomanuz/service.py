@@ -0,0 +1,130 @@
+# coding=utf-8
+
+import xbmc
+
+from resources.internal import player, stream_proxy, cache, stats
+from resources.internal.scheduler import Scheduler
+from resources import kinoman_api, catalog
+
+# Caches are warmed at start and then again once in a while when Kodi is idle
+WARM_UP_INTERVAL = 30 * 60
+WARM_UP_IDLE_TIME = 5 * 60
+
+# Compaction vacuums the db, so it waits for idle time too
+COMPACT_INTERVAL = 60 * 60
+COMPACT_IDLE_TIME = 5 * 60
+
+# Mirror is checked hourly and synced when Kodi is idle, a few hours before
+# it gets too old to be used
+CATALOG_SYNC_INTERVAL = 60 * 60
+CATALOG_SYNC_IDLE_TIME = 10 * 60
+CATALOG_SYNC_AGE = catalog.CATALOG_MAX_AGE - 4 * 60 * 60
+
+# Session is refreshed a bit before foreground calls would check it
+SESSION_REFRESH_MARGIN = 30
+# Failed logins are not retried often, the site bans ips for too many attempts
+SESSION_RETRY_INTERVAL = 30 * 60
+
+
+def resolve_stream(parts, refresh):
+    """Stream for proxy url parts made by addon's play"""
+
+    video_id, video_type, video_name = parts
+
+    try:
+        return kinoman_api.get_video_url(
+            int(video_id), video_type, video_name, refresh=refresh
+        )
+    except (
+        kinoman_api.LoginError,
+        kinoman_api.NetworkError,
+        kinoman_api.MissingVideoError,
+    ) as error:
+        raise stream_proxy.UpstreamError(repr(error))
+
+
+def start_stream_proxy():
+    buffer_size = player.get_setting("stream_proxy_buffer", "int") * 1024 * 1024
+
+    proxy = stream_proxy.StreamProxy(resolve_stream, buffer_size=buffer_size)
+    proxy.start()
+
+    player.set_window_property(stream_proxy.PORT_PROPERTY, proxy.port)
+
+    return proxy
+
+
+def stop_stream_proxy(proxy):
+    player.clear_window_property(stream_proxy.PORT_PROPERTY)
+
+    proxy.stop()
+
+
+def warm_caches(should_stop):
+    search_queries = []
+    if player.get_setting("search_history_status", "bool"):
+        search_queries = player.get_setting("_search_history", "list")
+
+    kinoman_api.warm_caches(
+        search_queries, player.get_setting("warm_up_budget", "int"), should_stop
+    )
+
+
+def compact_cache(should_stop):  # pylint: disable=unused-argument
+    page_cache = cache.get_cache()
+
+    result = page_cache.compact(player.get_setting("cache_size", "int") * 1024 * 1024)
+    info = page_cache.info()
+
+    stats.record("cache.evicted", result["evicted"])
+    if info["size"]:
+        stats.record("cache.compression_ratio", float(info["raw_size"]) / info["size"])
+
+
+def sync_catalog(should_stop):
+    if not player.get_setting("catalog_mirror", "bool"):
+        return
+
+    if catalog.get_catalog().is_fresh(CATALOG_SYNC_AGE):
+        return
+
+    kinoman_api.sync_catalog(should_stop)
+
+
+def keep_session(should_stop):  # pylint: disable=unused-argument
+    """Refresh session, returns seconds until the next refresh"""
+
+    try:
+        kinoman_api.refresh_session()
+    except kinoman_api.LoginError:
+        return SESSION_RETRY_INTERVAL
+    except kinoman_api.NetworkError:
+        pass
+
+    return kinoman_api.login_check_interval() - SESSION_REFRESH_MARGIN
+
+
+def main():
+    monitor = xbmc.Monitor()
+
+    proxy = None
+    if player.get_setting("stream_proxy", "bool"):
+        proxy = start_stream_proxy()
+
+    scheduler = Scheduler(monitor)
+    scheduler.add(
+        keep_session, kinoman_api.LOGIN_CHECK_INTERVAL - SESSION_REFRESH_MARGIN
+    )
+    scheduler.add(warm_caches, WARM_UP_INTERVAL, WARM_UP_IDLE_TIME)
+    scheduler.add(compact_cache, COMPACT_INTERVAL, COMPACT_IDLE_TIME)
+    scheduler.add(sync_catalog, CATALOG_SYNC_INTERVAL, CATALOG_SYNC_IDLE_TIME)
+
+    try:
+        scheduler.run()
+    finally:
+        if proxy is not None:
+            stop_stream_proxy(proxy)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,39 @@
+# coding=utf-8
+"""Time of building file lists for a movie with thousands of files
+
+Run from the repository root: python -m test.benchmark.bench_episode_parser
+"""
+
+import timeit
+
+from test.benchmark.fixtures import make_movie_details
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources import kinoman_api
+
+FILES = 5000
+REPEAT = 10
+
+
+def main():
+    movie = make_movie_details(files_count=FILES // 2)["movie"]
+
+    seconds = min(
+        timeit.repeat(
+            lambda: kinoman_api._generate_movie_file_lists(movie, "01").items(),
+            number=1,
+            repeat=REPEAT,
+        )
+    )
+
+    print("_generate_movie_file_lists, {} files".format(FILES))
+    print("  time: {:.2f} ms".format(seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
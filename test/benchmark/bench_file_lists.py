@@ -0,0 +1,44 @@
+# coding=utf-8
+"""Time of listing and playing a single category of a movie with many files
+
+Run from the repository root: python -m test.benchmark.bench_file_lists
+"""
+
+import timeit
+
+from test.benchmark.fixtures import make_movie_details
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources import kinoman_api
+
+FILES = 5000
+REPEAT = 10
+
+
+def list_category(movie):
+    return kinoman_api._generate_movie_file_lists(movie, "01")["sd"]
+
+
+def find_last_file(movie):
+    return kinoman_api._generate_movie_file_lists(movie, "01").find(
+        "sd", movie["download_files"][-1]["file_name"]
+    )
+
+
+def main():
+    movie = make_movie_details(files_count=FILES // 2)["movie"]
+
+    print("file lists, {} files".format(FILES))
+
+    for name, function in (("list", list_category), ("play", find_last_file)):
+        seconds = min(timeit.repeat(lambda: function(movie), number=1, repeat=REPEAT))
+        print("  {} single category: {:.2f} ms".format(name, seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
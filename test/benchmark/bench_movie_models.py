@@ -0,0 +1,56 @@
+# coding=utf-8
+"""Transform time and retained memory of movie data for a long series
+
+Run from the repository root: python -m test.benchmark.bench_movie_models
+"""
+
+import timeit
+import tracemalloc
+
+from test.fake_player import FakePlayer
+from test.benchmark.fixtures import make_movie_details
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources import kinoman_api
+
+EPISODES = 200
+REPEAT = 20
+
+
+def load_movie():
+    movie = kinoman_api._load_movie_data(1001)
+    # File lists are lazy, build every category as the eager version did
+    movie.file_lists.items()
+
+    return movie
+
+
+def main():
+    fake_player = FakePlayer()
+    fake_player.set_setting("fanart_mode", 0)
+
+    with mock.patch("resources.kinoman_api.player", fake_player), mock.patch(
+        "resources.kinoman_api.get_cached_page",
+        return_value=make_movie_details(files_count=EPISODES),
+    ):
+        tracemalloc.start()
+        movie = load_movie()
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        seconds = min(timeit.repeat(load_movie, number=1, repeat=REPEAT))
+
+    del movie
+
+    print("get_movie_data, {} episodes x 2 file lists".format(EPISODES))
+    print("  transform time: {:.2f} ms".format(seconds * 1000))
+    print("  retained memory: {:.1f} KiB".format(retained / 1024.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# coding=utf-8
+"""Time and memory of open_movie listing for a long series
+
+Run from the repository root: python -m test.benchmark.bench_open_movie
+"""
+
+import timeit
+import tracemalloc
+
+from test.fake_player import FakePlayer
+from test.benchmark.fixtures import make_movie_details
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    import addon
+
+EPISODES = 200
+REPEAT = 20
+
+
+def main():
+    fake_player = FakePlayer()
+    fake_player.set_setting("fanart_mode", 0)
+
+    # Nothing is written to the persistent cache of the working directory
+    with mock.patch("resources.kinoman_api.player", fake_player), mock.patch(
+        "resources.kinoman_api.get_cached_page",
+        return_value=make_movie_details(files_count=EPISODES),
+    ), mock.patch("resources.kinoman_api.cache"):
+        movie_data = addon.kinoman_api.get_movie_data(1001)
+
+    with mock.patch(
+        "addon.kinoman_api.get_movie_data", return_value=movie_data
+    ), mock.patch("xbmcplugin.addDirectoryItem"):
+        tracemalloc.start()
+        addon.open_movie(1001, "sd")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        seconds = min(
+            timeit.repeat(lambda: addon.open_movie(1001, "sd"), number=1, repeat=REPEAT)
+        )
+
+    print("open_movie, {} episodes".format(EPISODES))
+    print("  time: {:.2f} ms".format(seconds * 1000))
+    print("  peak memory: {:.1f} KiB".format(peak / 1024.0))
+
+
+if __name__ == "__main__":
+    main()
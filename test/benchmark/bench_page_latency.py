@@ -0,0 +1,149 @@
+# coding=utf-8
+"""Tail latency of get_page against a flaky local server
+
+Some requests stall, some connections are dropped without an answer.
+"before" runs requests without timeouts and retries, as get_page used to.
+A stalled connection would hang forever then, here stalls end after
+STALL_SECONDS so the benchmark finishes.
+
+Run from the repository root: python -m test.benchmark.bench_page_latency
+"""
+
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+try:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:  # pragma: no cover
+    # noinspection PyCompatibility,PyUnresolvedReferences
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources import kinoman_api
+    from resources.internal.stats import _percentile
+
+REQUESTS = 200
+WORKERS = 20
+STALL_RATE = 0.03
+DROP_RATE = 0.05
+STALL_SECONDS = 30
+SEED = 1
+
+
+class FlakyServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), FlakyHandler)
+        self.random = random.Random(SEED)
+        self.lock = threading.Lock()
+
+    def url(self):
+        return "http://127.0.0.1:{}/api".format(self.server_port)
+
+    def pick_fault(self):
+        with self.lock:
+            value = self.random.random()
+
+        if value < STALL_RATE:
+            return "stall"
+        if value < STALL_RATE + DROP_RATE:
+            return "drop"
+
+        return None
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        fault = self.server.pick_fault()
+
+        if fault == "drop":
+            self.close_connection = True
+            return
+
+        if fault == "stall":
+            time.sleep(STALL_SECONDS)
+
+        body = b'{"movies": []}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def timed_get_page(url):
+    start = time.time()
+
+    try:
+        kinoman_api.get_page(url)
+    except kinoman_api.NetworkError:
+        return time.time() - start, False
+
+    return time.time() - start, True
+
+
+def run(url):
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        results = list(executor.map(timed_get_page, [url] * REQUESTS))
+
+    latencies = sorted(latency for latency, _ in results)
+    failures = sum(1 for _, success in results if not success)
+
+    return latencies, failures
+
+
+def report(name, latencies, failures):
+    print("  {}:".format(name))
+    print(
+        "    p50 {:.2f} s, p95 {:.2f} s, p99 {:.2f} s, max {:.2f} s".format(
+            _percentile(latencies, 50),
+            _percentile(latencies, 95),
+            _percentile(latencies, 99),
+            latencies[-1],
+        )
+    )
+    print("    failed: {} of {}".format(failures, len(latencies)))
+
+
+def main():
+    server = FlakyServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.daemon = True
+    thread.start()
+
+    print(
+        "get_page, {} requests, {:.0%} stalls, {:.0%} dropped connections".format(
+            REQUESTS, STALL_RATE, DROP_RATE
+        )
+    )
+
+    with mock.patch("resources.kinoman_api._kinoman_login"), mock.patch(
+        "resources.kinoman_api.rate_limit"
+    ), mock.patch("resources.kinoman_api._site_breaker"):
+        with mock.patch(
+            "resources.kinoman_api.TIMEOUTS", {"listing": None}
+        ), mock.patch("resources.kinoman_api.RETRY_ATTEMPTS", 1):
+            report("before", *run(server.url()))
+
+        server.random.seed(SEED)
+        report("after", *run(server.url()))
+
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# coding=utf-8
+
+
+def make_movie_details(movie_id=1001, files_count=200, cast_count=50):
+    """Upstream movie details of a long series with online and SD files"""
+
+    online_files = []
+    download_files = []
+
+    for episode in range(1, files_count + 1):
+        online_files.append(
+            {
+                "id": episode,
+                "secure_id": "secure_id_online_{}".format(episode),
+                "title": "o_test_series_s01e{:02d}.mp4".format(episode),
+                "url": "",
+            }
+        )
+        download_files.append(
+            {
+                "file_id": episode,
+                "secure_id": "secure_id_download_{}".format(episode),
+                "file_name": "test_series_s01e{:02d}.avi".format(episode),
+                "title": "любительское (двухголосое)",
+                "name": "HDTVRIP",
+                "file_size": "1573770620",
+                "width": "720",
+                "height": "400",
+                "lang_title": "русский",
+            }
+        )
+
+    return {
+        "movie": {
+            "id": movie_id,
+            "title": "Test Series (Сезон 1)",
+            "type_id": 2,
+            "release_date": "2019-10-02T05:00:00+05:00",
+            "poster_url": "img.kinoman.uz/p00000_11111",
+            "release_year": 2019,
+            "original_title": "Test Series Original",
+            "description": "<p>Test description</p>" * 20,
+            "age_rating": 18,
+            "countries": [{"id": i, "title": "Country {}".format(i)} for i in range(3)],
+            "genres": [{"id": i, "title": "genre {}".format(i)} for i in range(3)],
+            "directors": [
+                {"id": i, "title": "Director {}".format(i)} for i in range(2)
+            ],
+            "actors": [
+                {"id": i, "title": "Test Actor {}".format(i)} for i in range(cast_count)
+            ],
+            "screenshots": [
+                {"id": i, "title": "img.kinoman.uz/s00000_{}".format(i)}
+                for i in range(10)
+            ],
+            "online_files": online_files,
+            "download_files": download_files,
+        }
+    }
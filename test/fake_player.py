@@ -4,15 +4,16 @@
 class FakePlayer(object):
     def __init__(self):
         self.storage = {}
+        self.window_properties = {}
 
     def get_setting(self, key, var_type="str"):
         if var_type not in ("str", "int", "float", "bool", "list"):
             raise ValueError("Unknown setting type")
 
         if var_type == "int":
-            value = int(self.storage.get(key))
+            value = int(self.storage.get(key) or 0)
         elif var_type == "float":
-            value = float(self.storage.get(key))
+            value = float(self.storage.get(key) or 0)
         elif var_type == "bool":
             value = bool(self.storage.get(key))
         elif var_type == "list":
@@ -28,3 +29,16 @@ class FakePlayer(object):
             value = "|".join(value)
 
         self.storage[key] = value
+
+    @staticmethod
+    def abort_requested():
+        return False
+
+    def get_window_property(self, key):
+        return self.window_properties.get(key, "")
+
+    def set_window_property(self, key, value):
+        self.window_properties[key] = str(value)
+
+    def clear_window_property(self, key):
+        self.window_properties.pop(key, None)
@@ -0,0 +1,70 @@
+# coding=utf-8
+
+import threading
+
+try:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:  # pragma: no cover
+    # noinspection PyCompatibility,PyUnresolvedReferences
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+CONTENT = bytes(bytearray(i % 251 for i in range(300 * 1024)))
+
+
+class RangeServer(ThreadingMixIn, HTTPServer):
+    """Local HTTP server serving CONTENT with Range support"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), RangeHandler)
+        self.accept_ranges = True
+        self.expired_paths = set()
+        self.requested_ranges = []
+        self.lock = threading.Lock()
+
+    def url(self, path="/video.mkv"):
+        return "http://127.0.0.1:{}{}".format(self.server_port, path)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        range_header = self.headers.get("Range")
+
+        if self.path in self.server.expired_paths:
+            self.send_error(403)
+            return
+
+        if range_header and self.server.accept_ranges:
+            start, end = range_header.split("=")[1].split("-")
+            start, end = int(start), int(end or len(CONTENT) - 1)
+            body = CONTENT[start : end + 1]
+
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end, len(CONTENT))
+            )
+        else:
+            body = CONTENT
+            self.send_response(200)
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        with self.server.lock:
+            self.server.requested_ranges.append(range_header)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
@@ -1,6 +1,8 @@
 # coding=utf-8
 # pylint: disable=no-self-use
 
+import os
+import sqlite3
 import unittest
 
 from test.fake_player import FakePlayer
@@ -15,8 +17,22 @@ def fake_path_for(endpoint, query=None, path_vars=None):
     return endpoint, query, path_vars
 
 
+def refresh_menu(video_id):
+    return [("Обновить", ("refresh_movie", None, {"video_id": video_id}))]
+
+
+def play_all_menu(video_type):
+    return [
+        (
+            "Воспроизвести все серии",
+            ("play_all", None, {"video_id": 1000, "video_type": video_type}),
+        )
+    ]
+
+
 with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
     import addon
+    from resources import models
 
 
 @mock.patch("addon.path_for", fake_path_for)
@@ -112,12 +128,15 @@ class TestAddonMenus(unittest.TestCase):
             {
                 "path": ("open_movie", None, {"video_id": 10001}),
                 "is_folder": True,
+                "is_playable": False,
                 "video_data": {},
                 "label": "Test Movie 1 (2019)",
+                "context_menu": refresh_menu(10001),
             },
             {
                 "path": ("list_movies", {"test_param": "test", "page": 2}, None),
                 "is_folder": True,
+                "is_playable": False,
                 "video_data": None,
                 "label": "--> (2 / 10)",
             },
@@ -130,6 +149,44 @@ class TestAddonMenus(unittest.TestCase):
             expected_result, content_type="movies"
         )
 
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    @mock.patch("addon.kinoman_api")
+    def test_list_movies_smart_play(self, mock_kinoman_api, mock_player):
+        movie_data = {"info": {"mediatype": "movie"}}
+        series_data = {"info": {"mediatype": "tvshow"}}
+
+        mock_kinoman_api.get_movies.return_value = [
+            ["Test Movie 1 (2019)", 10001, movie_data],
+            ["Test Series 1 (2019)", 10002, series_data],
+        ]
+        mock_player.set_setting("smart_play", True)
+        mock_player.print_items = mock.MagicMock()
+
+        addon.list_movies({"test_param": "test"})
+
+        expected_result = [
+            {
+                "path": ("play_best", None, {"video_id": 10001}),
+                "is_folder": False,
+                "is_playable": True,
+                "video_data": movie_data,
+                "label": "Test Movie 1 (2019)",
+                "context_menu": refresh_menu(10001),
+            },
+            {
+                "path": ("open_movie", None, {"video_id": 10002}),
+                "is_folder": True,
+                "is_playable": False,
+                "video_data": series_data,
+                "label": "Test Series 1 (2019)",
+                "context_menu": refresh_menu(10002),
+            },
+        ]
+
+        mock_player.print_items.assert_called_once_with(
+            expected_result, content_type="movies"
+        )
+
     @mock.patch("addon.player", new_callable=FakePlayer)
     @mock.patch("addon.kinoman_api")
     def test_search_filter(self, mock_kinoman_api, mock_player):
@@ -180,6 +237,94 @@ class TestAddonMenus(unittest.TestCase):
 
         mock_player.print_items.assert_called_once_with(expected_result)
 
+    @mock.patch("addon.tasks")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    @mock.patch("addon.kinoman_api")
+    def test_search_filter_counts(self, mock_kinoman_api, mock_player, mock_tasks):
+        mock_kinoman_api.gen_categories_video.return_value = [
+            ("Category 1", {"test_cat_id": 1}),
+            ("Category 2", {"test_cat_id": 2}),
+        ]
+        mock_kinoman_api.get_filter_counts.return_value = [312, None]
+
+        mock_player.set_setting("filter_counts", True)
+        mock_player.print_items = mock.MagicMock()
+        mock_player.get_current_url = mock.MagicMock(return_value="test_url")
+
+        addon.search_filter()
+
+        mock_kinoman_api.get_filter_counts.assert_called_once_with(
+            [{"test_cat_id": 1}, {"test_cat_id": 2}]
+        )
+        self.assertListEqual(
+            [item["label"] for item in mock_player.print_items.call_args[0][0]],
+            ["Category 1 (312)", "Category 2"],
+        )
+        mock_tasks.run_in_background.assert_called_once_with(
+            addon._update_filter_counts, [{"test_cat_id": 2}], "test_url"
+        )
+
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    @mock.patch("addon.kinoman_api")
+    def test_update_filter_counts(self, mock_kinoman_api, mock_player):
+        mock_player.refresh_if_current = mock.MagicMock()
+
+        mock_kinoman_api.precompute_filter_counts.return_value = 0
+        addon._update_filter_counts([{}], "test_url")
+        mock_player.refresh_if_current.assert_not_called()
+
+        # Only a part is counted, the rest waits for the next opening
+        mock_kinoman_api.precompute_filter_counts.return_value = 1
+        addon._update_filter_counts([{}, {}], "test_url")
+        mock_player.refresh_if_current.assert_not_called()
+
+        addon._update_filter_counts([{}], "test_url")
+        mock_player.refresh_if_current.assert_called_once_with("test_url")
+
+    @mock.patch("addon.tasks")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    @mock.patch("addon.kinoman_api")
+    def test_search_filter_counts_renders(
+        self, mock_kinoman_api, mock_player, mock_tasks
+    ):
+        counts = {}
+
+        def precompute(queries):
+            # Capped like without the mirror
+            for query in queries[:10]:
+                counts[query["test_cat_id"]] = 1
+            return len(queries[:10])
+
+        mock_kinoman_api.gen_categories_video.return_value = [
+            ("Category", {"test_cat_id": cat_id}) for cat_id in range(20)
+        ]
+        mock_kinoman_api.get_filter_counts.side_effect = lambda queries: [
+            counts.get(query["test_cat_id"]) for query in queries
+        ]
+        mock_kinoman_api.precompute_filter_counts.side_effect = precompute
+        mock_tasks.run_in_background.side_effect = lambda task, *args: task(*args)
+
+        mock_player.set_setting("filter_counts", True)
+        mock_player.print_items = mock.MagicMock()
+        mock_player.get_current_url = mock.MagicMock(return_value="test_url")
+        mock_player.refresh_if_current = mock.MagicMock(
+            side_effect=lambda url: addon.search_filter()
+        )
+
+        # First batch is counted without refreshing the menu
+        addon.search_filter()
+
+        self.assertEqual(mock_kinoman_api.precompute_filter_counts.call_count, 1)
+        mock_player.refresh_if_current.assert_not_called()
+
+        # Next opening counts the rest and shows all counts at once
+        addon.search_filter()
+
+        self.assertEqual(mock_kinoman_api.precompute_filter_counts.call_count, 2)
+        mock_player.refresh_if_current.assert_called_once_with("test_url")
+        labels = [item["label"] for item in mock_player.print_items.call_args[0][0]]
+        self.assertTrue(all(label == "Category (1)" for label in labels))
+
     @mock.patch("addon.player", new_callable=FakePlayer)
     def test_search_noinput(self, mock_player):
         mock_player.dialog_keyboard = mock.MagicMock()
@@ -284,21 +429,144 @@ class TestAddonMenus(unittest.TestCase):
         self.assertListEqual(mock_player.get_setting("_search_history", "list"), [])
         mock_player.redirect_in_place.assert_called_once_with(("root", None, None))
 
+    @mock.patch("addon.tasks")
     @mock.patch("addon.kinoman_api")
     @mock.patch("addon.player", new_callable=FakePlayer)
-    def test_play(self, mock_player, mock_kinoman):
+    def test_play(self, mock_player, mock_kinoman, mock_tasks):
         url_actual_video = "https://test.com/actual_video.mp4"
 
         test_args = [100, "online", "video.mp4"]
 
         mock_player.play = mock.MagicMock()
-        mock_kinoman.get_video_url.return_value = url_actual_video
+        mock_kinoman.get_video_url.return_value = models.Stream(
+            url_actual_video, "video/mp4", {"User-Agent": "test"}
+        )
 
         addon.play(*test_args)
 
         mock_kinoman.get_video_url.assert_called_once_with(*test_args)
-        mock_player.play.assert_called_once_with(url_actual_video)
+        mock_player.play.assert_called_once_with(
+            url_actual_video, "video/mp4", {"User-Agent": "test"}
+        )
+        mock_tasks.run_in_background.assert_called_once_with(
+            mock_kinoman.prefetch_next_episode, *test_args
+        )
+
+    @mock.patch("addon.tasks")
+    @mock.patch("addon.kinoman_api")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    def test_play_stream_proxy(self, mock_player, mock_kinoman, _):
+        mock_player.window_properties["kinomanuz.stream_proxy_port"] = "5000"
+        mock_player.play = mock.MagicMock()
+        mock_kinoman.get_video_url.return_value = models.Stream(
+            "https://test.com/video.mp4", "video/mp4", {"User-Agent": "test"}
+        )
+
+        addon.play(100, "online", "video 1.mp4")
+
+        mock_player.play.assert_called_once_with(
+            "http://127.0.0.1:5000/100/online/video%201.mp4", "video/mp4"
+        )
+
+        # Download files are played directly
+        mock_player.play.reset_mock()
+
+        addon.play(100, "sd", "video 1.mp4")
+
+        mock_player.play.assert_called_once_with(
+            "https://test.com/video.mp4", "video/mp4", {"User-Agent": "test"}
+        )
+
+    @mock.patch("addon.kinoman_api")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    def test_play_best(self, mock_player, mock_kinoman):
+        url_actual_video = "https://test.com/actual_video.mp4"
 
+        mock_player.play = mock.MagicMock()
+        mock_kinoman.get_best_video_url.return_value = models.Stream(
+            url_actual_video, None, {}
+        )
+
+        addon.play_best(100)
+
+        mock_kinoman.get_best_video_url.assert_called_once_with(100)
+        mock_player.play.assert_called_once_with(url_actual_video, None, {})
+
+    @mock.patch("addon.downloader")
+    @mock.patch("addon.kinoman_api")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    def test_download(self, mock_player, mock_kinoman, mock_downloader):
+        mock_player.storage.update(
+            {
+                "download_path": "/downloads",
+                "download_connections": 4,
+                "download_speed_limit": 100,
+            }
+        )
+        mock_player.translate_path = lambda path: path
+        mock_player.notify = mock.MagicMock()
+        mock_player.ProgressBG = mock.MagicMock()
+        mock_kinoman.get_video_url.return_value = models.Stream(
+            "https://test.com/video.mkv", None, {"User-Agent": "test"}
+        )
+
+        addon.download(100, "sd", "video.mkv")
+
+        mock_downloader.Download.assert_called_once_with(
+            "https://test.com/video.mkv",
+            os.path.join("/downloads", "video.mkv"),
+            headers={"User-Agent": "test"},
+            connections=4,
+            rate_limit=100 * 1024,
+            slots=mock_downloader.get_slots.return_value,
+            should_stop=mock_player.abort_requested,
+        )
+        mock_downloader.Download.return_value.run.assert_called_once_with()
+        mock_player.ProgressBG.return_value.close.assert_called_once_with()
+        mock_player.notify.assert_called_once_with("Kinoman.Uz", "Загружено: video.mkv")
+
+    @mock.patch("addon.kinoman_api")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    def test_download_no_folder(self, mock_player, mock_kinoman):
+        mock_player.translate_path = lambda path: path
+        mock_player.dialog_ok = mock.MagicMock()
+
+        addon.download(100, "sd", "video.mkv")
+
+        mock_player.dialog_ok.assert_called_once()
+        mock_kinoman.get_video_url.assert_not_called()
+
+    @mock.patch("addon.kinoman_api")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    def test_catalog_sync(self, mock_player, mock_kinoman):
+        mock_player.notify = mock.MagicMock()
+        mock_player.ProgressBG = mock.MagicMock()
+        mock_kinoman.sync_catalog.return_value = 100
+
+        addon.catalog_sync()
+
+        progress = mock_player.ProgressBG.return_value
+        mock_kinoman.sync_catalog.assert_called_once_with(
+            mock_player.abort_requested, progress.update
+        )
+        progress.close.assert_called_once_with()
+        mock_player.notify.assert_called_with("Kinoman.Uz", "Каталог обновлен: 100")
+
+    @mock.patch("addon.kinoman_api")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    def test_catalog_sync_stopped(self, mock_player, mock_kinoman):
+        mock_player.notify = mock.MagicMock()
+        mock_player.ProgressBG = mock.MagicMock()
+        mock_kinoman.sync_catalog.return_value = None
+
+        addon.catalog_sync()
+
+        mock_player.notify.assert_called_with(
+            "Kinoman.Uz", "Обновление каталога прервано"
+        )
+
+    @mock.patch("addon.endpoint_name", mock.MagicMock(return_value=None))
+    @mock.patch("addon.cache", mock.MagicMock())
     @mock.patch("addon.resolve")
     @mock.patch("addon.kinoman_api")
     @mock.patch("addon.player", new_callable=FakePlayer)
@@ -314,6 +582,8 @@ class TestAddonMenus(unittest.TestCase):
             "Kinoman.Uz", "Ошибка авторизации: test login error"
         )
 
+    @mock.patch("addon.endpoint_name", mock.MagicMock(return_value=None))
+    @mock.patch("addon.cache", mock.MagicMock())
     @mock.patch("addon.resolve")
     @mock.patch("addon.player", new_callable=FakePlayer)
     def test_main_error_missing_video(self, mock_player, mock_resolve):
@@ -325,6 +595,8 @@ class TestAddonMenus(unittest.TestCase):
 
         mock_player.dialog_ok.assert_called_once_with("Kinoman.Uz", "Видео отсутствует")
 
+    @mock.patch("addon.endpoint_name", mock.MagicMock(return_value=None))
+    @mock.patch("addon.cache", mock.MagicMock())
     @mock.patch("addon.resolve")
     @mock.patch("addon.player", new_callable=FakePlayer)
     def test_main_error_network(self, mock_player, mock_resolve):
@@ -338,6 +610,8 @@ class TestAddonMenus(unittest.TestCase):
             "Kinoman.Uz", "Проблема сети, попробуйте позже"
         )
 
+    @mock.patch("addon.endpoint_name", mock.MagicMock(return_value=None))
+    @mock.patch("addon.cache", mock.MagicMock())
     @mock.patch("addon.resolve", mock.MagicMock())
     @mock.patch("addon.kinoman_api", mock.MagicMock())
     @mock.patch("addon.player", new_callable=FakePlayer)
@@ -350,38 +624,197 @@ class TestAddonMenus(unittest.TestCase):
         mock_player.dialog_ok.assert_not_called()
 
 
+@mock.patch("addon.cache")
+@mock.patch("addon.stats")
+@mock.patch("addon.resolve")
+class TestTimedResolve(unittest.TestCase):
+    @mock.patch("addon.time")
+    def test_records_invocation(self, mock_time, mock_resolve, mock_stats, mock_cache):
+        mock_time.time.side_effect = [100, 100.25]
+
+        addon._timed_resolve("plugin://test.plugin/cache/")
+
+        mock_resolve.assert_called_once_with("plugin://test.plugin/cache/")
+        mock_stats.record.assert_called_once_with("invocation.cache_stats", 0.25)
+        mock_cache.get_cache.return_value.flush_lookups.assert_called_once_with()
+
+    def test_records_failed_invocation(self, mock_resolve, mock_stats, mock_cache):
+        mock_resolve.side_effect = addon.kinoman_api.NetworkError
+
+        with self.assertRaises(addon.kinoman_api.NetworkError):
+            addon._timed_resolve("plugin://test.plugin/cache/latency/")
+
+        metric = mock_stats.record.call_args[0][0]
+        self.assertEqual(metric, "invocation.cache_latency")
+        mock_cache.get_cache.return_value.flush_lookups.assert_called_once_with()
+
+    def test_flush_failed(self, mock_resolve, _, mock_cache):
+        mock_resolve.side_effect = addon.kinoman_api.NetworkError
+        flush_lookups = mock_cache.get_cache.return_value.flush_lookups
+        flush_lookups.side_effect = sqlite3.OperationalError("database is locked")
+
+        with self.assertRaises(addon.kinoman_api.NetworkError):
+            addon._timed_resolve("plugin://test.plugin/cache/latency/")
+
+    def test_unknown_url(self, mock_resolve, mock_stats, mock_cache):
+        mock_resolve.side_effect = ValueError
+
+        with self.assertRaises(ValueError):
+            addon._timed_resolve("plugin://test.plugin/unknown/")
+
+        mock_stats.record.assert_not_called()
+        mock_cache.get_cache.return_value.flush_lookups.assert_called_once_with()
+
+
+@mock.patch("addon.path_for", fake_path_for)
+class TestCacheRoutes(unittest.TestCase):
+    @mock.patch("addon.time")
+    @mock.patch("addon.cache")
+    @mock.patch("addon.player")
+    def test_cache_stats(self, mock_player, mock_cache, mock_time):
+        mock_time.time.return_value = 10000
+        page_cache = mock_cache.get_cache.return_value
+        page_cache.info.return_value = {
+            "entries": 3,
+            "size": 2048,
+            "raw_size": 6144,
+            "evictions": 5,
+        }
+        page_cache.class_info.return_value = {
+            "page:listing": {
+                "entries": 2,
+                "size": 1024,
+                "oldest": 10000 - 2 * 60 * 60,
+                "hits": 3,
+                "misses": 1,
+            },
+            "movie": {
+                "entries": 0,
+                "size": 0,
+                "oldest": None,
+                "hits": 0,
+                "misses": 0,
+            },
+        }
+
+        addon.cache_stats()
+
+        items = mock_player.print_items.call_args[0][0]
+        self.assertEqual(
+            items[0]["label"], "Всего: 3 зап., 2.0 КБ (сжатие x3.0), вытеснено 5"
+        )
+        self.assertEqual(items[1]["path"], ("cache_clear", None, None))
+        self.assertEqual(items[2]["path"], ("cache_refresh", None, None))
+        self.assertEqual(items[3]["path"], ("cache_latency", None, None))
+        self.assertEqual(
+            items[4:],
+            [
+                {
+                    "label": "movie: 0 зап., 0.0 КБ, попаданий -",
+                    "path": ("cache_class", None, {"endpoint_class": "movie"}),
+                    "is_folder": True,
+                },
+                {
+                    "label": "page:listing: 2 зап., 1.0 КБ, попаданий 75%,"
+                    " старейшая 2 ч",
+                    "path": ("cache_class", None, {"endpoint_class": "page:listing"}),
+                    "is_folder": True,
+                },
+            ],
+        )
+
+    @mock.patch("addon.cache")
+    @mock.patch("addon.player")
+    def test_cache_clear(self, mock_player, mock_cache):
+        addon.cache_clear("page:listing")
+
+        mock_cache.get_cache.return_value.clear.assert_called_once_with("page:listing")
+        mock_player.redirect_in_place.assert_called_once_with(
+            ("cache_stats", None, None)
+        )
+
+    @mock.patch("addon.cache")
+    @mock.patch("addon.player")
+    def test_cache_refresh_all(self, mock_player, mock_cache):
+        addon.cache_refresh()
+
+        mock_cache.get_cache.return_value.expire.assert_called_once_with(None)
+        mock_player.redirect_in_place.assert_called_once_with(
+            ("cache_stats", None, None)
+        )
+
+    @mock.patch("addon.stats")
+    @mock.patch("addon.player")
+    def test_cache_latency(self, mock_player, mock_stats):
+        invocation_stats = mock_stats.get_stats.return_value
+        invocation_stats.metrics.return_value = [
+            "cache.evicted",
+            "invocation.list_movies",
+        ]
+        invocation_stats.summary.return_value = {
+            "count": 10,
+            "mean": 0.2,
+            "p50": 0.1,
+            "p95": 0.5,
+            "p99": 0.9,
+            "max": 1.2,
+        }
+
+        addon.cache_latency()
+
+        invocation_stats.summary.assert_called_once_with("invocation.list_movies")
+        mock_player.print_items.assert_called_once_with(
+            [
+                {
+                    "label": "invocation.list_movies: 10 шт., p50 100 мс, p95 500 мс,"
+                    " p99 900 мс, макс. 1200 мс",
+                    "path": ("cache_latency", None, None),
+                    "is_folder": True,
+                }
+            ],
+            cache=False,
+        )
+
+
+class TestRefreshMovie(unittest.TestCase):
+    @mock.patch("addon.kinoman_api")
+    @mock.patch("addon.player")
+    def test_refresh_movie(self, mock_player, mock_kinoman):
+        addon.refresh_movie(1000)
+
+        mock_kinoman.refresh_movie.assert_called_once_with(1000)
+        mock_player.refresh_container.assert_called_once_with()
+
+
 @mock.patch("addon.path_for", fake_path_for)
 class TestOpenMovie(unittest.TestCase):
     @mock.patch("addon.kinoman_api")
     @mock.patch("addon.player", new_callable=FakePlayer)
     def test_open_movie(self, mock_player, mock_kinoman):
-        test_movie_data = {
-            "movie_info": {"info": {"plot": "Test description"}},
-            "file_lists": [],
-            "series_season_n": None,
-        }
+        test_movie = models.Movie(
+            plot="Test description", cast=(), file_lists=[], season_n=None
+        )
+        movie_info = test_movie.video_data()
 
         test_files_list = [
-            [
+            (
                 "online",
-                "video1_online.mp4",
                 "Воспроизвести (стрим)",
-                "https://test.com/video1",
-                None,
-                None,
-            ],
-            [
+                models.VideoFile("video1_online.mp4", "https://test.com/video1"),
+            ),
+            (
                 "sd",
-                "video1.mkv",
                 "Воспроизвести (SD)",
-                "https://test.com/video2",
-                None,
-                "Video type info",
-            ],
+                models.VideoFile(
+                    "video1.mkv",
+                    "https://test.com/video2",
+                    description="Video type info",
+                ),
+            ),
         ]
 
         mock_player.print_items = mock.MagicMock()
-        mock_kinoman.get_movie_data.return_value = test_movie_data
+        mock_kinoman.get_movie_data.return_value = test_movie
         mock_kinoman.get_movie_files_list.return_value = test_files_list
 
         addon.open_movie(1000)
@@ -397,9 +830,10 @@ class TestOpenMovie(unittest.TestCase):
                         "video_name": "video1_online.mp4",
                     },
                 ),
-                "video_data": {"info": {"plot": "Test description"}},
+                "video_data": movie_info,
                 "is_folder": False,
                 "is_playable": True,
+                "context_menu": None,
                 "label": "Воспроизвести (стрим)",
             },
             {
@@ -409,39 +843,74 @@ class TestOpenMovie(unittest.TestCase):
                     {"video_id": 1000, "video_type": "sd", "video_name": "video1.mkv"},
                 ),
                 "video_data": {
-                    "info": {"plot": "[B]Video type info[/B][CR][CR]Test description"}
+                    "art": movie_info["art"],
+                    "properties": movie_info["properties"],
+                    "info": movie_info["info"],
+                    "info_overrides": {
+                        "plot": "[B]Video type info[/B][CR][CR]Test description"
+                    },
                 },
                 "is_folder": False,
                 "is_playable": True,
+                "context_menu": [
+                    (
+                        "Скачать",
+                        (
+                            "download",
+                            None,
+                            {
+                                "video_id": 1000,
+                                "video_type": "sd",
+                                "video_name": "video1.mkv",
+                            },
+                        ),
+                    )
+                ],
                 "label": "Воспроизвести (SD)",
             },
         ]
 
         mock_kinoman.get_movie_data.assert_called_once_with(1000)
         mock_kinoman.get_movie_files_list.assert_called_once_with(
-            test_movie_data["file_lists"], None, test_movie_data["series_season_n"]
+            test_movie.file_lists, None, test_movie.season_n
         )
 
         mock_player.print_items.assert_called_once_with(
             expected_result, content_type="movies"
         )
 
+    @mock.patch("addon.kinoman_api.get_movie_files_list")
+    @mock.patch("addon.kinoman_api.get_movie_data")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    def test_open_movie_stale(self, mock_player, mock_get_movie_data, mock_files):
+        mock_player.print_items = mock.MagicMock()
+        mock_get_movie_data.return_value = models.Movie(
+            cast=(), file_lists=[], stale=True
+        )
+        mock_files.return_value = [("online", "Воспроизвести (стрим)", None)]
+
+        addon.open_movie(1000)
+
+        self.assertEqual(
+            mock_player.print_items.call_args[0][0][0]["label"],
+            "Воспроизвести (стрим) [COLOR grey](устарело)[/COLOR]",
+        )
+
     @mock.patch("addon.kinoman_api")
     @mock.patch("addon.player", new_callable=FakePlayer)
     def test_open_series_dir(self, mock_player, mock_kinoman):
-        test_movie_data = {
-            "movie_info": {"info": {"plot": "Test description"}},
-            "file_lists": [],
-            "series_season_n": "01",
-        }
+        test_movie = models.Movie(
+            plot="Test description", cast=(), file_lists=[], season_n="01"
+        )
+        movie_info = test_movie.video_data()
 
         test_files_list = [
-            ["dir", None, "Смотреть серии (стрим)", "online", None, None],
-            ["dir", None, "Смотреть серии (SD)", "sd", None, None],
+            ("online", "Смотреть серии (стрим)", None),
+            ("sd", "Смотреть серии (SD)", None),
         ]
 
         mock_player.print_items = mock.MagicMock()
-        mock_kinoman.get_movie_data.return_value = test_movie_data
+        mock_kinoman.get_movie_data.return_value = test_movie
         mock_kinoman.get_movie_files_list.return_value = test_files_list
 
         addon.open_movie(1000)
@@ -449,23 +918,25 @@ class TestOpenMovie(unittest.TestCase):
         expected_result = [
             {
                 "path": ("open_movie", None, {"video_dir": "online", "video_id": 1000}),
-                "video_data": {"info": {"plot": "Test description"}},
+                "video_data": movie_info,
                 "is_folder": True,
                 "is_playable": False,
+                "context_menu": play_all_menu("online"),
                 "label": "Смотреть серии (стрим)",
             },
             {
                 "path": ("open_movie", None, {"video_dir": "sd", "video_id": 1000}),
-                "video_data": {"info": {"plot": "Test description"}},
+                "video_data": movie_info,
                 "is_folder": True,
                 "is_playable": False,
+                "context_menu": play_all_menu("sd"),
                 "label": "Смотреть серии (SD)",
             },
         ]
 
         mock_kinoman.get_movie_data.assert_called_once_with(1000)
         mock_kinoman.get_movie_files_list.assert_called_once_with(
-            test_movie_data["file_lists"], None, test_movie_data["series_season_n"]
+            test_movie.file_lists, None, test_movie.season_n
         )
 
         mock_player.print_items.assert_called_once_with(
@@ -475,41 +946,23 @@ class TestOpenMovie(unittest.TestCase):
     @mock.patch("addon.kinoman_api")
     @mock.patch("addon.player", new_callable=FakePlayer)
     def test_open_series_files(self, mock_player, mock_kinoman):
-        test_movie_data = {
-            "movie_info": {"info": {"plot": "Test description"}},
-            "file_lists": [],
-            "series_season_n": "01",
-        }
+        test_movie = models.Movie(
+            plot="Test description", cast=(), file_lists=[], season_n="01"
+        )
+        movie_info = test_movie.video_data()
 
-        test_files_list = [
-            [
-                "online",
-                "o_test_series_s01e01.mp4",
-                "o_test_series_s01e01.mp4",
+        test_files_list = []
+        for episode in (1, 2, 3):
+            file_name = "o_test_series_s01e0{}.mp4".format(episode)
+            video_file = models.VideoFile(
+                file_name,
                 "https://www.kinoman.uz/api/v1/movie/online/secure_id1_base64",
-                {"season": 1, "episode": 1, "title": "Test Series S01E01"},
-                None,
-            ],
-            [
-                "online",
-                "o_test_series_s01e02.mp4",
-                "o_test_series_s01e02.mp4",
-                "https://www.kinoman.uz/api/v1/movie/online/secure_id2_base64",
-                {"season": 1, "episode": 2, "title": "Test Series S01E02"},
-                None,
-            ],
-            [
-                "online",
-                "o_test_series_s01e03.mp4",
-                "o_test_series_s01e03.mp4",
-                "https://www.kinoman.uz/api/v1/movie/online/secure_id3_base64",
-                {"season": 1, "episode": 3, "title": "Test Series S01E03"},
-                None,
-            ],
-        ]
+                models.EpisodeInfo(1, episode, "Test Series S01E0{}".format(episode)),
+            )
+            test_files_list.append(("online", file_name, video_file))
 
         mock_player.print_items = mock.MagicMock()
-        mock_kinoman.get_movie_data.return_value = test_movie_data
+        mock_kinoman.get_movie_data.return_value = test_movie
         mock_kinoman.get_movie_files_list.return_value = test_files_list
 
         addon.open_movie(1000, "online")
@@ -526,15 +979,18 @@ class TestOpenMovie(unittest.TestCase):
                     },
                 ),
                 "video_data": {
-                    "info": {
-                        "plot": "Test description",
+                    "art": movie_info["art"],
+                    "properties": movie_info["properties"],
+                    "info": movie_info["info"],
+                    "info_overrides": {
                         "title": "Test Series S01E01",
                         "episode": 1,
                         "season": 1,
-                    }
+                    },
                 },
                 "is_folder": False,
                 "is_playable": True,
+                "context_menu": play_all_menu("online"),
                 "label": "o_test_series_s01e01.mp4",
             },
             {
@@ -548,15 +1004,18 @@ class TestOpenMovie(unittest.TestCase):
                     },
                 ),
                 "video_data": {
-                    "info": {
-                        "plot": "Test description",
+                    "art": movie_info["art"],
+                    "properties": movie_info["properties"],
+                    "info": movie_info["info"],
+                    "info_overrides": {
                         "title": "Test Series S01E02",
                         "episode": 2,
                         "season": 1,
-                    }
+                    },
                 },
                 "is_folder": False,
                 "is_playable": True,
+                "context_menu": play_all_menu("online"),
                 "label": "o_test_series_s01e02.mp4",
             },
             {
@@ -570,28 +1029,82 @@ class TestOpenMovie(unittest.TestCase):
                     },
                 ),
                 "video_data": {
-                    "info": {
-                        "plot": "Test description",
+                    "art": movie_info["art"],
+                    "properties": movie_info["properties"],
+                    "info": movie_info["info"],
+                    "info_overrides": {
                         "title": "Test Series S01E03",
                         "episode": 3,
                         "season": 1,
-                    }
+                    },
                 },
                 "is_folder": False,
                 "is_playable": True,
+                "context_menu": play_all_menu("online"),
                 "label": "o_test_series_s01e03.mp4",
             },
         ]
 
         mock_kinoman.get_movie_data.assert_called_once_with(1000)
         mock_kinoman.get_movie_files_list.assert_called_once_with(
-            test_movie_data["file_lists"], "online", test_movie_data["series_season_n"]
+            test_movie.file_lists, "online", test_movie.season_n
         )
 
         mock_player.print_items.assert_called_once_with(
             expected_result, content_type="episodes"
         )
 
+        # Shared movie info must stay untouched
+        self.assertNotIn("info_overrides", movie_info)
+        self.assertIsNone(movie_info["info"]["title"])
+
+    @mock.patch("addon.kinoman_api")
+    @mock.patch("addon.player", new_callable=FakePlayer)
+    def test_play_all(self, mock_player, mock_kinoman):
+        test_movie = models.Movie(
+            plot="Test description", cast=(), file_lists=[], season_n="01"
+        )
+
+        test_files_list = []
+        for episode in range(1, 6):
+            file_name = "s01e0{}.mp4".format(episode)
+            video_file = models.VideoFile(
+                file_name, "url", models.EpisodeInfo(1, episode, "E{}".format(episode))
+            )
+            test_files_list.append(("online", file_name, video_file))
+
+        mock_player.play_playlist = mock.MagicMock()
+        mock_kinoman.get_movie_data.return_value = test_movie
+        mock_kinoman.get_movie_files_list.return_value = test_files_list
+
+        addon.play_all(1000, "online")
+
+        mock_kinoman.get_movie_files_list.assert_called_once_with(
+            test_movie.file_lists, "online", "01"
+        )
+
+        entries = mock_player.play_playlist.call_args[0][0]
+        self.assertListEqual(
+            [entry["path"] for entry in entries],
+            [
+                (
+                    "play",
+                    None,
+                    {
+                        "video_id": 1000,
+                        "video_type": "online",
+                        "video_name": "s01e0{}.mp4".format(episode),
+                    },
+                )
+                for episode in range(1, 6)
+            ],
+        )
+        self.assertEqual(entries[1]["video_data"]["info_overrides"]["episode"], 2)
+
+        mock_kinoman.prefetch_files.assert_called_once_with(
+            1000, "online", ["s01e02.mp4", "s01e03.mp4", "s01e04.mp4"]
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
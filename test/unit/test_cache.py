@@ -0,0 +1,236 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources.internal import cache
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = cache.Cache(os.path.join(self.temp_dir, "cache.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get("test_key"))
+
+        self.cache.set("test_key", {"test": [1, 2]}, 60)
+
+        self.assertEqual(self.cache.get("test_key"), {"test": [1, 2]})
+
+    def test_get_expired(self):
+        self.cache.set("test_key", "test_value", -1)
+
+        self.assertIsNone(self.cache.get("test_key"))
+
+    def test_get_stale(self):
+        self.assertIsNone(self.cache.get_stale("test_key"))
+
+        self.cache.set("test_key", "test_value", -1)
+
+        self.assertEqual(self.cache.get_stale("test_key"), "test_value")
+
+    def test_get_many(self):
+        self.cache.set("test_key1", 1, 60)
+        self.cache.set("test_key2", 2, -1)
+
+        self.assertEqual(
+            self.cache.get_many(["test_key1", "test_key2", "test_key3"]),
+            {"test_key1": 1},
+        )
+
+    def test_delete(self):
+        self.cache.set("test_key", "test_value", 60)
+        self.cache.delete("test_key")
+
+        self.assertIsNone(self.cache.get("test_key"))
+
+    def test_delete_prefix(self):
+        self.cache.set("file:1:a_b", 1, 60)
+        self.cache.set("file:1:c", 2, 60)
+        self.cache.set("file:10:c", 3, 60)
+        self.cache.set("file:1xa_b", 4, 60)
+
+        self.cache.delete_prefix("file:1:")
+
+        self.assertDictEqual(
+            self.cache.get_many(["file:1:a_b", "file:1:c", "file:10:c", "file:1xa_b"]),
+            {"file:10:c": 3, "file:1xa_b": 4},
+        )
+
+    def test_compression(self):
+        value = {"plot": "Описание " * 1000}
+
+        self.cache.set("small_key", "small_value", 60)
+        self.cache.set("test_key", value, 60)
+
+        self.assertEqual(self.cache.get("small_key"), "small_value")
+        self.assertEqual(self.cache.get("test_key"), value)
+        self.assertEqual(self.cache.get_stale("test_key"), value)
+        self.assertEqual(self.cache.get_many(["test_key"]), {"test_key": value})
+
+        info = self.cache.info()
+        self.assertEqual(info["entries"], 2)
+        self.assertGreater(info["raw_size"], info["size"] * 10)
+
+    @mock.patch("resources.internal.cache.ACCESS_RESOLUTION", -1)
+    def test_compact_lru(self):
+        for key in ("first", "second", "third"):
+            self.cache.set(key, "x" * 100, 60)
+
+        # Read first, so second is the least recently used now
+        self.cache.get("first")
+
+        result = self.cache.compact(max_size=250)
+
+        self.assertDictEqual(result, {"expired": 0, "evicted": 1})
+        self.assertDictEqual(
+            self.cache.get_many(["first", "second", "third"]),
+            {"first": "x" * 100, "third": "x" * 100},
+        )
+        self.assertEqual(self.cache.info()["evictions"], 1)
+
+    def test_compact_expired(self):
+        self.cache.set("stale_key", "stale_value", -60)
+        self.cache.set("old_key", "old_value", -cache.STALE_KEEP - 60)
+
+        self.assertDictEqual(self.cache.compact(), {"expired": 1, "evicted": 0})
+        self.assertEqual(self.cache.get_stale("stale_key"), "stale_value")
+        self.assertIsNone(self.cache.get_stale("old_key"))
+        self.assertEqual(self.cache.info()["evictions"], 0)
+
+    def test_key_class(self):
+        self.assertEqual(cache.key_class("page:listing:/api/movies"), "page:listing")
+        self.assertEqual(cache.key_class("movie:1000"), "movie")
+        self.assertEqual(cache.key_class("test_key"), "test_key")
+
+    def test_clear(self):
+        self.cache.set("page:listing:1", "listing", 60)
+        self.cache.set("page:details:1", "details", 60)
+
+        self.cache.clear("page:listing")
+
+        self.assertIsNone(self.cache.get_stale("page:listing:1"))
+        self.assertEqual(self.cache.get("page:details:1"), "details")
+
+        self.cache.clear()
+
+        self.assertEqual(self.cache.info()["entries"], 0)
+
+    def test_expire(self):
+        self.cache.set("page:listing:1", "listing", 60)
+        self.cache.set("movie:1", "movie", 60)
+
+        self.cache.expire("page:listing")
+
+        self.assertIsNone(self.cache.get("page:listing:1"))
+        self.assertEqual(self.cache.get_stale("page:listing:1"), "listing")
+        self.assertEqual(self.cache.get("movie:1"), "movie")
+
+        self.cache.expire()
+
+        self.assertIsNone(self.cache.get("movie:1"))
+
+    @mock.patch("resources.internal.cache._lookups", cache.Counter())
+    def test_class_info(self):
+        self.cache.set("page:listing:1", "listing", 60)
+        self.cache.set("movie:1", "movie", 60)
+
+        self.cache.get("page:listing:1")
+        self.cache.get("page:listing:2")
+        self.cache.get_many(["movie:1", "movie:2", "movie:3"])
+
+        # Lookups aren't stored until flushed
+        self.assertEqual(self.cache.class_info()["movie"]["hits"], 0)
+
+        self.cache.flush_lookups()
+        self.cache.get("movie:1")
+        self.cache.flush_lookups()
+
+        class_info = self.cache.class_info()
+
+        self.assertEqual(set(class_info), {"page:listing", "movie"})
+        self.assertEqual(class_info["page:listing"]["entries"], 1)
+        self.assertEqual(class_info["page:listing"]["hits"], 1)
+        self.assertEqual(class_info["page:listing"]["misses"], 1)
+        self.assertEqual(class_info["movie"]["hits"], 2)
+        self.assertEqual(class_info["movie"]["misses"], 2)
+        self.assertIsNotNone(class_info["movie"]["oldest"])
+
+    @mock.patch("resources.internal.cache.SCHEMA_VERSION", 100)
+    def test_schema_upgrade(self):
+        self.cache.set("test_key", "test_value", 60)
+
+        with mock.patch("resources.internal.cache.SCHEMA_VERSION", 101):
+            self.assertIsNone(self.cache.get("test_key"))
+
+    def test_lease(self):
+        other_cache = cache.Cache(self.cache.db_path)
+
+        owner = self.cache.acquire_lease("test_key")
+
+        self.assertIsNotNone(owner)
+        self.assertIsNone(other_cache.acquire_lease("test_key"))
+
+        self.cache.release_lease("test_key", owner)
+
+        self.assertIsNotNone(other_cache.acquire_lease("test_key"))
+
+    def test_lease_expired(self):
+        self.cache.acquire_lease("test_key", ttl=-1)
+
+        self.assertIsNotNone(self.cache.acquire_lease("test_key"))
+
+    def test_single_flight(self):
+        compute = mock.MagicMock(return_value="test_value")
+
+        self.assertEqual(self.cache.single_flight("test_key", compute), "test_value")
+        compute.assert_called_once_with()
+
+        # Lease is released even if compute fails
+        compute.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            self.cache.single_flight("test_key", compute)
+
+        self.assertIsNotNone(self.cache.acquire_lease("test_key"))
+
+    def test_single_flight_waits_for_owner(self):
+        self.cache.acquire_lease("test_key")
+        compute = mock.MagicMock()
+
+        timer = threading.Timer(
+            0.2, self.cache.set, args=("test_key", "test_value", 60)
+        )
+        timer.start()
+
+        other_cache = cache.Cache(self.cache.db_path)
+        self.assertEqual(other_cache.single_flight("test_key", compute), "test_value")
+        compute.assert_not_called()
+
+        timer.join()
+
+    @mock.patch("resources.internal.cache.LEASE_POLL_INTERVAL", 0.01)
+    def test_single_flight_owner_failed(self):
+        self.cache.acquire_lease("test_key")
+        compute = mock.MagicMock(return_value="test_value")
+
+        self.assertEqual(
+            self.cache.single_flight("test_key", compute, wait=0.05), "test_value"
+        )
+        compute.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources import catalog
+
+
+def fake_movie(movie_id, type_id=1, year=2019, genres=(), age=None, favorite=False):
+    return {
+        "data": {
+            "id": movie_id,
+            "title": "Test Movie {}".format(movie_id),
+            "type_id": type_id,
+            "release_date": "{}-01-01T05:00:00+05:00".format(year),
+            "poster_url": "img.kinoman.uz/p{}".format(movie_id),
+            "release_year": year,
+        },
+        "genres": set(genres),
+        "age_rating_type": age,
+        "favorite": favorite,
+        "rank_default": movie_id,
+        "rank_premiere": -movie_id,
+    }
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.catalog = catalog.Catalog(os.path.join(self.temp_dir, "catalog.db"))
+
+        self.catalog.replace(
+            [
+                fake_movie(1, type_id=1, year=2010, genres=(10,), age=4),
+                fake_movie(2, type_id=1, year=2019, genres=(10, 12), age=0),
+                fake_movie(3, type_id=2, year=2019, genres=(20,), favorite=True),
+                fake_movie(4, type_id=0, year=2018, genres=(12,), age=1),
+                fake_movie(5, type_id=4, year=2019, genres=(30,)),
+            ],
+            page_size=2,
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def search_ids(self, query):
+        return [m["id"] for m in self.catalog.search(query)["movies"]]
+
+    def test_is_fresh(self):
+        self.assertTrue(self.catalog.is_fresh())
+        self.assertFalse(self.catalog.is_fresh(max_age=0))
+
+    def test_is_fresh_empty(self):
+        empty_catalog = catalog.Catalog(os.path.join(self.temp_dir, "empty.db"))
+
+        self.assertFalse(empty_catalog.is_fresh())
+        self.assertIsNone(empty_catalog.search({"page": 1}))
+
+    def test_search_paging(self):
+        self.assertEqual(
+            self.catalog.search({"content_type_id": 0, "page": 1}),
+            {
+                "movies": [
+                    fake_movie(1, type_id=1, year=2010)["data"],
+                    fake_movie(2, type_id=1, year=2019)["data"],
+                ],
+                "total_page": 3,
+            },
+        )
+        self.assertEqual(self.search_ids({"content_type_id": 0, "page": 3}), [5])
+
+    def test_search_sort_premiere(self):
+        self.assertEqual(
+            self.search_ids({"content_type_id": 0, "sort_type": 1, "page": 1}), [5, 4]
+        )
+
+    def test_search_content_type(self):
+        self.assertEqual(
+            self.search_ids({"content_type_id": 1, "genre_black_list": [12]}), [1]
+        )
+
+    def test_search_cartoons(self):
+        self.assertEqual(
+            self.search_ids({"content_type_id": 0, "genre_list": [12]}), [2, 4]
+        )
+
+    def test_search_cartoons_genre_override(self):
+        # Picking a genre replaces cartoon genre in query, same as upstream
+        self.assertEqual(
+            self.search_ids({"content_type_id": 0, "genre_list": [10]}), [1, 2]
+        )
+
+    def test_search_age_year_favorite(self):
+        self.assertEqual(self.search_ids({"age_rating_type": 0}), [2])
+        self.assertEqual(self.search_ids({"year": 2019, "page": 2}), [5])
+        self.assertEqual(self.search_ids({"favorite": True}), [3])
+
+    def test_search_nothing_found(self):
+        self.assertEqual(
+            self.catalog.search({"year": 1950}), {"movies": [], "total_page": 0}
+        )
+
+    def test_count(self):
+        self.assertEqual(self.catalog.count({"content_type_id": 0}), 5)
+        self.assertEqual(
+            self.catalog.count({"content_type_id": 1, "genre_black_list": [12]}), 1
+        )
+
+    def test_replace(self):
+        self.catalog.replace([fake_movie(6)], page_size=10)
+
+        self.assertEqual(self.search_ids({}), [6])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# coding=utf-8
+
+import unittest
+
+from test.fake_player import FakePlayer
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources.internal import circuit_breaker
+
+
+@mock.patch("resources.internal.circuit_breaker.time")
+@mock.patch("resources.internal.circuit_breaker.player", new_callable=FakePlayer)
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.breaker = circuit_breaker.CircuitBreaker(
+            "test", failure_threshold=2, reset_timeout=30
+        )
+
+    def test_opens_after_failures(self, _, mock_time):
+        mock_time.time.return_value = 1000
+
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_success_resets_failures(self, mock_player, mock_time):
+        mock_time.time.return_value = 1000
+
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertFalse(self.breaker.is_open())
+        self.assertDictEqual(
+            mock_player.window_properties, {"kinomanuz.test.failures": "1"}
+        )
+
+    def test_probe(self, _, mock_time):
+        mock_time.time.return_value = 1000
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        # Only one probe goes through
+        mock_time.time.return_value = 1030
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+        # Failed probe keeps it open
+        self.breaker.record_failure()
+        mock_time.time.return_value = 1059
+        self.assertFalse(self.breaker.allow_request())
+
+        mock_time.time.return_value = 1060
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+
+        self.assertFalse(self.breaker.is_open())
+        self.assertTrue(self.breaker.allow_request())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+# coding=utf-8
+# pylint: disable=protected-access
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+from test.range_server import CONTENT, RangeServer
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources.internal import downloader
+
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "video.mkv")
+
+        self.server = RangeServer()
+        self.server.start()
+        self.url = self.server.url()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def read_file(self):
+        with open(self.path, "rb") as video_file:
+            return video_file.read()
+
+    def test_parallel_ranges(self):
+        progress = mock.MagicMock()
+
+        with mock.patch.object(downloader, "REPORT_INTERVAL", 0):
+            downloader.Download(
+                self.url, self.path, connections=4, progress=progress
+            ).run()
+
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertListEqual(os.listdir(self.temp_dir), ["video.mkv"])
+
+        # Size probe and one request per connection
+        self.assertEqual(len(self.server.requested_ranges), 5)
+        self.assertIn("bytes=230400-307199", self.server.requested_ranges)
+        progress.assert_called_with(len(CONTENT), len(CONTENT))
+
+    def test_existing_file(self):
+        with open(self.path, "wb") as video_file:
+            video_file.write(b"old")
+
+        downloader.Download(self.url, self.path, connections=2).run()
+
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertListEqual(os.listdir(self.temp_dir), ["video.mkv"])
+
+    def test_no_range_support(self):
+        self.server.accept_ranges = False
+
+        downloader.Download(self.url, self.path, connections=4).run()
+
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertEqual(len(self.server.requested_ranges), 2)
+
+    def test_resume(self):
+        half = len(CONTENT) // 2
+
+        # Interrupted download: first half of the second segment is done
+        with open(self.path + ".part", "wb") as part_file:
+            part_file.write(CONTENT[:half] + CONTENT[half : half + 1000])
+        with open(self.path + ".part.json", "w") as state_file:
+            json.dump(
+                {
+                    "total": len(CONTENT),
+                    "segments": [[0, half - 1, half], [half, len(CONTENT) - 1, 1000]],
+                },
+                state_file,
+            )
+
+        downloader.Download(self.url, self.path, connections=2).run()
+
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertListEqual(
+            self.server.requested_ranges,
+            ["bytes=0-0", "bytes={}-{}".format(half + 1000, len(CONTENT) - 1)],
+        )
+
+    def test_expected_size(self):
+        with self.assertRaises(downloader.DownloadError):
+            downloader.Download(
+                self.url, self.path, expected_size=len(CONTENT) + 1
+            ).run()
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_incomplete(self):
+        file_download = downloader.Download(self.url, self.path, connections=2)
+
+        with mock.patch.object(
+            file_download, "_fetch_range", side_effect=IOError("connection lost")
+        ):
+            with self.assertRaises(downloader.DownloadError):
+                file_download.run()
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(os.path.exists(self.path + ".part.json"))
+
+
+class TestConnectionSlots(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "downloads.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_limit(self):
+        slots = downloader.ConnectionSlots(self.db_path, limit=2)
+        other_slots = downloader.ConnectionSlots(self.db_path, limit=2)
+
+        first = slots.acquire(lambda: False)
+        other_slots.acquire(lambda: False)
+
+        # Limit is reached, waiting stops once should_stop is true
+        with mock.patch("resources.internal.downloader.time.sleep") as mock_sleep:
+            self.assertIsNone(
+                other_slots.acquire(mock.MagicMock(side_effect=[False, True]))
+            )
+        mock_sleep.assert_called_once_with(downloader.SLOT_POLL_INTERVAL)
+
+        first.release()
+
+        self.assertIsNotNone(other_slots.acquire(lambda: False))
+
+    def test_expired(self):
+        slots = downloader.ConnectionSlots(self.db_path, limit=1, ttl=-1)
+        slots.acquire(lambda: False)
+
+        # Slot of a crashed process is taken over
+        self.assertIsNotNone(slots.acquire(lambda: False))
+
+    @mock.patch("resources.internal.downloader.SLOT_POLL_INTERVAL", 0.01)
+    def test_download_slots(self):
+        server = RangeServer()
+        server.start()
+        self.addCleanup(server.stop)
+
+        path = os.path.join(self.temp_dir, "video.mkv")
+        slots = downloader.ConnectionSlots(self.db_path, limit=1)
+
+        downloader.Download(server.url(), path, connections=4, slots=slots).run()
+
+        with open(path, "rb") as video_file:
+            self.assertEqual(video_file.read(), CONTENT)
+
+        # All slots are free again
+        self.assertIsNotNone(
+            downloader.ConnectionSlots(self.db_path, limit=1).acquire(lambda: False)
+        )
+
+    def test_should_stop(self):
+        server = RangeServer()
+        server.start()
+        self.addCleanup(server.stop)
+
+        path = os.path.join(self.temp_dir, "video.mkv")
+        slots = downloader.ConnectionSlots(self.db_path, limit=0)
+
+        with mock.patch("resources.internal.downloader.time.sleep"):
+            with self.assertRaises(downloader.DownloadError):
+                downloader.Download(
+                    server.url(), path, slots=slots, should_stop=lambda: True
+                ).run()
+
+        self.assertFalse(os.path.exists(path))
+
+
+class TestRateLimiter(unittest.TestCase):
+    @mock.patch("resources.internal.downloader.time")
+    def test_consume(self, mock_time):
+        mock_time.time.return_value = 100.0
+        rate_limiter = downloader.RateLimiter(1000)
+
+        rate_limiter.consume(500)
+        rate_limiter.consume(500)
+
+        self.assertListEqual(
+            [call[0][0] for call in mock_time.sleep.call_args_list], [0.5, 1.0]
+        )
+
+    @mock.patch("resources.internal.downloader.time")
+    def test_unlimited(self, mock_time):
+        downloader.RateLimiter(0).consume(500)
+
+        mock_time.sleep.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+# coding=utf-8
+
+import unittest
+
+from resources import episode_parser, models
+
+
+class TestEpisodeParser(unittest.TestCase):
+    def test_parse_season(self):
+        self.assertEqual(episode_parser.parse_season("Test Series (Сезон 1)"), "01")
+        self.assertEqual(episode_parser.parse_season("Test Series (Сезон 10)"), "10")
+        self.assertIsNone(episode_parser.parse_season("Test Movie"))
+
+    def test_parse(self):
+        parser = episode_parser.EpisodeParser("Test Series (Сезон 1)", "01")
+
+        self.assertEqual(
+            parser.parse("test_series_s01e05.avi"),
+            models.EpisodeInfo(1, 5, "Test Series S01E05"),
+        )
+
+    def test_parse_no_episode_numbers(self):
+        parser = episode_parser.EpisodeParser("Test Vlog (2019)", "01")
+
+        self.assertListEqual(
+            [parser.parse("vlog_{}.mp4".format(x)) for x in ("a", "b")],
+            [
+                models.EpisodeInfo(1, 1, "Test Vlog S01E1"),
+                models.EpisodeInfo(1, 2, "Test Vlog S01E2"),
+            ],
+        )
+
+    def test_skip(self):
+        parser = episode_parser.EpisodeParser("Test Vlog (2019)", "01")
+
+        parser.skip("vlog_a.mp4")
+        parser.skip("vlog_s01e07.mp4")
+
+        self.assertEqual(parser.parse("vlog_b.mp4").episode, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
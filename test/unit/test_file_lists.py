@@ -0,0 +1,94 @@
+# coding=utf-8
+# pylint: disable=protected-access
+
+import unittest
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+from resources import file_lists, models
+
+
+def fake_download_file(file_name, width):
+    return {
+        "secure_id": "secure_{}".format(file_name),
+        "file_name": file_name,
+        "title": "дублированное",
+        "name": "WEBRIP",
+        "width": str(width),
+        "height": "400",
+    }
+
+
+class TestFileLists(unittest.TestCase):
+    def setUp(self):
+        self.movie = {
+            "title": "Test Vlog (Сезон 2)",
+            "online_files": [{"secure_id": "secure_o1", "title": "o_vlog_a.mp4"}],
+            "download_files": [
+                fake_download_file("vlog_a.avi", 720),
+                fake_download_file("vlog_a_1080.mkv", 1920),
+                fake_download_file("vlog_b.avi", 720),
+                fake_download_file("vlog_b_1080.mkv", 1920),
+            ],
+        }
+
+    def test_categories(self):
+        lists = file_lists.FileLists(self.movie)
+
+        self.assertListEqual(list(lists), ["online", "sd", "full_hd"])
+        self.assertEqual(len(lists), 3)
+        self.assertIn("sd", lists)
+        self.assertNotIn("hd", lists)
+
+        with self.assertRaises(KeyError):
+            lists["hd"]  # pylint: disable=pointless-statement
+
+    def test_empty(self):
+        self.assertFalse(
+            file_lists.FileLists({"online_files": [], "download_files": []})
+        )
+
+    def test_only_requested_category_is_built(self):
+        lists = file_lists.FileLists(self.movie)
+
+        with mock.patch.object(
+            lists, "_build_download_file", wraps=lists._build_download_file
+        ) as mock_build:
+            full_hd = lists["full_hd"]
+
+            self.assertIs(lists["full_hd"], full_hd)
+
+        self.assertEqual(mock_build.call_count, 2)
+        self.assertListEqual(list(lists._files), ["full_hd"])
+
+    def test_episode_numbers_across_categories(self):
+        lists = file_lists.FileLists(self.movie, "02")
+
+        self.assertListEqual(
+            [video_file.episode for video_file in lists["full_hd"]],
+            [
+                models.EpisodeInfo(2, 2, "Test Vlog S02E2"),
+                models.EpisodeInfo(2, 4, "Test Vlog S02E4"),
+            ],
+        )
+        self.assertEqual(
+            lists["online"][0].episode, models.EpisodeInfo(2, 1, "Test Vlog S02E1")
+        )
+
+    def test_find(self):
+        lists = file_lists.FileLists(self.movie)
+
+        self.assertEqual(
+            lists.find("sd", "vlog_b.avi").url,
+            "https://www.kinoman.uz/api/v1/movie/download/secure_vlog_b.avi",
+        )
+        self.assertIsNone(lists.find("sd", "vlog_b_1080.mkv"))
+        self.assertIsNone(lists.find("hd", "vlog_b.avi"))
+        self.assertListEqual(list(lists._files), ["sd"])
+
+
+if __name__ == "__main__":
+    unittest.main()
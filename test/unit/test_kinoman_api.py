@@ -1,8 +1,11 @@
 # coding=utf-8
 # pylint: disable=protected-access
 
+import os
 import time
 import json
+import shutil
+import tempfile
 import unittest
 
 from collections import namedtuple, OrderedDict
@@ -17,36 +20,144 @@ except ImportError:
 import requests
 
 with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
-    from resources import kinoman_api
+    from resources import kinoman_api, models
+    from resources.file_lists import FileLists
+    from resources.internal import rate_limit, circuit_breaker, cache
+
+
+def fake_empty_cache():
+    mock_cache = mock.MagicMock()
+    mock_cache.get_cache().get.return_value = None
+    mock_cache.get_cache().single_flight.side_effect = lambda key, compute: compute()
+
+    return mock_cache
 
 
 class TestMinorStuff(unittest.TestCase):
     def test_cleanhtml(self):
         self.assertEqual(kinoman_api._cleanhtml("<p>Some text</p>"), "Some text")
 
+    @mock.patch("resources.kinoman_api.cache", fake_empty_cache())
+    @mock.patch("resources.kinoman_api._follow_redirects", lambda url, headers: url)
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
     @mock.patch("resources.kinoman_api.get_movie_data")
     @mock.patch("resources.kinoman_api.get_page")
-    def test_get_video_url(self, mock_get_page, mock_get_movie_data):
+    def test_get_video_url(self, mock_get_page, mock_get_movie_data, mock_player):
+        mock_player.set_setting("_cookie", '{"token": "abc", "lang": "ru"}')
         mock_get_page.return_value = {"url": "http://test.com/test_url"}
-        mock_get_movie_data.return_value = {
-            "file_lists": {"online": [["video.mp4", "video_url"]]}
-        }
+        mock_get_movie_data.return_value = models.Movie(
+            file_lists=FileLists(
+                {
+                    "online_files": [{"secure_id": "secure_id1", "title": "video.mp4"}],
+                    "download_files": [],
+                }
+            )
+        )
         self.assertEqual(
             kinoman_api.get_video_url(100, "online", "video.mp4"),
-            "http://test.com/test_url",
+            models.Stream(
+                "http://test.com/test_url",
+                "video/mp4",
+                {"User-Agent": kinoman_api.SPOOF_USER_AGENT},
+            ),
+        )
+        mock_get_page.assert_called_once_with(
+            "https://www.kinoman.uz/api/v1/movie/online/secure_id1",
+            endpoint_class="stream",
         )
 
+    @mock.patch("resources.kinoman_api.cache", fake_empty_cache())
     @mock.patch("resources.kinoman_api.get_movie_data")
     @mock.patch("resources.kinoman_api.get_page")
     def test_get_video_url_bad(self, mock_get_page, mock_get_movie_data):
         mock_get_page.return_value = {"url": "http://test.com/test_url"}
-        mock_get_movie_data.return_value = {
-            "file_lists": {"online": [["video.mp4", "video_url"]]}
-        }
+        mock_get_movie_data.return_value = models.Movie(
+            file_lists=FileLists(
+                {
+                    "online_files": [{"secure_id": "secure_id1", "title": "video.mp4"}],
+                    "download_files": [],
+                }
+            )
+        )
 
         with self.assertRaises(kinoman_api.MissingVideoError):
             kinoman_api.get_video_url(100, "online", "video1.mp4")
 
+        with self.assertRaises(kinoman_api.MissingVideoError):
+            kinoman_api.get_video_url(100, "sd", "video.mp4")
+
+    @mock.patch("resources.kinoman_api._get_stream_url")
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    @mock.patch("resources.kinoman_api.get_movie_data")
+    @mock.patch("resources.kinoman_api.cache")
+    def test_get_video_url_known_file(
+        self, mock_cache, mock_get_movie_data, mock_player, mock_get_stream_url
+    ):
+        mock_cache.get_cache().get.side_effect = {
+            "file_url:100:sd:video.avi": "movie/download/secure_id2"
+        }.get
+        mock_get_stream_url.return_value = "http://cdn.test.com/video.avi"
+
+        stream = kinoman_api.get_video_url(100, "sd", "video.avi")
+
+        self.assertEqual(stream.url, "http://cdn.test.com/video.avi")
+        self.assertEqual(stream.mime_type, "video/x-msvideo")
+        mock_cache.get_cache().get.assert_called_with("file_url:100:sd:video.avi")
+        mock_get_stream_url.assert_called_once_with("movie/download/secure_id2", False)
+        mock_get_movie_data.assert_not_called()
+
+    def test_pick_best_category(self):
+        file_lists = {"online": [], "sd": [], "hd": []}
+
+        self.assertEqual(kinoman_api.pick_best_category(file_lists), "hd")
+        self.assertEqual(kinoman_api.pick_best_category(file_lists, 2), "sd")
+        self.assertEqual(kinoman_api.pick_best_category(file_lists, 3), "online")
+        self.assertEqual(kinoman_api.pick_best_category({"hd": []}, 2), "hd")
+        self.assertIsNone(kinoman_api.pick_best_category({}))
+
+    @mock.patch("resources.kinoman_api.cache", fake_empty_cache())
+    @mock.patch("resources.kinoman_api._follow_redirects", lambda url, headers: url)
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    @mock.patch("resources.kinoman_api.get_movie_data")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_best_video_url(self, mock_get_page, mock_get_movie_data, mock_player):
+        mock_player.set_setting("max_quality", 1)
+        mock_get_page.return_value = {"url": "http://test.com/test_url"}
+        mock_get_movie_data.return_value = models.Movie(
+            file_lists=OrderedDict(
+                [
+                    ("online", [models.VideoFile("video.mp4", "movie/online/1")]),
+                    ("sd", [models.VideoFile("video.avi", "movie/download/2")]),
+                    ("full_hd", [models.VideoFile("video.mkv", "movie/download/3")]),
+                ]
+            )
+        )
+
+        stream = kinoman_api.get_best_video_url(100)
+
+        self.assertEqual(stream.url, "http://test.com/test_url")
+        self.assertEqual(stream.mime_type, "video/x-msvideo")
+        self.assertDictEqual(
+            stream.headers, {"User-Agent": kinoman_api.SPOOF_USER_AGENT}
+        )
+        mock_get_page.assert_called_once_with(
+            "movie/download/2", endpoint_class="stream"
+        )
+
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    @mock.patch("resources.kinoman_api.get_movie_data")
+    def test_get_best_video_url_no_files(self, mock_get_movie_data, mock_player):
+        mock_player.set_setting("max_quality", 0)
+        mock_get_movie_data.return_value = models.Movie(file_lists={})
+
+        with self.assertRaises(kinoman_api.MissingVideoError):
+            kinoman_api.get_best_video_url(100)
+
+    def test_guess_mime_type(self):
+        self.assertEqual(kinoman_api._guess_mime_type("video.MKV"), "video/x-matroska")
+        self.assertIsNone(kinoman_api._guess_mime_type("video.unknown"))
+        self.assertIsNone(kinoman_api._guess_mime_type("video"))
+
     def test_json_loads_byteified_dict(self):
         self.assertDictEqual(
             kinoman_api._json_loads_byteified('{"title": "тест"}'), {"title": "тест"}
@@ -58,7 +169,265 @@ class TestMinorStuff(unittest.TestCase):
         )
 
 
+class TestStreamUrl(unittest.TestCase):
+    api_url = "https://www.kinoman.uz/api/v1/movie/online/secure_id1"
+
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    def test_get_stream_headers(self, mock_player):
+        mock_player.set_setting("_cookie", '{"token": "abc", "lang": "ru"}')
+
+        for url in ("https://kinoman.uz/a", "https://stream.kinoman.uz/a"):
+            self.assertEqual(
+                kinoman_api._get_stream_headers(url)["Cookie"], "lang=ru; token=abc"
+            )
+
+        for url in ("https://cdn.test.com/a", "https://kinoman.uz.test.com/a"):
+            self.assertNotIn("Cookie", kinoman_api._get_stream_headers(url))
+
+    @mock.patch("resources.kinoman_api._follow_redirects")
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api.cache")
+    def test_get_stream_url(self, mock_cache, mock_get_page, mock_follow):
+        mock_cache.get_cache().get.return_value = None
+        mock_get_page.return_value = {"url": "http://test.com/redirect"}
+        mock_follow.return_value = "http://cdn.test.com/video.mp4"
+
+        self.assertEqual(
+            kinoman_api._get_stream_url(self.api_url),
+            "http://cdn.test.com/video.mp4",
+        )
+        mock_follow.assert_called_once_with(
+            "http://test.com/redirect", {"User-Agent": kinoman_api.SPOOF_USER_AGENT}
+        )
+        mock_cache.get_cache().set.assert_called_once_with(
+            "stream_url:online:secure_id1",
+            "http://cdn.test.com/video.mp4",
+            kinoman_api.STREAM_URL_TTL,
+        )
+
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api.cache")
+    def test_get_stream_url_cached(self, mock_cache, mock_get_page):
+        mock_cache.get_cache().get.return_value = "http://cdn.test.com/video.mp4"
+
+        self.assertEqual(
+            kinoman_api._get_stream_url(self.api_url),
+            "http://cdn.test.com/video.mp4",
+        )
+        mock_cache.get_cache().get.assert_called_once_with(
+            "stream_url:online:secure_id1"
+        )
+        mock_get_page.assert_not_called()
+
+    @mock.patch("resources.kinoman_api._follow_redirects")
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api.cache")
+    def test_get_stream_url_refresh(self, mock_cache, mock_get_page, mock_follow):
+        mock_cache.get_cache().get.return_value = "http://cdn.test.com/old.mp4"
+        mock_get_page.return_value = {"url": "http://test.com/redirect"}
+        mock_follow.return_value = "http://cdn.test.com/video.mp4"
+
+        self.assertEqual(
+            kinoman_api._get_stream_url(self.api_url, refresh=True),
+            "http://cdn.test.com/video.mp4",
+        )
+        mock_cache.get_cache().get.assert_not_called()
+
+    @mock.patch("resources.kinoman_api._follow_redirects")
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api.cache")
+    def test_get_stream_url_expired(self, mock_cache, mock_get_page, mock_follow):
+        mock_cache.get_cache().get.return_value = None
+        mock_get_page.return_value = {"url": "http://test.com/redirect"}
+        mock_follow.return_value = "http://cdn.test.com/video.mp4?expires=1000000000"
+
+        kinoman_api._get_stream_url(self.api_url)
+
+        mock_cache.get_cache().set.assert_not_called()
+
+    @mock.patch("resources.kinoman_api.time")
+    def test_stream_url_ttl(self, mock_time):
+        mock_time.time.return_value = 1600000000
+
+        self.assertEqual(
+            kinoman_api._stream_url_ttl("http://cdn.test.com/video.mp4?e=1600000600"),
+            600 - kinoman_api.STREAM_URL_EXPIRY_MARGIN,
+        )
+        self.assertEqual(
+            kinoman_api._stream_url_ttl("http://cdn.test.com/video.mp4?e=1700000000"),
+            kinoman_api.STREAM_URL_TTL,
+        )
+        self.assertEqual(
+            kinoman_api._stream_url_ttl("http://cdn.test.com/video.mp4?e=10&st=abc"),
+            kinoman_api.STREAM_URL_TTL,
+        )
+
+    @mock.patch("requests.head")
+    def test_follow_redirects(self, mock_head):
+        mock_head.return_value = mock.MagicMock(
+            status_code=200, url="http://cdn.test.com/video.mp4"
+        )
+
+        self.assertEqual(
+            kinoman_api._follow_redirects("http://test.com/redirect", {"a": "b"}),
+            "http://cdn.test.com/video.mp4",
+        )
+        mock_head.assert_called_once_with(
+            "http://test.com/redirect",
+            headers={"a": "b"},
+            allow_redirects=True,
+            verify=False,
+            timeout=kinoman_api.REDIRECT_TIMEOUT,
+        )
+
+    @mock.patch("requests.head")
+    def test_follow_redirects_unsupported(self, mock_head):
+        mock_head.return_value = mock.MagicMock(
+            status_code=405, url="http://cdn.test.com/video.mp4"
+        )
+
+        self.assertEqual(
+            kinoman_api._follow_redirects("http://test.com/redirect", {}),
+            "http://test.com/redirect",
+        )
+
+        mock_head.side_effect = requests.ConnectionError
+
+        self.assertEqual(
+            kinoman_api._follow_redirects("http://test.com/redirect", {}),
+            "http://test.com/redirect",
+        )
+
+
+class TestNextEpisode(unittest.TestCase):
+    def setUp(self):
+        self.file_lists = FileLists(
+            {
+                "title": "Test Series (Сезон 1)",
+                "online_files": [
+                    {"secure_id": "id{}".format(n), "title": "s01e0{}.mp4".format(n)}
+                    for n in (1, 3, 2)
+                ],
+                "download_files": [],
+            },
+            "01",
+        )
+
+    def test_get_next_episode(self):
+        self.assertEqual(
+            kinoman_api.get_next_episode(self.file_lists, "online", "s01e01.mp4").name,
+            "s01e02.mp4",
+        )
+        self.assertEqual(
+            kinoman_api.get_next_episode(self.file_lists, "online", "s01e02.mp4").name,
+            "s01e03.mp4",
+        )
+        self.assertIsNone(
+            kinoman_api.get_next_episode(self.file_lists, "online", "s01e03.mp4")
+        )
+        self.assertIsNone(
+            kinoman_api.get_next_episode(self.file_lists, "online", "s01e09.mp4")
+        )
+
+    def test_get_next_episode_movie(self):
+        file_lists = FileLists(
+            {
+                "title": "Test Movie",
+                "online_files": [{"secure_id": "id1", "title": "movie.mp4"}],
+                "download_files": [],
+            }
+        )
+
+        self.assertIsNone(
+            kinoman_api.get_next_episode(file_lists, "online", "movie.mp4")
+        )
+
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    @mock.patch("resources.kinoman_api._get_stream_url")
+    @mock.patch("resources.kinoman_api.cache")
+    @mock.patch("resources.kinoman_api.get_movie_data")
+    def test_prefetch_next_episode(
+        self, mock_get_movie_data, mock_cache, mock_get_stream_url, _
+    ):
+        mock_get_movie_data.return_value = models.Movie(file_lists=self.file_lists)
+        mock_get_stream_url.return_value = "http://cdn.test.com/s01e02.mp4"
+
+        self.assertEqual(
+            kinoman_api.prefetch_next_episode(100, "online", "s01e01.mp4"),
+            "http://cdn.test.com/s01e02.mp4",
+        )
+        mock_cache.get_cache().set.assert_called_once_with(
+            "file_url:100:online:s01e02.mp4",
+            "https://www.kinoman.uz/api/v1/movie/online/id2",
+            kinoman_api.FILE_URL_TTL,
+        )
+        mock_get_stream_url.assert_called_once_with(
+            "https://www.kinoman.uz/api/v1/movie/online/id2"
+        )
+
+    @mock.patch("resources.kinoman_api.get_movie_data")
+    def test_prefetch_next_episode_errors(self, mock_get_movie_data):
+        mock_get_movie_data.side_effect = kinoman_api.NetworkError
+
+        self.assertIsNone(
+            kinoman_api.prefetch_next_episode(100, "online", "s01e01.mp4")
+        )
+
+
+class TestPrefetchFiles(unittest.TestCase):
+    @mock.patch("resources.kinoman_api._prefetch_file")
+    @mock.patch("resources.kinoman_api.get_movie_data")
+    def test_prefetch_files(self, mock_get_movie_data, mock_prefetch_file):
+        mock_get_movie_data.return_value = models.Movie(
+            file_lists=FileLists(
+                {
+                    "online_files": [
+                        {"secure_id": "id1", "title": "e01.mp4"},
+                        {"secure_id": "id2", "title": "e02.mp4"},
+                        {"secure_id": "id3", "title": "e03.mp4"},
+                    ],
+                    "download_files": [],
+                }
+            )
+        )
+
+        def fake_prefetch_file(video_id, video_type, video_file):
+            if video_file.name == "e02.mp4":
+                raise kinoman_api.NetworkError
+
+            return "http://cdn.test.com/" + video_file.name
+
+        mock_prefetch_file.side_effect = fake_prefetch_file
+
+        self.assertListEqual(
+            kinoman_api.prefetch_files(
+                100, "online", ["e01.mp4", "e02.mp4", "e03.mp4", "e09.mp4"]
+            ),
+            ["http://cdn.test.com/e01.mp4", None, "http://cdn.test.com/e03.mp4", None],
+        )
+
+    @mock.patch("resources.kinoman_api.get_movie_data")
+    def test_prefetch_files_errors(self, mock_get_movie_data):
+        mock_get_movie_data.side_effect = kinoman_api.LoginError
+
+        self.assertListEqual(
+            kinoman_api.prefetch_files(100, "online", ["e01.mp4", "e02.mp4"]),
+            [None, None],
+        )
+
+
 class TestKinomanLogin(unittest.TestCase):
+    patcher = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.patcher = mock.patch("resources.kinoman_api.rate_limit")
+        cls.patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patcher.stop()
+
     @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
     def test_kinoman_login_cookie_fresh(self, mock_player):
         mock_session = mock.MagicMock()
@@ -141,6 +510,7 @@ class TestKinomanLogin(unittest.TestCase):
         with self.assertRaises(kinoman_api.LoginError):
             kinoman_api._kinoman_login(mock_session)
 
+    @mock.patch("resources.kinoman_api.time.sleep", mock.MagicMock())
     @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
     def test_kinoman_login_network_error(self, mock_player):
         mock_session = mock.MagicMock()
@@ -176,6 +546,9 @@ class TestKinomanLogin(unittest.TestCase):
         with self.assertRaises(kinoman_api.NetworkError):
             kinoman_api._kinoman_login(mock_session)
 
+        # Login attempts are never retried
+        mock_session.post.assert_called_once()
+
     @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
     def test_kinoman_login_bad(self, mock_player):
         mock_session = mock.MagicMock()
@@ -250,22 +623,80 @@ class TestKinomanLogin(unittest.TestCase):
         with self.assertRaises(kinoman_api.LoginError):
             kinoman_api._kinoman_login(mock_session)
 
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    def test_login_check_interval(self, mock_player):
+        self.assertEqual(kinoman_api.login_check_interval(), 300)
+
+        for lifetime, interval in ((1000, 500), (30, 60), (3600 * 24, 3600)):
+            mock_player.set_setting("_cookie_lifetime", lifetime)
+            self.assertEqual(kinoman_api.login_check_interval(), interval)
+
+    @mock.patch("resources.kinoman_api.time")
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    def test_kinoman_login_cookie_lifetime(self, mock_player, mock_time):
+        mock_session = mock.MagicMock()
+        mock_time.time.return_value = 1000
+        mock_player.set_setting("_cookie", "{}")
+        mock_player.set_setting("_cookie_issued", 100)
+        mock_player.set_setting("_last_check", 400)
+        mock_player.set_setting("username", "fake_login")
+        mock_player.set_setting("password", "fake_password")
+
+        fake_page = namedtuple("FakePage", ["status_code", "text"])
+        mock_session.get.return_value = fake_page(status_code=401, text="{}")
+        mock_session.post.return_value = fake_page(
+            status_code=200,
+            text='{"user": {"user_id": 100, "abon_time_is_active": true}}',
+        )
+        mock_session.cookies.get_dict.return_value = {"new_cookie": "new_value"}
+
+        self.assertTrue(kinoman_api._kinoman_login(mock_session))
+        self.assertEqual(mock_player.get_setting("_cookie_lifetime", "int"), 300)
+        self.assertEqual(mock_player.get_setting("_cookie_issued", "int"), 1000)
+
+    @mock.patch("resources.kinoman_api.rate_limit")
+    @mock.patch("requests.Session")
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    def test_refresh_session(self, mock_player, mock_session, mock_rate_limit):
+        mock_player.set_setting("_cookie", "{}")
+        mock_player.set_setting("_last_check", int(time.time()))
+
+        fake_page = namedtuple("FakePage", ["status_code", "text"])
+        mock_session().get.return_value = fake_page(
+            status_code=200,
+            text='{"user": {"abon_time_is_active": true, "user_id": 100}}',
+        )
+        mock_session().cookies.get_dict.return_value = {}
+
+        kinoman_api.refresh_session()
+
+        # Checked even though the last check is fresh
+        mock_session().get.assert_called_once_with(
+            "https://www.kinoman.uz/api/v1/user/profile",
+            verify=False,
+            timeout=kinoman_api.TIMEOUTS["login"],
+        )
+        mock_session().close.assert_called_once_with()
+        mock_rate_limit.throttle.assert_called_once_with()
+
 
+@mock.patch("resources.kinoman_api.rate_limit")
 class TestGetPage(unittest.TestCase):
     @mock.patch("resources.kinoman_api._kinoman_login", mock.MagicMock())
     @mock.patch("requests.Session")
-    def test_get_page_plain(self, mock_session):
+    def test_get_page_plain(self, mock_session, mock_rate_limit):
         fake_page = namedtuple("FakePage", ["status_code", "text"])
         mock_session().get.return_value = fake_page(
             status_code=200, text='{"test": "test"}'
         )
 
         self.assertEqual(kinoman_api.get_page("http://www.test.com"), {"test": "test"})
+        mock_rate_limit.throttle.assert_called_once_with()
 
     @mock.patch("resources.kinoman_api._kinoman_login", mock.MagicMock())
     @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
     @mock.patch("requests.Session")
-    def test_get_page_payload(self, mock_session, mock_player):
+    def test_get_page_payload(self, mock_session, mock_player, _):
         mock_player.set_setting("_user_id", 100)
         fake_page = namedtuple("FakePage", ["status_code", "text"])
         mock_session().post.return_value = fake_page(
@@ -282,16 +713,134 @@ class TestGetPage(unittest.TestCase):
         self.assertEqual(test_payload["user_id"], 100)
 
     @mock.patch("resources.kinoman_api._kinoman_login", mock.MagicMock())
+    @mock.patch("resources.kinoman_api.time", mock.MagicMock())
     @mock.patch("requests.Session")
-    def test_get_page_network_error(self, mock_session):
+    def test_get_page_network_error(self, mock_session, _):
         mock_session().get.side_effect = requests.ConnectionError
 
         with self.assertRaises(kinoman_api.NetworkError):
             kinoman_api.get_page("http://www.test.com")
 
+        self.assertEqual(mock_session().get.call_count, kinoman_api.RETRY_ATTEMPTS)
+
+    @mock.patch("resources.kinoman_api._kinoman_login", mock.MagicMock())
+    @mock.patch("resources.kinoman_api.time")
+    @mock.patch("requests.Session")
+    def test_get_page_retry(self, mock_session, mock_time, mock_rate_limit):
+        fake_page = namedtuple("FakePage", ["status_code", "text"])
+        mock_session().post.side_effect = [
+            requests.Timeout,
+            requests.ConnectionError,
+            fake_page(status_code=200, text="{}"),
+        ]
+
+        self.assertEqual(
+            kinoman_api.get_page(
+                "http://www.test.com", {"page": 1}, endpoint_class="details"
+            ),
+            {},
+        )
+        mock_session().post.assert_called_with(
+            "http://www.test.com",
+            verify=False,
+            timeout=kinoman_api.TIMEOUTS["details"],
+            data='{"page": 1}',
+        )
+
+        # Jittered delays stay under the growing backoff
+        delays = [call[0][0] for call in mock_time.sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertLessEqual(delays[0], kinoman_api.RETRY_BACKOFF)
+        self.assertLessEqual(delays[1], kinoman_api.RETRY_BACKOFF * 2)
+
+        # Every attempt waits for its own token
+        self.assertEqual(mock_rate_limit.throttle.call_count, 3)
+
+    @mock.patch("resources.kinoman_api._kinoman_login", mock.MagicMock())
+    @mock.patch("resources.kinoman_api.time", mock.MagicMock())
+    @mock.patch("resources.kinoman_api._site_breaker")
+    @mock.patch("requests.Session")
+    def test_get_page_breaker(self, mock_session, mock_breaker, mock_rate_limit):
+        fake_page = namedtuple("FakePage", ["status_code", "text"])
+        mock_session().get.return_value = fake_page(status_code=200, text="{}")
+
+        kinoman_api.get_page("http://www.test.com")
+        mock_breaker.record_success.assert_called_once_with()
+
+        mock_session().get.side_effect = requests.Timeout
+        with self.assertRaises(kinoman_api.NetworkError):
+            kinoman_api.get_page("http://www.test.com")
+        mock_breaker.record_failure.assert_called_once_with()
+
+        # Open breaker fails fast, without touching the site
+        mock_breaker.allow_request.return_value = False
+        mock_session.reset_mock()
+        mock_rate_limit.reset_mock()
+
+        with self.assertRaises(kinoman_api.NetworkError):
+            kinoman_api.get_page("http://www.test.com")
+        mock_session.assert_not_called()
+        mock_rate_limit.throttle.assert_not_called()
+
+    @mock.patch("resources.kinoman_api._kinoman_login", mock.MagicMock())
+    @mock.patch(
+        "resources.kinoman_api._site_breaker", circuit_breaker.CircuitBreaker("test")
+    )
+    @mock.patch("resources.internal.circuit_breaker.player", new_callable=FakePlayer)
+    @mock.patch("requests.Session")
+    def test_get_page_server_error(self, mock_session, mock_player, mock_rate_limit):
+        fake_page = namedtuple("FakePage", ["status_code", "text"])
+        mock_session().get.return_value = fake_page(
+            status_code=503, text="<html>Service Unavailable</html>"
+        )
+
+        for _ in range(circuit_breaker.FAILURE_THRESHOLD):
+            with self.assertRaises(kinoman_api.NetworkError):
+                kinoman_api.get_page("http://www.test.com")
+
+        self.assertTrue(kinoman_api._site_breaker.is_open())
+
+        # Open breaker fails fast, without touching the site
+        mock_rate_limit.reset_mock()
+        with self.assertRaises(kinoman_api.NetworkError):
+            kinoman_api.get_page("http://www.test.com")
+        mock_rate_limit.throttle.assert_not_called()
+
+    @mock.patch("resources.kinoman_api._kinoman_login", mock.MagicMock())
+    @mock.patch("requests.Session")
+    def test_get_page_bad_json(self, mock_session, _):
+        fake_page = namedtuple("FakePage", ["status_code", "text"])
+        mock_session().get.return_value = fake_page(status_code=200, text="<html>")
+
+        with self.assertRaises(kinoman_api.NetworkError):
+            kinoman_api.get_page("http://www.test.com")
+
+    @mock.patch("resources.kinoman_api._kinoman_login", mock.MagicMock())
+    @mock.patch("requests.Session")
+    def test_get_page_not_found(self, mock_session, _):
+        fake_page = namedtuple("FakePage", ["status_code", "text"])
+        mock_session().get.return_value = fake_page(status_code=404, text="{}")
+
+        with self.assertRaises(kinoman_api.MissingVideoError):
+            kinoman_api.get_page("http://www.test.com")
+
 
 class TestGetMovieData(unittest.TestCase):
     def setUp(self):
+        player_patcher = mock.patch(
+            "resources.kinoman_api.player", new_callable=FakePlayer
+        )
+        self.mock_player = player_patcher.start()
+        self.mock_player.set_setting("fanart_mode", kinoman_api.FANART_STABLE)
+        self.addCleanup(player_patcher.stop)
+
+        cache_patcher = mock.patch("resources.kinoman_api.cache", fake_empty_cache())
+        self.mock_cache = cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+        kinoman_api._movie_data_memo.clear()
+        self.addCleanup(kinoman_api._movie_data_memo.clear)
+
         self.test_movie_data = {
             "movie": {
                 "id": 1001,
@@ -387,52 +936,52 @@ class TestGetMovieData(unittest.TestCase):
                 (
                     "online",
                     [
-                        [
+                        models.VideoFile(
                             "o_test_movie_2019.mp4",
                             "https://www.kinoman.uz/api/v1/movie/online/"
                             "secure_id1_base64",
                             None,
                             None,
-                        ]
+                        )
                     ],
                 ),
                 (
                     "sd",
                     [
-                        [
+                        models.VideoFile(
                             "test_movie_2019.mkv",
                             "https://www.kinoman.uz/api/v1/movie/download/"
                             "secure_id2_base64",
                             None,
                             "Видео: HDTVRIP (768x320)[CR]Аудио: профессиональное"
                             " (многоголосое)",
-                        ]
+                        )
                     ],
                 ),
                 (
                     "hd",
                     [
-                        [
+                        models.VideoFile(
                             "test_movie_2019_720p.mkv",
                             "https://www.kinoman.uz/api/v1/movie/download/"
                             "secure_id3_base64",
                             None,
                             "Видео: HDTVRIP (1280x720)[CR]Аудио: профессиональное"
                             " (многоголосое)",
-                        ]
+                        )
                     ],
                 ),
                 (
                     "full_hd",
                     [
-                        [
+                        models.VideoFile(
                             "test_movie_2019_1080p_dub.mkv",
                             "https://www.kinoman.uz/api/v1/movie/download/"
                             "secure_id4_base64",
                             None,
                             "Видео: BDRIP (1920x1080)[CR]Аудио: профессиональное"
                             " (многоголосое)",
-                        ]
+                        )
                     ],
                 ),
             ]
@@ -502,56 +1051,56 @@ class TestGetMovieData(unittest.TestCase):
                 (
                     "online",
                     [
-                        [
+                        models.VideoFile(
                             "o_test_series_s01e01.mp4",
                             "https://www.kinoman.uz/api/v1/movie/online/"
                             "secure_id1_base64",
-                            {"season": 1, "episode": 1, "title": "Test Series S01E01"},
+                            models.EpisodeInfo(1, 1, "Test Series S01E01"),
                             None,
-                        ],
-                        [
+                        ),
+                        models.VideoFile(
                             "o_test_series_s01e02.mp4",
                             "https://www.kinoman.uz/api/v1/movie/online/"
                             "secure_id2_base64",
-                            {"season": 1, "episode": 2, "title": "Test Series S01E02"},
+                            models.EpisodeInfo(1, 2, "Test Series S01E02"),
                             None,
-                        ],
-                        [
+                        ),
+                        models.VideoFile(
                             "o_test_series_s01e03.mp4",
                             "https://www.kinoman.uz/api/v1/movie/online/"
                             "secure_id3_base64",
-                            {"season": 1, "episode": 3, "title": "Test Series S01E03"},
+                            models.EpisodeInfo(1, 3, "Test Series S01E03"),
                             None,
-                        ],
+                        ),
                     ],
                 ),
                 (
                     "sd",
                     [
-                        [
+                        models.VideoFile(
                             "test_series_s01e01.avi",
                             "https://www.kinoman.uz/api/v1/movie/download/"
                             "secure_id4_base64",
-                            {"season": 1, "episode": 1, "title": "Test Series S01E01"},
+                            models.EpisodeInfo(1, 1, "Test Series S01E01"),
                             "Видео: HDTVRIP (720x400)[CR]Аудио: любительское"
                             " (двухголосое)",
-                        ],
-                        [
+                        ),
+                        models.VideoFile(
                             "test_series_s01e02.avi",
                             "https://www.kinoman.uz/api/v1/movie/download/"
                             "secure_id5_base64",
-                            {"season": 1, "episode": 2, "title": "Test Series S01E02"},
+                            models.EpisodeInfo(1, 2, "Test Series S01E02"),
                             "Видео: HDTVRIP (720x400)[CR]Аудио: любительское"
                             " (двухголосое)",
-                        ],
-                        [
+                        ),
+                        models.VideoFile(
                             "test_series_s01e03.avi",
                             "https://www.kinoman.uz/api/v1/movie/download/"
                             "secure_id6_base64",
-                            {"season": 1, "episode": 3, "title": "Test Series S01E03"},
+                            models.EpisodeInfo(1, 3, "Test Series S01E03"),
                             "Видео: HDTVRIP (720x400)[CR]Аудио: любительское"
                             " (двухголосое)",
-                        ],
+                        ),
                     ],
                 ),
             ]
@@ -560,30 +1109,27 @@ class TestGetMovieData(unittest.TestCase):
     @mock.patch("resources.kinoman_api._generate_movie_file_lists")
     @mock.patch("resources.kinoman_api.get_page")
     def test_get_movie_data_good(self, mock_get_page, mock_gen_files):
-        expected_result = {
-            "movie_info": {
-                "art": {
-                    "banner": "https://img.kinoman.uz/p00000_11111mp.jpg",
-                    "icon": "https://img.kinoman.uz/p00000_11111mp.jpg",
-                    "poster": "https://img.kinoman.uz/p00000_11111mp.jpg",
-                    "thumb": "https://img.kinoman.uz/p00000_11111mp.jpg",
-                },
-                "info": {
-                    "title": "Test Movie",
-                    "originaltitle": "Test Movie Original",
-                    "premiered": "2019-10-02",
-                    "year": 2019,
-                    "rating": 18,
-                    "plot": "Test description",
-                    "cast": ["Test Actor 1", "Test Actor 2"],
-                    "country": "Test Country 1 / Test Country 2 / Test Country 3",
-                    "director": "Test Director 1 / Test Director 2",
-                    "genre": "test genre 1 / test genre 2",
-                },
-                "properties": {},
+        expected_video_data = {
+            "art": {
+                "banner": "https://img.kinoman.uz/p00000_11111mp.jpg",
+                "icon": "https://img.kinoman.uz/p00000_11111mp.jpg",
+                "poster": "https://img.kinoman.uz/p00000_11111mp.jpg",
+                "thumb": "https://img.kinoman.uz/p00000_11111mp.jpg",
+                "fanart": "https://img.kinoman.uz/s00000_100003b.jpg",
+            },
+            "info": {
+                "title": "Test Movie",
+                "originaltitle": "Test Movie Original",
+                "premiered": "2019-10-02",
+                "year": 2019,
+                "rating": 18,
+                "plot": "Test description",
+                "cast": ["Test Actor 1", "Test Actor 2"],
+                "country": "Test Country 1 / Test Country 2 / Test Country 3",
+                "director": "Test Director 1 / Test Director 2",
+                "genre": "test genre 1 / test genre 2",
             },
-            "file_lists": [],
-            "series_season_n": None,
+            "properties": {"Fanart_Image": "https://img.kinoman.uz/s00000_100003b.jpg"},
         }
 
         mock_gen_files.return_value = []
@@ -591,46 +1137,84 @@ class TestGetMovieData(unittest.TestCase):
 
         result = kinoman_api.get_movie_data(1001)
 
-        # Fanart is picked from random screenshot
-        # so check if it's OK and remove it from assertion
-        self.assertEqual(
-            result["movie_info"]["art"]["fanart"],
-            result["movie_info"]["properties"]["Fanart_Image"],
-        )
-        self.assertRegexpMatches(
-            result["movie_info"]["art"]["fanart"],
-            r"https://img\.kinoman\.uz/s00000_10000[0-9]b\.jpg",
-        )
-
-        del result["movie_info"]["art"]["fanart"]
-        del result["movie_info"]["properties"]["Fanart_Image"]
-
-        self.assertDictEqual(result, expected_result)
+        self.assertDictEqual(result.video_data(), expected_video_data)
+        self.assertEqual(result.movie_id, 1001)
+        self.assertEqual(result.file_lists, [])
+        self.assertIsNone(result.season_n)
 
     @mock.patch("resources.kinoman_api._generate_movie_file_lists")
     @mock.patch("resources.kinoman_api.get_page")
-    def test_get_movie_data_series(self, mock_get_page, mock_gen_files):
-        self.test_movie_data["movie"]["title"] = "Test Movie (Сезон 10)"
-        self.test_movie_data["movie"]["type_id"] = 2
-
+    def test_get_movie_data_fanart_stable(self, mock_get_page, mock_gen_files):
         mock_gen_files.return_value = []
         mock_get_page.return_value = self.test_movie_data
 
-        result = kinoman_api.get_movie_data(1001)
+        fanarts = set(kinoman_api.get_movie_data(1001).fanart for _ in range(10))
 
-        self.assertEqual(result["series_season_n"], "10")
+        self.assertSetEqual(fanarts, {"https://img.kinoman.uz/s00000_100003b.jpg"})
 
     @mock.patch("resources.kinoman_api._generate_movie_file_lists")
     @mock.patch("resources.kinoman_api.get_page")
-    def test_get_movie_data_series_odd_title(self, mock_get_page, mock_gen_files):
-        self.test_movie_data["movie"]["type_id"] = 2
+    def test_get_movie_data_fanart_first(self, mock_get_page, mock_gen_files):
+        self.mock_player.set_setting("fanart_mode", kinoman_api.FANART_FIRST)
 
         mock_gen_files.return_value = []
         mock_get_page.return_value = self.test_movie_data
 
         result = kinoman_api.get_movie_data(1001)
 
-        self.assertEqual(result["series_season_n"], "01")
+        self.assertEqual(result.fanart, "https://img.kinoman.uz/s00000_100001b.jpg")
+
+    @mock.patch("resources.kinoman_api.datetime")
+    @mock.patch("resources.kinoman_api._generate_movie_file_lists")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_movie_data_fanart_daily(
+        self, mock_get_page, mock_gen_files, mock_datetime
+    ):
+        self.mock_player.set_setting("fanart_mode", kinoman_api.FANART_DAILY)
+
+        mock_gen_files.return_value = []
+        mock_get_page.return_value = self.test_movie_data
+
+        fanarts = []
+        for day in (1, 2, 3):
+            mock_datetime.now().date().toordinal.return_value = day
+            kinoman_api._movie_data_memo.clear()
+            result = kinoman_api.get_movie_data(1001)
+            fanarts.append(result.fanart)
+
+        self.assertListEqual(
+            fanarts,
+            [
+                "https://img.kinoman.uz/s00000_100001b.jpg",
+                "https://img.kinoman.uz/s00000_100002b.jpg",
+                "https://img.kinoman.uz/s00000_100003b.jpg",
+            ],
+        )
+
+    @mock.patch("resources.kinoman_api._generate_movie_file_lists")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_movie_data_series(self, mock_get_page, mock_gen_files):
+        self.test_movie_data["movie"]["title"] = "Test Movie (Сезон 10)"
+        self.test_movie_data["movie"]["type_id"] = 2
+
+        mock_gen_files.return_value = []
+        mock_get_page.return_value = self.test_movie_data
+
+        result = kinoman_api.get_movie_data(1001)
+
+        self.assertEqual(result.season_n, "10")
+
+    @mock.patch("resources.kinoman_api._generate_movie_file_lists")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_movie_data_series_odd_title(self, mock_get_page, mock_gen_files):
+        self.test_movie_data["movie"]["type_id"] = 2
+
+        mock_gen_files.return_value = []
+        mock_get_page.return_value = self.test_movie_data
+
+        result = kinoman_api.get_movie_data(1001)
+
+        self.assertEqual(result.season_n, "01")
 
     @mock.patch("resources.kinoman_api._generate_movie_file_lists")
     @mock.patch("resources.kinoman_api.get_page")
@@ -642,23 +1226,54 @@ class TestGetMovieData(unittest.TestCase):
 
         result = kinoman_api.get_movie_data(1001)
 
-        self.assertEqual(
-            result["movie_info"]["art"]["fanart"], result["movie_info"]["art"]["poster"]
-        )
-        self.assertEqual(
-            result["movie_info"]["properties"]["Fanart_Image"],
-            result["movie_info"]["art"]["poster"],
-        )
+        self.assertEqual(result.fanart, result.poster)
+        self.assertEqual(result.properties()["Fanart_Image"], result.poster)
+
+    @mock.patch("resources.kinoman_api._generate_movie_file_lists")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_movie_data_shared(self, mock_get_page, mock_gen_files):
+        mock_gen_files.return_value = []
+        mock_get_page.return_value = self.test_movie_data
+
+        movie = kinoman_api.get_movie_data(1001)
+
+        self.assertIs(kinoman_api.get_movie_data(1001), movie)
+        mock_get_page.assert_called_once()
+
+    @mock.patch("resources.kinoman_api.time")
+    @mock.patch("resources.kinoman_api._generate_movie_file_lists")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_movie_data_shared_expired(
+        self, mock_get_page, mock_gen_files, mock_time
+    ):
+        mock_gen_files.return_value = []
+        mock_get_page.return_value = self.test_movie_data
+        mock_time.time.return_value = 1000
+
+        kinoman_api.get_movie_data(1001)
+
+        mock_time.time.return_value = 1000 + kinoman_api.MOVIE_DATA_TTL
+        kinoman_api.get_movie_data(1001)
+
+        self.assertEqual(mock_get_page.call_count, 2)
 
     def test_generate_movie_file_lists_movie(self):
         self.assertDictEqual(
-            kinoman_api._generate_movie_file_lists(self.test_files_data_movie),
+            OrderedDict(
+                kinoman_api._generate_movie_file_lists(
+                    self.test_files_data_movie
+                ).items()
+            ),
             self.test_files_expected_result_movie,
         )
 
     def test_generate_movie_file_lists_series(self):
         self.assertDictEqual(
-            kinoman_api._generate_movie_file_lists(self.test_files_data_series, "01"),
+            OrderedDict(
+                kinoman_api._generate_movie_file_lists(
+                    self.test_files_data_series, "01"
+                ).items()
+            ),
             self.test_files_expected_result_series,
         )
 
@@ -693,82 +1308,93 @@ class TestGetMovieData(unittest.TestCase):
                 (
                     "online",
                     [
-                        [
+                        models.VideoFile(
                             "o_test_series_episode_1.mp4",
                             "https://www.kinoman.uz/api/v1/movie/online/"
                             "secure_id1_base64",
-                            {"season": 1, "episode": 1, "title": "Test Series S01E1"},
+                            models.EpisodeInfo(1, 1, "Test Series S01E1"),
                             None,
-                        ],
-                        [
+                        ),
+                        models.VideoFile(
                             "o_test_series_episode_2.mp4",
                             "https://www.kinoman.uz/api/v1/movie/online/"
                             "secure_id2_base64",
-                            {"season": 1, "episode": 2, "title": "Test Series S01E2"},
+                            models.EpisodeInfo(1, 2, "Test Series S01E2"),
                             None,
-                        ],
-                        [
+                        ),
+                        models.VideoFile(
                             "o_test_series_episode_3.mp4",
                             "https://www.kinoman.uz/api/v1/movie/online/"
                             "secure_id3_base64",
-                            {"season": 1, "episode": 3, "title": "Test Series S01E3"},
+                            models.EpisodeInfo(1, 3, "Test Series S01E3"),
                             None,
-                        ],
+                        ),
                     ],
                 )
             ]
         )
 
         self.assertDictEqual(
-            kinoman_api._generate_movie_file_lists(test_files_data, "01"),
+            OrderedDict(
+                kinoman_api._generate_movie_file_lists(test_files_data, "01").items()
+            ),
             expected_result,
         )
 
     def test_get_movie_files_list_movie(self):
+        file_lists = self.test_files_expected_result_movie
+
         expected_result = [
-            [
-                "online",
-                "o_test_movie_2019.mp4",
-                "Воспроизвести (стрим)",
-                "https://www.kinoman.uz/api/v1/movie/online/secure_id1_base64",
-                None,
-                None,
-            ],
-            [
-                "sd",
-                "test_movie_2019.mkv",
-                "Воспроизвести (SD)",
-                "https://www.kinoman.uz/api/v1/movie/download/secure_id2_base64",
-                None,
-                "Видео: HDTVRIP (768x320)[CR]Аудио: профессиональное (многоголосое)",
-            ],
-            [
-                "hd",
-                "test_movie_2019_720p.mkv",
-                "Воспроизвести (HD)",
-                "https://www.kinoman.uz/api/v1/movie/download/secure_id3_base64",
-                None,
-                "Видео: HDTVRIP (1280x720)[CR]Аудио: профессиональное (многоголосое)",
-            ],
-            [
-                "full_hd",
-                "test_movie_2019_1080p_dub.mkv",
-                "Воспроизвести (Full HD)",
-                "https://www.kinoman.uz/api/v1/movie/download/secure_id4_base64",
-                None,
-                "Видео: BDRIP (1920x1080)[CR]Аудио: профессиональное (многоголосое)",
-            ],
+            ("online", "Воспроизвести (стрим)", file_lists["online"][0]),
+            ("sd", "Воспроизвести (SD)", file_lists["sd"][0]),
+            ("hd", "Воспроизвести (HD)", file_lists["hd"][0]),
+            ("full_hd", "Воспроизвести (Full HD)", file_lists["full_hd"][0]),
         ]
 
         self.assertListEqual(
-            kinoman_api.get_movie_files_list(self.test_files_expected_result_movie),
-            expected_result,
+            kinoman_api.get_movie_files_list(file_lists), expected_result
+        )
+
+    def test_get_movie_files_list_movie_unchanged(self):
+        file_lists = kinoman_api._generate_movie_file_lists(self.test_files_data_movie)
+
+        first = kinoman_api.get_movie_files_list(file_lists)
+        second = kinoman_api.get_movie_files_list(file_lists)
+
+        self.assertListEqual(first, second)
+        self.assertEqual(
+            OrderedDict(file_lists.items()), self.test_files_expected_result_movie
+        )
+        self.assertEqual(
+            file_lists.find("online", "o_test_movie_2019.mp4"),
+            self.test_files_expected_result_movie["online"][0],
+        )
+
+    def test_get_movie_files_list_movie_many_files(self):
+        file_lists = OrderedDict(
+            [
+                (
+                    "sd",
+                    [
+                        models.VideoFile("part1.avi", "url1"),
+                        models.VideoFile("part2.avi", "url2"),
+                    ],
+                )
+            ]
+        )
+
+        self.assertListEqual(
+            kinoman_api.get_movie_files_list(file_lists),
+            [
+                ("sd", "part1.avi", file_lists["sd"][0]),
+                ("sd", "part2.avi", file_lists["sd"][1]),
+            ],
         )
 
     def test_get_movie_files_list_series_menu(self):
         expected_result = [
-            ["dir", None, "Смотреть серии (стрим)", "online", None, None],
-            ["dir", None, "Смотреть серии (SD)", "sd", None, None],
+            ("online", "Смотреть серии (стрим)", None),
+            ("sd", "Смотреть серии (SD)", None),
         ]
 
         self.assertListEqual(
@@ -779,31 +1405,10 @@ class TestGetMovieData(unittest.TestCase):
         )
 
     def test_get_movie_files_list_series_category(self):
+        online_files = self.test_files_expected_result_series["online"]
+
         expected_result = [
-            [
-                "online",
-                "o_test_series_s01e01.mp4",
-                "o_test_series_s01e01.mp4",
-                "https://www.kinoman.uz/api/v1/movie/online/secure_id1_base64",
-                {"season": 1, "episode": 1, "title": "Test Series S01E01"},
-                None,
-            ],
-            [
-                "online",
-                "o_test_series_s01e02.mp4",
-                "o_test_series_s01e02.mp4",
-                "https://www.kinoman.uz/api/v1/movie/online/secure_id2_base64",
-                {"season": 1, "episode": 2, "title": "Test Series S01E02"},
-                None,
-            ],
-            [
-                "online",
-                "o_test_series_s01e03.mp4",
-                "o_test_series_s01e03.mp4",
-                "https://www.kinoman.uz/api/v1/movie/online/secure_id3_base64",
-                {"season": 1, "episode": 3, "title": "Test Series S01E03"},
-                None,
-            ],
+            ("online", video_file.name, video_file) for video_file in online_files
         ]
 
         self.assertListEqual(
@@ -827,8 +1432,10 @@ class TestGetMovieData(unittest.TestCase):
 
 
 class TestMenuGenerators(unittest.TestCase):
+    @mock.patch("resources.kinoman_api.time")
+    @mock.patch("resources.kinoman_api.cache")
     @mock.patch("resources.kinoman_api.get_page")
-    def test_list_genres(self, mock_get_page):
+    def test_fetch_genres(self, mock_get_page, mock_cache, mock_time):
         test_data = {
             "genreList": [
                 {"id": 1, "title": "Драма", "code": "drama"},
@@ -840,8 +1447,65 @@ class TestMenuGenerators(unittest.TestCase):
         expected_result = [("Драма", 1), ("Ужасы", 3), ("Фантастика", 2)]
 
         mock_get_page.return_value = test_data
+        mock_time.time.return_value = 1000
+
+        self.assertListEqual(kinoman_api._fetch_genres(), expected_result)
+        mock_cache.get_cache().set.assert_called_once_with(
+            "genres",
+            {"genres": expected_result, "updated": 1000},
+            kinoman_api.GENRES_CACHE_TTL,
+        )
+
+    @mock.patch("resources.kinoman_api.tasks")
+    @mock.patch("resources.kinoman_api.cache")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_list_genres_cached(self, mock_get_page, mock_cache, mock_tasks):
+        mock_cache.get_cache().get.return_value = {
+            "genres": [["Драма", 1], ["Ужасы", 3]],
+            "updated": time.time(),
+        }
 
-        self.assertListEqual(kinoman_api._list_genres(), expected_result)
+        self.assertListEqual(kinoman_api._list_genres(), [("Драма", 1), ("Ужасы", 3)])
+        mock_get_page.assert_not_called()
+        mock_tasks.run_in_background.assert_not_called()
+
+    @mock.patch("resources.kinoman_api.tasks")
+    @mock.patch("resources.kinoman_api.cache")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_list_genres_outdated(self, mock_get_page, mock_cache, mock_tasks):
+        mock_cache.get_cache().get.return_value = {
+            "genres": [["Драма", 1]],
+            "updated": 0,
+        }
+
+        self.assertListEqual(kinoman_api._list_genres(), [("Драма", 1)])
+        mock_get_page.assert_not_called()
+        mock_tasks.run_in_background.assert_called_once_with(
+            kinoman_api._refresh_genres
+        )
+
+    @mock.patch("resources.kinoman_api.tasks")
+    @mock.patch("resources.kinoman_api.cache")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_list_genres_snapshot(self, mock_get_page, mock_cache, mock_tasks):
+        mock_cache.get_cache().get.return_value = None
+
+        genres = kinoman_api._list_genres()
+
+        self.assertIn(("Мультфильм", 12), genres)
+        self.assertListEqual(genres, sorted(genres))
+        mock_get_page.assert_not_called()
+        mock_tasks.run_in_background.assert_called_once_with(
+            kinoman_api._refresh_genres
+        )
+
+    @mock.patch("resources.kinoman_api._fetch_genres")
+    def test_refresh_genres_network_error(self, mock_fetch_genres):
+        mock_fetch_genres.side_effect = kinoman_api.NetworkError
+
+        kinoman_api._refresh_genres()
+
+        mock_fetch_genres.assert_called_once_with()
 
     def test_gen_categories_video(self):
         expected_result = [
@@ -978,7 +1642,9 @@ class TestMenuGenerators(unittest.TestCase):
         )
 
 
+@mock.patch("resources.kinoman_api.cache", fake_empty_cache())
 class TestGetMovies(unittest.TestCase):
+    @mock.patch("resources.kinoman_api.player", FakePlayer())
     @mock.patch("resources.kinoman_api.get_page")
     def test_get_movies_good(self, mock_get_page):
         test_query = {
@@ -1030,7 +1696,7 @@ class TestGetMovies(unittest.TestCase):
                 {
                     "id": 10003,
                     "title": "Test Movie 3",
-                    "type_id": 1,
+                    "type_id": 2,
                     "release_date": "2019-02-01T05:00:00+05:00",
                     "poster_url": "img.kinoman.uz/p10003_00001",
                     "release_year": 2019,
@@ -1052,6 +1718,7 @@ class TestGetMovies(unittest.TestCase):
                         "year": 2019,
                         "premiered": "2019-10-02T05:00:00+05:00",
                         "title": "Test Movie 1 (2019)",
+                        "mediatype": "movie",
                     },
                     "art": {
                         "fanart": "https://img.kinoman.uz/p10001_00001mm.jpg",
@@ -1074,6 +1741,7 @@ class TestGetMovies(unittest.TestCase):
                         "year": 2019,
                         "premiered": "2019-01-22T05:00:00+05:00",
                         "title": "Test Movie 2 (2019)",
+                        "mediatype": "movie",
                     },
                     "art": {
                         "fanart": "https://img.kinoman.uz/p10002_00001mm.jpg",
@@ -1096,6 +1764,7 @@ class TestGetMovies(unittest.TestCase):
                         "year": 2019,
                         "premiered": "2019-02-01T05:00:00+05:00",
                         "title": "Test Movie 3 (2019)",
+                        "mediatype": "tvshow",
                     },
                     "art": {
                         "fanart": "https://img.kinoman.uz/p10003_00001mm.jpg",
@@ -1116,7 +1785,10 @@ class TestGetMovies(unittest.TestCase):
 
         self.assertListEqual(kinoman_api.get_movies(test_query), expected_result)
         mock_get_page.assert_called_once_with(
-            "https://www.kinoman.uz/api/v1/movie/search_by_filter", expected_query, True
+            "https://www.kinoman.uz/api/v1/movie/search_by_filter",
+            expected_query,
+            True,
+            endpoint_class="listing",
         )
 
     @mock.patch("resources.kinoman_api.get_page")
@@ -1130,8 +1802,510 @@ class TestGetMovies(unittest.TestCase):
             "https://www.kinoman.uz/api/v1/movie/search_by_name",
             {"q": "test search"},
             False,
+            endpoint_class="search",
         )
 
+    @mock.patch("resources.kinoman_api.catalog")
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    def test_get_movies_catalog_mirror(self, mock_player, mock_get_page, mock_catalog):
+        mock_player.set_setting("catalog_mirror", True)
+        mock_catalog.get_catalog().is_fresh.return_value = True
+        mock_catalog.get_catalog().search.return_value = {
+            "movies": [],
+            "total_page": 0,
+        }
+
+        self.assertListEqual(
+            kinoman_api.get_movies({"content_type_id": "1", "page": 1}), []
+        )
+        mock_catalog.get_catalog().search.assert_called_once_with(
+            {
+                "content_type_id": 1,
+                "genre_list": [],
+                "genre_black_list": [],
+                "sort_type": 0,
+                "page": 1,
+            }
+        )
+        mock_get_page.assert_not_called()
+
+    @mock.patch("resources.kinoman_api.catalog")
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    def test_get_movies_catalog_mirror_menu(
+        self, mock_player, mock_get_page, mock_catalog
+    ):
+        mock_player.set_setting("catalog_mirror", True)
+        mock_catalog.get_catalog().is_fresh.return_value = True
+        mock_get_page.return_value = {"movies": []}
+
+        for _, menu_query in kinoman_api.list_categories_video_menu():
+            query = {key: str(value) for key, value in menu_query.items()}
+            query["page"] = "2"
+            kinoman_api.get_movies(query)
+
+        mock_catalog.get_catalog().search.assert_not_called()
+        self.assertEqual(
+            mock_get_page.call_count, len(kinoman_api.list_categories_video_menu())
+        )
+
+    @mock.patch("resources.kinoman_api.catalog")
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api.player", new_callable=FakePlayer)
+    def test_get_movies_catalog_mirror_outdated(
+        self, mock_player, mock_get_page, mock_catalog
+    ):
+        mock_player.set_setting("catalog_mirror", True)
+        mock_catalog.get_catalog().is_fresh.return_value = False
+        mock_get_page.return_value = {"movies": []}
+
+        kinoman_api.get_movies({"content_type_id": "1", "page": 1})
+
+        mock_catalog.get_catalog().search.assert_not_called()
+        mock_get_page.assert_called_once()
+
+    @mock.patch("resources.kinoman_api.get_cached_page")
+    def test_get_movies_stale(self, mock_get_cached_page):
+        mock_get_cached_page.return_value = {
+            "movies": [
+                {
+                    "id": 10001,
+                    "title": "Test Movie 1",
+                    "release_date": "2019-10-02T05:00:00+05:00",
+                    "poster_url": "img.kinoman.uz/p10001_00001",
+                    "release_year": 2019,
+                }
+            ],
+            kinoman_api.STALE_KEY: True,
+        }
+
+        movies = kinoman_api.get_movies({"q": "test search"})
+
+        self.assertEqual(
+            movies[0][0], "Test Movie 1 (2019) [COLOR grey](устарело)[/COLOR]"
+        )
+        self.assertEqual(movies[0][2]["info"]["title"], "Test Movie 1 (2019)")
+
+
+class DictCache(object):
+    def __init__(self):
+        self.storage = {}
+        self.expired = {}
+
+    def get(self, key):
+        return self.storage.get(key)
+
+    def set(self, key, value, ttl):
+        if ttl < 0:
+            self.expired[key] = value
+        else:
+            self.storage[key] = value
+
+    @staticmethod
+    def single_flight(key, compute):  # pylint: disable=unused-argument
+        return compute()
+
+    def get_stale(self, key):
+        return self.storage.get(key, self.expired.get(key))
+
+    def delete(self, key):
+        self.storage.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        for key in list(self.storage):
+            if key.startswith(prefix):
+                del self.storage[key]
+
+
+class TestCachedPage(unittest.TestCase):
+    def setUp(self):
+        self.cache = DictCache()
+
+        cache_patcher = mock.patch("resources.kinoman_api.cache")
+        cache_patcher.start().get_cache.return_value = self.cache
+        self.addCleanup(cache_patcher.stop)
+
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_cached_page(self, mock_get_page):
+        mock_get_page.return_value = {"movie": {"id": 1}}
+
+        for _ in range(2):
+            self.assertEqual(
+                kinoman_api.get_cached_page("details", 1, "details/1"),
+                {"movie": {"id": 1}},
+            )
+
+        mock_get_page.assert_called_once_with(
+            "details/1", None, False, endpoint_class="details"
+        )
+        self.assertIn("page:details:1", self.cache.storage)
+
+    @mock.patch("resources.internal.cache._lookups", cache.Counter())
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_cached_page_lookups(self, mock_get_page):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        page_cache = cache.Cache(os.path.join(temp_dir, "cache.db"))
+        kinoman_api.cache.get_cache.return_value = page_cache
+        mock_get_page.return_value = {"movie": {"id": 1}}
+
+        kinoman_api.get_cached_page("details", 1, "details/1")
+        page_cache.flush_lookups()
+
+        # Re-check under the lease isn't one more miss
+        lookups = page_cache.class_info()["page:details"]
+        self.assertEqual((lookups["hits"], lookups["misses"]), (0, 1))
+
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_cached_page_payload(self, mock_get_page):
+        payload = {"page": 1}
+        mock_get_page.side_effect = lambda url, data, user_id, **_: data.update(
+            user_id=5
+        ) or {"movies": []}
+
+        kinoman_api.get_cached_page("listing", "{}", "search", payload, True)
+
+        self.assertDictEqual(payload, {"page": 1})
+
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_cached_page_error(self, mock_get_page):
+        mock_get_page.return_value = {"message": "error"}
+
+        kinoman_api.get_cached_page("details", 1, "details/1", expected_key="movie")
+
+        self.assertDictEqual(self.cache.storage, {})
+
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_get_cached_page_stale(self, mock_get_page):
+        mock_get_page.side_effect = kinoman_api.NetworkError
+
+        with self.assertRaises(kinoman_api.NetworkError):
+            kinoman_api.get_cached_page("details", 1, "details/1")
+
+        self.cache.set("page:details:1", {"movie": {"id": 1}}, -1)
+
+        self.assertDictEqual(
+            kinoman_api.get_cached_page("details", 1, "details/1"),
+            {"movie": {"id": 1}, kinoman_api.STALE_KEY: True},
+        )
+
+
+class TestRememberMissing(unittest.TestCase):
+    def setUp(self):
+        self.cache = DictCache()
+
+        cache_patcher = mock.patch("resources.kinoman_api.cache")
+        cache_patcher.start().get_cache.return_value = self.cache
+        self.addCleanup(cache_patcher.stop)
+
+        kinoman_api._movie_data_memo.clear()
+        self.addCleanup(kinoman_api._movie_data_memo.clear)
+
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_missing_movie(self, mock_get_page):
+        mock_get_page.side_effect = kinoman_api.MissingVideoError
+
+        for _ in range(2):
+            with self.assertRaises(kinoman_api.MissingVideoError):
+                kinoman_api.get_movie_data(100)
+
+        mock_get_page.assert_called_once()
+
+        kinoman_api.refresh_movie(100)
+
+        with self.assertRaises(kinoman_api.MissingVideoError):
+            kinoman_api.get_movie_data(100)
+
+        self.assertEqual(mock_get_page.call_count, 2)
+
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_missing_key_cached_page(self, mock_get_page):
+        self.cache.set("page:details:100", {"movie": {}}, 60)
+
+        with mock.patch.object(self.cache, "get", wraps=self.cache.get) as mock_get:
+            kinoman_api.get_cached_page(
+                "details", 100, "details/100", missing_key="missing:100:movie"
+            )
+
+        # Cached page costs one lookup, missing entry isn't checked
+        mock_get.assert_called_once_with("page:details:100")
+        mock_get_page.assert_not_called()
+
+    @mock.patch("resources.kinoman_api.get_movie_data")
+    def test_missing_file(self, mock_get_movie_data):
+        mock_get_movie_data().file_lists.find.return_value = None
+        mock_get_movie_data.reset_mock()
+
+        for _ in range(2):
+            with self.assertRaises(kinoman_api.MissingVideoError):
+                kinoman_api.get_video_url(100, "sd", "video.avi")
+
+        mock_get_movie_data.assert_called_once_with(100)
+        self.assertIn("missing:100:file:sd:video.avi", self.cache.storage)
+
+        self.cache.set("file_url:100:sd:video.avi", "movie/download/1", 60)
+        self.cache.set("file_url:1000:sd:video.avi", "movie/download/2", 60)
+        self.cache.set("page:details:100", {}, 60)
+
+        kinoman_api.refresh_movie(100)
+
+        self.assertListEqual(list(self.cache.storage), ["file_url:1000:sd:video.avi"])
+
+
+@mock.patch("resources.kinoman_api.player", FakePlayer())
+class TestWarmCaches(unittest.TestCase):
+    def setUp(self):
+        self.cache = DictCache()
+        self.cache.set(kinoman_api.GENRES_CACHE_KEY, {"updated": time.time()}, 0)
+
+        cache_patcher = mock.patch("resources.kinoman_api.cache")
+        cache_patcher.start().get_cache.return_value = self.cache
+        self.addCleanup(cache_patcher.stop)
+
+        page_patcher = mock.patch(
+            "resources.kinoman_api.get_page", return_value={"movies": []}
+        )
+        self.mock_get_page = page_patcher.start()
+        self.addCleanup(page_patcher.stop)
+
+    def test_warm_caches(self):
+        menu_size = len(kinoman_api.list_categories_video_menu())
+
+        self.assertEqual(
+            kinoman_api.warm_caches(["old", "new"], 100, lambda: False),
+            menu_size + 2,
+        )
+
+        # Everything is cached now, second run is free
+        self.assertEqual(kinoman_api.warm_caches(["old", "new"], 100, lambda: False), 0)
+        self.assertEqual(self.mock_get_page.call_count, menu_size + 2)
+
+        # Most recent search goes first
+        self.assertEqual(self.mock_get_page.call_args_list[-2][0][1], {"q": "new"})
+
+    def test_warm_caches_listing_key(self):
+        kinoman_api.warm_caches([], 1, lambda: False)
+
+        # Same query as a click on the first root category
+        _, query = kinoman_api.list_categories_video_menu()[0]
+        query = {key: str(value) for key, value in query.items()}
+        query["page"] = 1
+        kinoman_api.get_movies(query)
+
+        self.mock_get_page.assert_called_once()
+
+    def test_warm_caches_budget(self):
+        self.assertEqual(kinoman_api.warm_caches([], 3, lambda: False), 3)
+        self.assertEqual(self.mock_get_page.call_count, 3)
+
+    def test_warm_caches_stop(self):
+        should_stop = mock.MagicMock(side_effect=[False, False, True])
+
+        self.assertEqual(kinoman_api.warm_caches([], 100, should_stop), 2)
+
+    def test_warm_caches_login_error(self):
+        self.mock_get_page.side_effect = kinoman_api.LoginError
+
+        self.assertEqual(kinoman_api.warm_caches([], 100, lambda: False), 0)
+        self.mock_get_page.assert_called_once()
+
+
+class TestFilterCounts(unittest.TestCase):
+    @mock.patch("resources.kinoman_api.cache")
+    def test_get_filter_counts(self, mock_cache):
+        mock_cache.get_cache().get_many.return_value = {
+            'filter_count:{"content_type_id": 1, "genre_black_list": [12], '
+            '"genre_list": [], "sort_type": 0}': 312
+        }
+
+        self.assertListEqual(
+            kinoman_api.get_filter_counts(
+                [
+                    {
+                        "category": "movies",
+                        "content_type_id": "1",
+                        "genre_black_list": 12,
+                    },
+                    {"content_type_id": 2},
+                ]
+            ),
+            [312, None],
+        )
+
+    @mock.patch("resources.kinoman_api.cache")
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api._get_local_catalog", mock.MagicMock())
+    def test_count_movies_catalog_mirror(self, mock_get_page, mock_cache):
+        kinoman_api._get_local_catalog().count.return_value = 10
+
+        self.assertEqual(kinoman_api.count_movies({"content_type_id": 1}), 10)
+        mock_get_page.assert_not_called()
+        mock_cache.get_cache().set.assert_called_once_with(
+            mock.ANY, 10, kinoman_api.FILTER_COUNT_TTL
+        )
+
+    @mock.patch("resources.kinoman_api.cache", mock.MagicMock())
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api._get_local_catalog", lambda: None)
+    def test_count_movies_upstream(self, mock_get_page):
+        mock_get_page.side_effect = [
+            {"movies": [{}] * 20, "total_page": 3},
+            {"movies": [{}] * 5, "total_page": 3},
+        ]
+
+        self.assertEqual(kinoman_api.count_movies({"content_type_id": 1}), 45)
+        self.assertEqual(mock_get_page.call_args[0][1]["page"], 3)
+
+    @mock.patch("resources.kinoman_api.cache", mock.MagicMock())
+    @mock.patch("resources.kinoman_api.get_page")
+    @mock.patch("resources.kinoman_api._get_local_catalog", lambda: None)
+    def test_count_movies_upstream_single_page(self, mock_get_page):
+        mock_get_page.return_value = {"movies": [{}] * 3, "total_page": 1}
+
+        self.assertEqual(kinoman_api.count_movies({"content_type_id": 1}), 3)
+        mock_get_page.assert_called_once()
+
+    @mock.patch("resources.kinoman_api._get_local_catalog", mock.MagicMock())
+    @mock.patch("resources.kinoman_api.count_movies")
+    def test_precompute_filter_counts(self, mock_count):
+        mock_count.side_effect = [10, kinoman_api.NetworkError, 0]
+
+        self.assertEqual(kinoman_api.precompute_filter_counts([{}, {}, {}]), 2)
+
+    @mock.patch("resources.kinoman_api._get_local_catalog", lambda: None)
+    @mock.patch("resources.kinoman_api.count_movies", return_value=1)
+    def test_precompute_filter_counts_upstream(self, mock_count):
+        queries = [{"year": year} for year in range(2000, 2020)]
+
+        self.assertEqual(
+            kinoman_api.precompute_filter_counts(queries),
+            kinoman_api.FILTER_COUNT_UPSTREAM_MAX,
+        )
+        self.assertEqual(mock_count.call_count, kinoman_api.FILTER_COUNT_UPSTREAM_MAX)
+
+
+class TestSyncCatalog(unittest.TestCase):
+    @staticmethod
+    def fake_search(page_url, payload, user_id_required):
+        movies = {
+            1: {"id": 1, "type_id": 1, "release_year": 2019},
+            2: {"id": 2, "type_id": 2, "release_year": 2018},
+            3: {"id": 3, "type_id": 0, "release_year": 2017},
+        }
+
+        if payload["genre_list"] == [12]:
+            found = [3]
+        elif payload["genre_list"] == [10]:
+            found = [1, 3]
+        elif payload.get("age_rating_type") == 4:
+            found = [1]
+        elif payload.get("favorite"):
+            found = [2]
+        elif payload["sort_type"] == 1:
+            found = [3, 2, 1]
+        elif "age_rating_type" in payload or payload["genre_list"]:
+            found = []
+        else:
+            found = [1, 2, 3]
+
+        pages = [found[i : i + 2] for i in range(0, len(found), 2)] or [[]]
+
+        return {
+            "movies": [movies[i] for i in pages[payload["page"] - 1]],
+            "total_page": len(pages),
+        }
+
+    @mock.patch("resources.kinoman_api.catalog")
+    @mock.patch("resources.kinoman_api._fetch_genres")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_sync_catalog(self, mock_get_page, mock_list_genres, mock_catalog):
+        mock_get_page.side_effect = self.fake_search
+        mock_list_genres.return_value = [("Cartoons", 12), ("Genre", 10)]
+
+        self.assertEqual(kinoman_api.sync_catalog(), 3)
+
+        movies, page_size = mock_catalog.get_catalog().replace.call_args[0]
+
+        self.assertEqual(page_size, 2)
+        self.assertListEqual(
+            list(movies),
+            [
+                {
+                    "data": {"id": 1, "type_id": 1, "release_year": 2019},
+                    "genres": {10},
+                    "favorite": False,
+                    "age_rating_type": 4,
+                    "rank_default": 0,
+                    "rank_premiere": 2,
+                },
+                {
+                    "data": {"id": 2, "type_id": 2, "release_year": 2018},
+                    "genres": set(),
+                    "favorite": True,
+                    "rank_default": 1,
+                    "rank_premiere": 1,
+                },
+                {
+                    "data": {"id": 3, "type_id": 0, "release_year": 2017},
+                    "genres": {10, 12},
+                    "favorite": False,
+                    "rank_default": 2,
+                    "rank_premiere": 0,
+                },
+            ],
+        )
+
+    @mock.patch("resources.kinoman_api.catalog")
+    @mock.patch("resources.kinoman_api._fetch_genres")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_sync_catalog_pass_failed(
+        self, mock_get_page, mock_list_genres, mock_catalog
+    ):
+        def fake_search(page_url, payload, user_id_required):
+            self.assertEqual(rate_limit.get_priority(), rate_limit.BACKGROUND)
+
+            if payload["genre_list"] == [10]:
+                raise kinoman_api.NetworkError()
+
+            return self.fake_search(page_url, payload, user_id_required)
+
+        mock_get_page.side_effect = fake_search
+        mock_list_genres.return_value = [("Cartoons", 12), ("Genre", 10)]
+        progress = mock.MagicMock()
+
+        self.assertEqual(kinoman_api.sync_catalog(progress=progress), 3)
+
+        movies = list(mock_catalog.get_catalog().replace.call_args[0][0])
+
+        # Failed genre is retried and skipped, the rest is synced
+        genre_calls = [
+            call
+            for call in mock_get_page.call_args_list
+            if call[0][1]["genre_list"] == [10]
+        ]
+        self.assertEqual(len(genre_calls), kinoman_api.SYNC_PASS_ATTEMPTS)
+        self.assertListEqual([m["genres"] for m in movies], [set(), set(), {12}])
+        self.assertTrue(movies[1]["favorite"])
+
+        total = 2 + 2 + 5 + 1
+        progress.assert_called_with(total, total)
+        self.assertEqual(progress.call_count, total)
+
+    @mock.patch("resources.kinoman_api.catalog")
+    @mock.patch("resources.kinoman_api._fetch_genres")
+    @mock.patch("resources.kinoman_api.get_page")
+    def test_sync_catalog_stopped(self, mock_get_page, mock_list_genres, mock_catalog):
+        mock_get_page.side_effect = self.fake_search
+        mock_list_genres.return_value = [("Cartoons", 12), ("Genre", 10)]
+        should_stop = mock.MagicMock(side_effect=[False, True])
+
+        self.assertIsNone(kinoman_api.sync_catalog(should_stop))
+
+        mock_get_page.assert_called_once()
+        mock_catalog.get_catalog().replace.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
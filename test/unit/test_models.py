@@ -0,0 +1,49 @@
+# coding=utf-8
+
+import unittest
+
+from resources import models
+
+
+class TestModels(unittest.TestCase):
+    def test_episode_info(self):
+        episode = models.EpisodeInfo(1, 5, "Test Series S01E05")
+
+        self.assertDictEqual(
+            episode.info(), {"season": 1, "episode": 5, "title": "Test Series S01E05"}
+        )
+
+    def test_slots(self):
+        video_file = models.VideoFile("video.mp4", "video_url")
+
+        with self.assertRaises(AttributeError):
+            video_file.extra = True
+
+        self.assertFalse(hasattr(models.Movie(), "__dict__"))
+
+    def test_equality(self):
+        self.assertEqual(
+            models.VideoFile("video.mp4", "video_url"),
+            models.VideoFile("video.mp4", "video_url", None, None),
+        )
+        self.assertNotEqual(
+            models.VideoFile("video.mp4", "video_url"),
+            models.VideoFile("video.mp4", "other_url"),
+        )
+
+    def test_movie_video_data(self):
+        movie = models.Movie(
+            title="Test Movie", cast=("Actor 1", "Actor 2"), poster="p", fanart="f"
+        )
+
+        video_data = movie.video_data()
+
+        self.assertEqual(video_data["art"]["icon"], "p")
+        self.assertEqual(video_data["art"]["fanart"], "f")
+        self.assertDictEqual(video_data["properties"], {"Fanart_Image": "f"})
+        self.assertListEqual(video_data["info"]["cast"], ["Actor 1", "Actor 2"])
+        self.assertEqual(video_data["info"]["title"], "Test Movie")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -56,6 +56,20 @@ class TestMinorStuff(unittest.TestCase):
         player.dialog_ok("test title", "test text")
         mock_dialog().ok.assert_called_once_with("test title", "test text")
 
+    @mock.patch("xbmcgui.Dialog")
+    def test_notify(self, mock_dialog):
+        player.notify("test title", "test text")
+        mock_dialog().notification.assert_called_once_with(
+            "test title", "test text", sound=False
+        )
+
+    @mock.patch("os.makedirs")
+    @mock.patch("os.path.isdir", mock.MagicMock(return_value=False))
+    @mock.patch("xbmcvfs.translatePath", mock.MagicMock(return_value="/profile"))
+    def test_get_profile_path(self, mock_makedirs):
+        self.assertEqual(player.get_profile_path("test.db"), "/profile/test.db")
+        mock_makedirs.assert_called_once_with("/profile")
+
     @mock.patch("xbmcgui.Dialog")
     def test_dialog_yesno(self, mock_dialog):
         player.dialog_yesno(
@@ -80,6 +94,17 @@ class TestMinorStuff(unittest.TestCase):
         )
         mock_end.assert_called_once_with(1, updateListing=True)
 
+    @mock.patch("xbmc.executebuiltin")
+    @mock.patch("xbmc.getInfoLabel")
+    def test_refresh_if_current(self, mock_info, mock_exec):
+        mock_info.return_value = "plugin://test.plugin/other/"
+        player.refresh_if_current("plugin://test.plugin/test/")
+        mock_exec.assert_not_called()
+
+        mock_info.return_value = "plugin://test.plugin/test/"
+        player.refresh_if_current("plugin://test.plugin/test/")
+        mock_exec.assert_called_once_with("Container.Refresh")
+
     @mock.patch("xbmcplugin.setResolvedUrl")
     @mock.patch("xbmcgui.ListItem")
     def test_play(self, mock_list, mock_resolve):
@@ -89,6 +114,22 @@ class TestMinorStuff(unittest.TestCase):
         mock_list.assert_called_once_with(path="test_url")
         mock_resolve.assert_called_once_with(1, True, "test_url")
 
+    @mock.patch("xbmcplugin.setResolvedUrl")
+    @mock.patch("xbmcgui.ListItem")
+    def test_play_stream_info(self, mock_list, mock_resolve):
+        player.play(
+            "http://test.com/video.mkv",
+            mime_type="video/x-matroska",
+            headers={"User-Agent": "Test Agent", "Cookie": "a=1; b=2"},
+        )
+
+        mock_list.assert_called_once_with(
+            path="http://test.com/video.mkv|Cookie=a%3D1%3B+b%3D2&User-Agent=Test+Agent"
+        )
+        mock_list().setMimeType.assert_called_once_with("video/x-matroska")
+        mock_list().setContentLookup.assert_called_once_with(False)
+        mock_resolve.assert_called_once_with(1, True, mock_list())
+
 
 class TestSettings(unittest.TestCase):
     @mock.patch("resources.internal.player.ADDON")
@@ -203,6 +244,62 @@ class TestAddItems(unittest.TestCase):
             "video", infoLabels={"test_key": "test_value"}
         )
 
+    @mock.patch("xbmcplugin.addDirectoryItem", mock.MagicMock())
+    @mock.patch("xbmcgui.ListItem")
+    def test_add_item_info_overrides(self, mock_li):
+        video_data = {
+            "art": {"poster": "test_poster"},
+            "info": {"test_key": "test_value", "title": "test title"},
+            "info_overrides": {"title": "test override"},
+        }
+
+        player.add_item("test", "/test/path", video_data)
+
+        mock_li().setInfo.assert_called_once_with(
+            "video", infoLabels={"test_key": "test_value", "title": "test override"}
+        )
+        mock_li().setArt.assert_called_once_with(
+            {"poster": "test_poster", "icon": "DefaultVideo.png"}
+        )
+        self.assertDictEqual(
+            video_data,
+            {
+                "art": {"poster": "test_poster"},
+                "info": {"test_key": "test_value", "title": "test title"},
+                "info_overrides": {"title": "test override"},
+            },
+        )
+
+    @mock.patch("xbmcplugin.addDirectoryItem", mock.MagicMock())
+    @mock.patch("xbmcgui.ListItem")
+    def test_add_item_context_menu(self, mock_li):
+        player.add_item("test", "/test/path", context_menu=[("Action", "/action/")])
+
+        mock_li().addContextMenuItems.assert_called_once_with(
+            [("Action", "RunPlugin(plugin://test.plugin/action/)")]
+        )
+
+    @mock.patch("xbmc.Player")
+    @mock.patch("xbmc.PlayList")
+    @mock.patch("xbmcgui.ListItem")
+    def test_play_playlist(self, mock_li, mock_playlist, mock_player):
+        player.play_playlist(
+            [
+                {"label": "Episode 1", "path": "/play/1"},
+                {"label": "Episode 2", "path": "/play/2"},
+            ]
+        )
+
+        mock_playlist().clear.assert_called_once()
+        mock_playlist().add.assert_has_calls(
+            [
+                mock.call("plugin://test.plugin/play/1", mock_li()),
+                mock.call("plugin://test.plugin/play/2", mock_li()),
+            ]
+        )
+        mock_li().setProperty.assert_any_call("IsPlayable", "true")
+        mock_player().play.assert_called_once_with(mock_playlist())
+
     @mock.patch("xbmcplugin.setContent", mock.MagicMock())
     @mock.patch("resources.internal.player.add_item")
     @mock.patch("xbmcplugin.endOfDirectory")
@@ -214,7 +311,12 @@ class TestAddItems(unittest.TestCase):
         player.print_items(test_items)
 
         mock_add.assert_called_once_with(
-            "test label", "/test/path", None, is_folder=None, is_playable=None
+            "test label",
+            "/test/path",
+            None,
+            is_folder=None,
+            is_playable=None,
+            context_menu=None,
         )
         mock_end.assert_called_once_with(1, cacheToDisc=True, updateListing=False)
 
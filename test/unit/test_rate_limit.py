@@ -0,0 +1,101 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from contextlib import closing
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources.internal import rate_limit
+
+
+class TestPriority(unittest.TestCase):
+    def test_priority(self):
+        self.assertEqual(rate_limit.get_priority(), rate_limit.FOREGROUND)
+
+        with rate_limit.priority(rate_limit.BACKGROUND):
+            self.assertEqual(rate_limit.get_priority(), rate_limit.BACKGROUND)
+
+        self.assertEqual(rate_limit.get_priority(), rate_limit.FOREGROUND)
+
+    @mock.patch("resources.internal.rate_limit.stats")
+    @mock.patch("resources.internal.rate_limit.get_bucket")
+    def test_throttle(self, mock_get_bucket, mock_stats):
+        mock_get_bucket().acquire.return_value = 0.5
+
+        with rate_limit.priority(rate_limit.BACKGROUND):
+            rate_limit.throttle()
+
+        mock_get_bucket().acquire.assert_called_once_with(rate_limit.BACKGROUND)
+        mock_stats.record.assert_called_once_with("queue_wait.background", 0.5)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "rate_limit.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_burst(self):
+        bucket = rate_limit.TokenBucket(self.db_path, rate=20, burst=3)
+
+        start = time.time()
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertLess(time.time() - start, 0.05)
+
+        # Bucket is empty, next token comes in 1 / rate
+        self.assertGreaterEqual(bucket.acquire(), 0.04)
+
+    def test_shared_between_instances(self):
+        rate_limit.TokenBucket(self.db_path, rate=20, burst=1).acquire()
+
+        waited = rate_limit.TokenBucket(self.db_path, rate=20, burst=1).acquire()
+
+        self.assertGreaterEqual(waited, 0.04)
+
+    def test_foreground_preempts_background(self):
+        bucket = rate_limit.TokenBucket(self.db_path, rate=10, burst=1)
+        bucket.acquire()
+        order = []
+
+        def take(request_priority):
+            bucket.acquire(request_priority)
+            order.append(request_priority)
+
+        background = threading.Thread(target=take, args=(rate_limit.BACKGROUND,))
+        background.start()
+        time.sleep(0.02)
+        # Queued later, but gets the next token first
+        take(rate_limit.FOREGROUND)
+        background.join()
+
+        self.assertListEqual(order, [rate_limit.FOREGROUND, rate_limit.BACKGROUND])
+
+    def test_stale_waiter(self):
+        bucket = rate_limit.TokenBucket(self.db_path)
+
+        # Foreground request of a crashed process
+        with closing(bucket._connect()) as connection:
+            connection.execute(
+                "INSERT INTO waiters VALUES (?, ?, ?)",
+                ("crashed", rate_limit.FOREGROUND, time.time() - 61),
+            )
+
+        self.assertLess(bucket.acquire(rate_limit.BACKGROUND), 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
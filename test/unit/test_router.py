@@ -204,6 +204,20 @@ class TestResolve(unittest.TestCase):
         with self.assertRaisesRegexp(ValueError, r"^Failed to resolve the url .*"):
             router.resolve("plugin://test_plugin/search/something?testing=123")
 
+    def test_endpoint_name(self):
+        # pylint: disable=unused-argument
+        # noinspection PyUnusedLocal
+        def test_function(search_query):
+            pass
+
+        router.route("/search/<search_query>")(test_function)
+
+        self.assertEqual(
+            router.endpoint_name("plugin://test_plugin/search/something?a=1"),
+            "test_function",
+        )
+        self.assertIsNone(router.endpoint_name("plugin://test_plugin/other"))
+
 
 class TestPathFor(unittest.TestCase):
     patcher = None
@@ -0,0 +1,134 @@
+# coding=utf-8
+
+import unittest
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources.internal import scheduler, rate_limit
+
+
+class JobError(BaseException):
+    pass
+
+
+@mock.patch("resources.internal.scheduler.player")
+@mock.patch("resources.internal.scheduler.time")
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.monitor = mock.MagicMock()
+        self.monitor.abortRequested.return_value = False
+
+        self.job = mock.MagicMock(return_value=None)
+        self.scheduler = scheduler.Scheduler(self.monitor)
+        self.scheduler.add(self.job, interval=600, idle_time=60)
+
+    def test_first_run(self, mock_time, mock_player):
+        mock_time.time.return_value = 1000
+        mock_player.get_idle_time.return_value = 0
+
+        self.scheduler.run_pending()
+
+        self.job.assert_called_once_with(self.scheduler.should_stop)
+
+    def test_background_priority(self, mock_time, _):
+        mock_time.time.return_value = 1000
+        self.job.side_effect = lambda _: self.assertEqual(
+            rate_limit.get_priority(), rate_limit.BACKGROUND
+        )
+
+        self.scheduler.run_pending()
+
+        self.job.assert_called_once()
+
+    def test_interval_and_idle(self, mock_time, mock_player):
+        mock_time.time.return_value = 1000
+        mock_player.get_idle_time.return_value = 0
+        mock_player.is_playing.return_value = False
+        self.scheduler.run_pending()
+
+        # Not due yet
+        mock_time.time.return_value = 1500
+        mock_player.get_idle_time.return_value = 100
+        self.scheduler.run_pending()
+
+        # Due, but user is active
+        mock_time.time.return_value = 1700
+        mock_player.get_idle_time.return_value = 10
+        self.scheduler.run_pending()
+
+        # Due, but video is playing
+        mock_player.get_idle_time.return_value = 100
+        mock_player.is_playing.return_value = True
+        self.scheduler.run_pending()
+
+        self.assertEqual(self.job.call_count, 1)
+
+        mock_player.is_playing.return_value = False
+        self.scheduler.run_pending()
+
+        self.assertEqual(self.job.call_count, 2)
+
+    def test_job_interval(self, mock_time, mock_player):
+        mock_player.get_idle_time.return_value = 100
+        mock_player.is_playing.return_value = False
+        self.job.return_value = 60
+
+        mock_time.time.return_value = 1000
+        self.scheduler.run_pending()
+
+        mock_time.time.return_value = 1060
+        self.scheduler.run_pending()
+
+        self.assertEqual(self.job.call_count, 2)
+
+    def test_job_failed(self, mock_time, mock_player):
+        mock_player.get_idle_time.return_value = 100
+        mock_player.is_playing.return_value = False
+        self.job.side_effect = ValueError("database is locked")
+        other_job = mock.MagicMock(return_value=None)
+        self.scheduler.add(other_job, interval=600)
+
+        mock_time.time.return_value = 1000
+        self.scheduler.run_pending()
+
+        # Other jobs still run, the failure is logged
+        other_job.assert_called_once()
+        mock_player.log.assert_called_once()
+
+        # Failed job runs again after its normal interval
+        # Addon's errors are BaseExceptions, they are caught too
+        self.job.side_effect = JobError
+        mock_time.time.return_value = 1500
+        self.scheduler.run_pending()
+        self.assertEqual(self.job.call_count, 1)
+
+        mock_time.time.return_value = 1600
+        self.scheduler.run_pending()
+        self.assertEqual(self.job.call_count, 2)
+        self.assertIn("JobError", mock_player.log.call_args[0][0])
+
+    def test_abort(self, mock_time, mock_player):
+        mock_time.time.return_value = 1000
+        self.monitor.abortRequested.return_value = True
+
+        self.scheduler.run()
+
+        self.job.assert_not_called()
+        mock_player.get_idle_time.assert_not_called()
+
+    def test_run_until_abort(self, mock_time, _):
+        mock_time.time.return_value = 1000
+        self.monitor.waitForAbort.side_effect = [False, True]
+
+        self.scheduler.run()
+
+        self.job.assert_called_once()
+        self.assertEqual(self.monitor.waitForAbort.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
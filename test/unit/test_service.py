@@ -0,0 +1,156 @@
+# coding=utf-8
+
+import unittest
+
+from test.fake_player import FakePlayer
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    import service
+    from resources.internal import stream_proxy
+
+
+class TestService(unittest.TestCase):
+    @mock.patch("service.kinoman_api")
+    def test_resolve_stream(self, mock_kinoman):
+        service.resolve_stream(("100", "online", "video.mp4"), True)
+
+        mock_kinoman.get_video_url.assert_called_once_with(
+            100, "online", "video.mp4", refresh=True
+        )
+
+    def test_resolve_stream_error(self):
+        with mock.patch(
+            "service.kinoman_api.get_video_url",
+            side_effect=service.kinoman_api.MissingVideoError,
+        ):
+            with self.assertRaises(stream_proxy.UpstreamError):
+                service.resolve_stream(("100", "online", "video.mp4"), False)
+
+    @mock.patch("service.Scheduler", mock.MagicMock())
+    @mock.patch("service.stream_proxy.StreamProxy")
+    @mock.patch("service.xbmc")
+    @mock.patch("service.player", new_callable=FakePlayer)
+    def test_stream_proxy(self, mock_player, _, mock_proxy):
+        mock_player.storage.update({"stream_proxy": True, "stream_proxy_buffer": 16})
+        mock_player.set_window_property = mock.MagicMock()
+        mock_player.clear_window_property = mock.MagicMock()
+        mock_proxy.return_value.port = 5000
+
+        service.main()
+
+        mock_proxy.assert_called_once_with(
+            service.resolve_stream, buffer_size=16 * 1024 * 1024
+        )
+        mock_player.set_window_property.assert_called_once_with(
+            stream_proxy.PORT_PROPERTY, 5000
+        )
+        mock_player.clear_window_property.assert_called_once_with(
+            stream_proxy.PORT_PROPERTY
+        )
+        mock_proxy.return_value.stop.assert_called_once_with()
+
+    @mock.patch("service.Scheduler")
+    @mock.patch("service.stream_proxy.StreamProxy")
+    @mock.patch("service.xbmc")
+    @mock.patch("service.player", new_callable=FakePlayer)
+    def test_stream_proxy_disabled(self, _, mock_xbmc, mock_proxy, mock_scheduler):
+        service.main()
+
+        mock_proxy.assert_not_called()
+        mock_scheduler.assert_called_once_with(mock_xbmc.Monitor())
+        mock_scheduler().add.assert_has_calls(
+            [
+                mock.call(service.keep_session, 270),
+                mock.call(
+                    service.warm_caches,
+                    service.WARM_UP_INTERVAL,
+                    service.WARM_UP_IDLE_TIME,
+                ),
+                mock.call(
+                    service.compact_cache,
+                    service.COMPACT_INTERVAL,
+                    service.COMPACT_IDLE_TIME,
+                ),
+                mock.call(
+                    service.sync_catalog,
+                    service.CATALOG_SYNC_INTERVAL,
+                    service.CATALOG_SYNC_IDLE_TIME,
+                ),
+            ]
+        )
+        mock_scheduler().run.assert_called_once_with()
+
+    @mock.patch("service.kinoman_api")
+    @mock.patch("service.player", new_callable=FakePlayer)
+    def test_warm_caches(self, mock_player, mock_kinoman):
+        mock_player.storage.update(
+            {
+                "search_history_status": True,
+                "_search_history": "first|second",
+                "warm_up_budget": 20,
+            }
+        )
+        should_stop = mock.MagicMock()
+
+        service.warm_caches(should_stop)
+
+        mock_kinoman.warm_caches.assert_called_once_with(
+            ["first", "second"], 20, should_stop
+        )
+
+    @mock.patch("service.stats")
+    @mock.patch("service.cache")
+    @mock.patch("service.player", new_callable=FakePlayer)
+    def test_compact_cache(self, mock_player, mock_cache, mock_stats):
+        mock_player.storage["cache_size"] = 64
+        mock_cache.get_cache().compact.return_value = {"expired": 1, "evicted": 2}
+        mock_cache.get_cache().info.return_value = {"size": 100, "raw_size": 400}
+
+        service.compact_cache(lambda: False)
+
+        mock_cache.get_cache().compact.assert_called_once_with(64 * 1024 * 1024)
+        mock_stats.record.assert_has_calls(
+            [mock.call("cache.evicted", 2), mock.call("cache.compression_ratio", 4.0)]
+        )
+
+    @mock.patch("service.catalog")
+    @mock.patch("service.kinoman_api")
+    @mock.patch("service.player", new_callable=FakePlayer)
+    def test_sync_catalog(self, mock_player, mock_kinoman, mock_catalog):
+        should_stop = mock.MagicMock()
+
+        # Mirror is off
+        service.sync_catalog(should_stop)
+        mock_catalog.get_catalog.assert_not_called()
+
+        mock_player.set_setting("catalog_mirror", True)
+        mock_catalog.get_catalog().is_fresh.return_value = True
+        service.sync_catalog(should_stop)
+        mock_catalog.get_catalog().is_fresh.assert_called_with(service.CATALOG_SYNC_AGE)
+        mock_kinoman.sync_catalog.assert_not_called()
+
+        mock_catalog.get_catalog().is_fresh.return_value = False
+        service.sync_catalog(should_stop)
+        mock_kinoman.sync_catalog.assert_called_once_with(should_stop)
+
+    @mock.patch("service.kinoman_api.login_check_interval", return_value=600)
+    @mock.patch("service.kinoman_api.refresh_session")
+    def test_keep_session(self, mock_refresh, _):
+        self.assertEqual(service.keep_session(lambda: False), 570)
+
+        mock_refresh.side_effect = service.kinoman_api.NetworkError
+        self.assertEqual(service.keep_session(lambda: False), 570)
+
+        mock_refresh.side_effect = service.kinoman_api.LoginError
+        self.assertEqual(
+            service.keep_session(lambda: False), service.SESSION_RETRY_INTERVAL
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
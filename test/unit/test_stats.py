@@ -0,0 +1,58 @@
+# coding=utf-8
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+with mock.patch("sys.argv", ["plugin://test.plugin", "1", "/"]):
+    from resources.internal import stats
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.stats = stats.Stats(os.path.join(self.temp_dir, "stats.db"), 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_summary(self):
+        self.assertIsNone(self.stats.summary("test"))
+
+        for value in range(1, 11):
+            self.stats.record("test", value)
+
+        self.assertDictEqual(
+            self.stats.summary("test"),
+            {"count": 10, "mean": 5.5, "p50": 5, "p95": 10, "p99": 10, "max": 10},
+        )
+
+    def test_recent_samples_only(self):
+        for value in range(20):
+            self.stats.record("test", value)
+            self.stats.record("other", value)
+
+        self.assertEqual(self.stats.summary("test")["count"], 10)
+        self.assertEqual(self.stats.summary("test")["mean"], 14.5)
+        self.assertListEqual(self.stats.metrics(), ["other", "test"])
+
+        self.stats.clear()
+
+        self.assertListEqual(self.stats.metrics(), [])
+
+    @mock.patch("resources.internal.stats.get_stats")
+    def test_record_error(self, mock_get_stats):
+        mock_get_stats().record.side_effect = sqlite3.OperationalError
+
+        stats.record("test", 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+# coding=utf-8
+
+import threading
+import unittest
+
+import requests
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+from resources.internal import stream_proxy
+from resources import models
+from test.range_server import CONTENT, RangeServer
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_wrap_around(self):
+        ring = stream_proxy.RingBuffer(10)
+        ring.reset(100)
+
+        free = ring.free_view()
+        free[:8] = b"abcdefgh"
+        ring.commit(8)
+
+        self.assertEqual(len(ring.free_view()), 2)
+        self.assertEqual(bytes(ring.data_view(102, 100)), b"cdefgh")
+
+        ring.release(106)
+        free = ring.free_view()
+        free[:] = b"ij"
+        ring.commit(2)
+
+        # Next free block starts at the beginning of memory
+        self.assertEqual(len(ring.free_view()), 6)
+        self.assertEqual(bytes(ring.data_view(106, 100)), b"ghij")
+
+    def test_full(self):
+        ring = stream_proxy.RingBuffer(4)
+        ring.commit(4)
+
+        self.assertFalse(ring.free_view())
+
+        ring.release(2)
+
+        self.assertEqual(len(ring.free_view()), 2)
+
+
+class TestStreamProxy(unittest.TestCase):
+    def setUp(self):
+        self.upstream = RangeServer()
+        self.upstream.start()
+
+        self.resolver = mock.MagicMock()
+        self.resolver.return_value = models.Stream(
+            self.upstream.url(), "video/mp4", {"User-Agent": "test"}
+        )
+
+        # Small buffer, so it wraps around a few times
+        self.proxy = stream_proxy.StreamProxy(self.resolver, buffer_size=64 * 1024)
+        self.proxy.start()
+        self.url = stream_proxy.proxy_url(self.proxy.port, 100, "online", "a b.mp4")
+
+    def tearDown(self):
+        self.proxy.stop()
+        self.upstream.stop()
+
+    def test_full_file(self):
+        response = requests.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], "video/mp4")
+        self.assertEqual(response.content, CONTENT)
+        self.resolver.assert_called_once_with(("100", "online", "a b.mp4"), False)
+
+    def test_range(self):
+        response = requests.get(self.url, headers={"Range": "bytes=200000-200999"})
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            response.headers["Content-Range"],
+            "bytes 200000-200999/{}".format(len(CONTENT)),
+        )
+        self.assertEqual(response.content, CONTENT[200000:201000])
+
+        response = requests.get(self.url, headers={"Range": "bytes=1000-"})
+
+        self.assertEqual(response.content, CONTENT[1000:])
+
+    def test_expired_link(self):
+        self.upstream.expired_paths.add("/expired.mkv")
+        self.resolver.side_effect = lambda parts, refresh: models.Stream(
+            self.upstream.url("/video.mkv" if refresh else "/expired.mkv"), None, {}
+        )
+
+        response = requests.get(self.url)
+
+        self.assertEqual(response.content, CONTENT)
+        self.assertListEqual(
+            [call[0][1] for call in self.resolver.call_args_list], [False, True]
+        )
+
+    def test_resolve_error(self):
+        self.resolver.side_effect = stream_proxy.UpstreamError("Missing video")
+
+        self.assertEqual(requests.get(self.url).status_code, 502)
+
+
+class TestStreamSession(unittest.TestCase):
+    def setUp(self):
+        self.upstream = RangeServer()
+        self.upstream.start()
+
+        self.session = stream_proxy.StreamSession(
+            lambda refresh: models.Stream(self.upstream.url(), None, {}),
+            buffer_size=64 * 1024,
+        )
+
+    def tearDown(self):
+        self.session.close()
+        self.upstream.stop()
+
+    def test_serve_slow_write(self):
+        sent = []
+
+        def serve_ahead():
+            self.session.serve(40000, 1000, sent.append)
+
+        def slow_write(data):
+            # Another request is served while this one is still writing
+            reader = threading.Thread(target=serve_ahead)
+            reader.start()
+            reader.join(5)
+            self.assertFalse(reader.is_alive())
+            sent.append(bytes(data))
+
+        self.session.open(0)
+
+        self.assertEqual(self.session.serve(0, 1000, slow_write), 1000)
+        self.assertEqual(bytes(sent[0]), CONTENT[40000:41000])
+        # Data being written is not released under it
+        self.assertEqual(sent[1], CONTENT[:1000])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+# coding=utf-8
+
+import unittest
+
+from resources.internal import tasks, rate_limit
+
+
+class TestTasks(unittest.TestCase):
+    def test_run_in_background(self):
+        results = []
+
+        thread = tasks.run_in_background(results.append, "test")
+        thread.join()
+
+        self.assertListEqual(results, ["test"])
+
+    def test_map_concurrent(self):
+        self.assertListEqual(
+            tasks.map_concurrent(lambda x: x * 2, [1, 2, 3], workers=2), [2, 4, 6]
+        )
+
+    def test_priority(self):
+        results = []
+
+        thread = tasks.run_in_background(
+            lambda: results.extend(
+                tasks.map_concurrent(lambda _: rate_limit.get_priority(), [1, 2])
+            )
+        )
+        thread.join()
+
+        self.assertListEqual(results, [rate_limit.BACKGROUND] * 2)
+        self.assertEqual(rate_limit.get_priority(), rate_limit.FOREGROUND)
+
+
+if __name__ == "__main__":
+    unittest.main()